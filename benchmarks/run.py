@@ -0,0 +1,377 @@
+#!/usr/bin/env python
+"""Benchmarks for the client library's hot paths
+
+Run from the repository root::
+
+    python benchmarks/run.py                # run every benchmark and report
+    python benchmarks/run.py -k to_query    # only names containing to_query
+    python benchmarks/run.py --check        # exit 1 on regressions
+    python benchmarks/run.py --update       # store the results as baselines
+    python benchmarks/run.py --full         # include 1M bill materialisation
+
+Each benchmark reports the operations per second of the fastest of several
+timed rounds and the peak memory allocated by one call, measured with
+`tracemalloc`. With `--check` the results are compared against
+`baselines.json` next to this script, and a benchmark regresses if it is
+more than `--tolerance` slower or allocates that much more than its
+baseline. Baselines depend on the machine they were recorded on, so record
+them again with `--update` on the machine which runs the checks.
+
+The benchmarks are not part of the unit test run.
+"""
+
+import argparse
+import collections
+import fnmatch
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir))
+
+import six
+from six.moves import BaseHTTPServer, socketserver
+
+from gocardless import utils
+from gocardless.client import Client
+from gocardless.fake import FakeGoCardless
+from gocardless.resources import (Merchant, Subscription, PreAuthorization,
+                                  Bill, Payout, User, ResourceList)
+from gocardless.retry import NO_RETRIES
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         "baselines.json")
+
+Benchmark = collections.namedtuple("Benchmark", ["name", "setup", "ops",
+                                                 "full"])
+"""`setup` returns the function to time, each call of which performs `ops`
+operations. Benchmarks marked `full` only run with --full."""
+
+BENCHMARKS = []
+
+
+def benchmark(name, ops=1, full=False):
+    def register(setup):
+        BENCHMARKS.append(Benchmark(name, setup, ops, full))
+        return setup
+    return register
+
+
+def payload(size):
+    """A webhook or url payload with roughly `size` values"""
+    data = {"resource_type": "bill", "action": "paid"}
+    bills = []
+    while len(bills) * 6 + 2 < size:
+        n = len(bills)
+        bills.append({
+            "id": "0BILL{0:06d}".format(n),
+            "status": "paid",
+            "source_type": "subscription",
+            "source_id": "0SUB{0:06d}".format(n),
+            "amount": "{0}.{1:02d}".format(10 + n % 90, n % 100),
+            "uri": "https://gocardless.com/api/v1/bills/0BILL{0:06d}"
+                   .format(n),
+        })
+    data["bills"] = bills
+    return data
+
+
+SIZES = (("small", 6), ("medium", 60), ("large", 600))
+
+for label, size in SIZES:
+    def setup_to_query(size=size):
+        data = payload(size)
+        return lambda: utils.to_query(data)
+    benchmark("to_query[{0}]".format(label))(setup_to_query)
+
+    def setup_signature(size=size):
+        data = payload(size)
+        return lambda: utils.generate_signature(data, "secret")
+    benchmark("generate_signature[{0}]".format(label))(setup_signature)
+
+
+@benchmark("build_and_sign[new_bill_url]")
+def setup_build_and_sign():
+    client = Client("app_id", "app_secret", "token", "merchant_id")
+    user = {"first_name": "Tom", "last_name": "Blomfield",
+            "email": "tom@gocardless.com"}
+    return lambda: client.new_bill_url(
+        10, name="Tennis court", description="Monthly rental", user=user,
+        redirect_uri="https://example.com/confirm",
+        cancel_uri="https://example.com/cancel", state="abc")
+
+
+_fixtures = FakeGoCardless.generate(users=1, pre_authorizations=1,
+                                    subscriptions=1, bills=1, payouts=1)
+for klass, collection in ((Merchant, "merchants"),
+                          (Subscription, "subscriptions"),
+                          (PreAuthorization, "pre_authorizations"),
+                          (Bill, "bills"), (Payout, "payouts"),
+                          (User, "users")):
+    def setup_init(klass=klass, collection=collection):
+        attrs = list(_fixtures.resources[collection].values())[0]
+
+        def construct():
+            for _ in range(1000):
+                klass(attrs, None)
+        return construct
+    benchmark("resource_init[{0}]".format(klass.__name__),
+              ops=1000)(setup_init)
+
+
+def bill_attrs(count):
+    """`count` bill dictionaries, cycling through 1000 distinct bills"""
+    fake = FakeGoCardless.generate(bills=min(count, 1000))
+    distinct = list(fake.resources["bills"].values())
+    return [distinct[n % len(distinct)] for n in range(count)]
+
+
+for count, label, full in ((10000, "10k", False), (100000, "100k", False),
+                           (1000000, "1M", True)):
+    def setup_materialise(count=count):
+        attrs = bill_attrs(count)
+        return lambda: ResourceList(Bill(a, None) for a in attrs)
+    benchmark("materialise_bills[{0}]".format(label), ops=count,
+              full=full)(setup_materialise)
+
+
+@benchmark("materialise_bills[10k,total]", ops=10000)
+def setup_total():
+    bills = ResourceList(Bill(a, None) for a in bill_attrs(10000))
+    return lambda: bills.total("amount")
+
+
+for label, size in SIZES:
+    def setup_validate(size=size):
+        client = Client("app_id", "app_secret")
+        data = payload(size)
+        data["signature"] = utils.generate_signature(data, "app_secret")
+        return lambda: client.validate_webhook(data)
+    benchmark("validate_webhook[{0}]".format(label))(setup_validate)
+
+
+@benchmark("validate_webhooks[1000 medium]", ops=1000)
+def setup_validate_many():
+    client = Client("app_id", "app_secret")
+    webhooks = []
+    for n in range(1000):
+        data = payload(60)
+        data["action"] = "paid{0}".format(n)
+        data["signature"] = utils.generate_signature(data, "app_secret")
+        webhooks.append(data)
+    return lambda: client.validate_webhooks(webhooks)
+
+
+@benchmark("fake_transport[merchant.bills 100]", ops=100)
+def setup_fake_transport():
+    fake = FakeGoCardless.generate(bills=100)
+    client = Client("app_id", "app_secret", "token", fake.merchant_id,
+                    transport=fake, retry_policy=NO_RETRIES)
+    merchant = client.merchant()
+    return lambda: merchant.bills()
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves HTTP requests from the server's FakeGoCardless"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, with Nagle's algorithm the
+    # body waits for the client's delayed ACK of the headers
+    disable_nagle_algorithm = True
+
+    def _respond(self, method):
+        length = int(self.headers.get("Content-Length") or 0)
+        data = self.rfile.read(length) if length else None
+        path, _, query = self.path.partition("?")
+        params = dict(six.moves.urllib.parse.parse_qsl(query))
+        response = self.server.fake.handle(
+            method, path, params=params, data=data,
+            headers={"Idempotency-Key": self.headers.get("Idempotency-Key")})
+        self.send_response(response.status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(response.content)))
+        self.end_headers()
+        self.wfile.write(response.content)
+
+    def do_GET(self):
+        self._respond("get")
+
+    def do_POST(self):
+        self._respond("post")
+
+    def do_PUT(self):
+        self._respond("put")
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def start_stub_server(fake):
+    server = StubServer(("127.0.0.1", 0), StubHandler)
+    server.fake = fake
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+_stub = {}
+
+
+def stub_client():
+    """A client of a stub HTTP server on localhost, started on first use"""
+    if "server" not in _stub:
+        fake = FakeGoCardless.generate(bills=100)
+        _stub["server"] = start_stub_server(fake)
+        _stub["fake"] = fake
+    fake = _stub["fake"]
+    return Client("app_id", "app_secret", "token", fake.merchant_id,
+                  base_url="http://127.0.0.1:{0}".format(
+                      _stub["server"].server_address[1]),
+                  retry_policy=NO_RETRIES, pool_maxsize=8), fake
+
+
+@benchmark("stub_server[client.bill]")
+def setup_stub_get():
+    client, fake = stub_client()
+    bill_id = list(fake.resources["bills"])[0]
+    return lambda: client.bill(bill_id)
+
+
+@benchmark("stub_server[client.bills 100, 8 threads]", ops=100)
+def setup_stub_concurrent():
+    client, fake = stub_client()
+    bill_ids = list(fake.resources["bills"])
+    return lambda: client.bills(bill_ids, max_workers=8)
+
+
+@benchmark("stub_server[merchant.bills 100]", ops=100)
+def setup_stub_list():
+    client, _ = stub_client()
+    merchant = client.merchant()
+    return lambda: merchant.bills()
+
+
+def measure(bench, min_time, rounds):
+    """Return the ops per second and peak KiB allocated of a benchmark"""
+    func = bench.setup()
+    start = time.time()
+    func()
+    elapsed = max(time.time() - start, 1e-9)
+    number = max(1, int(min_time / rounds / elapsed))
+    best = None
+    for _ in range(rounds):
+        start = time.time()
+        for _ in range(number):
+            func()
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    ops_per_sec = bench.ops * number / max(best, 1e-9)
+    peak_kib = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        func()
+        peak_kib = tracemalloc.get_traced_memory()[1] / 1024.0
+        tracemalloc.stop()
+    return {"ops_per_sec": ops_per_sec, "peak_kib": peak_kib}
+
+
+def compare(result, baseline, tolerance):
+    """Return a list of the ways `result` regressed from `baseline`"""
+    problems = []
+    if result["ops_per_sec"] < baseline["ops_per_sec"] * (1 - tolerance):
+        problems.append("{0:.0%} slower".format(
+            1 - result["ops_per_sec"] / baseline["ops_per_sec"]))
+    if result["peak_kib"] is not None and \
+            baseline.get("peak_kib") is not None and \
+            result["peak_kib"] > baseline["peak_kib"] * (1 + tolerance) + 1:
+        problems.append("{0:.0%} more memory".format(
+            result["peak_kib"] / baseline["peak_kib"] - 1))
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("-k", dest="pattern", default=None,
+                        help="only run benchmarks whose name contains this, "
+                             "or matches it as a glob")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 if a benchmark regressed")
+    parser.add_argument("--update", action="store_true",
+                        help="store the results in the baselines file")
+    parser.add_argument("--baselines", default=BASELINES,
+                        help="the baselines file, default %(default)s")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="the fraction a result may be worse than its "
+                             "baseline, default %(default)s")
+    parser.add_argument("--min-time", type=float, default=1.0,
+                        help="the seconds to spend timing each benchmark")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--full", action="store_true",
+                        help="include the largest benchmarks")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+
+    regressions = []
+    results = {}
+    print("{0:<44} {1:>14} {2:>12} {3:>10}".format(
+        "benchmark", "ops/sec", "peak KiB", "baseline"))
+    for bench in BENCHMARKS:
+        if bench.full and not args.full:
+            continue
+        if args.pattern and args.pattern not in bench.name and \
+                not fnmatch.fnmatch(bench.name, args.pattern):
+            continue
+        result = measure(bench, args.min_time, args.rounds)
+        results[bench.name] = result
+        baseline = baselines.get(bench.name)
+        change = "new"
+        if baseline:
+            change = "{0:+.0%}".format(
+                result["ops_per_sec"] / baseline["ops_per_sec"] - 1)
+            problems = compare(result, baseline, args.tolerance)
+            if problems:
+                regressions.append((bench.name, problems))
+        peak = result["peak_kib"]
+        print("{0:<44} {1:>14,.0f} {2:>12} {3:>10}".format(
+            bench.name, result["ops_per_sec"],
+            "-" if peak is None else "{0:,.1f}".format(peak), change))
+        sys.stdout.flush()
+
+    if "server" in _stub:
+        _stub["server"].shutdown()
+
+    if args.update:
+        baselines.update(results)
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("Updated {0}".format(args.baselines))
+
+    if regressions:
+        print("\nRegressions against {0}:".format(args.baselines))
+        for name, problems in regressions:
+            print("  {0}: {1}".format(name, ", ".join(problems)))
+        if args.check:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -31,7 +31,8 @@ from .client import Client
 #import as clientlib so that we don't shadow with the client variable
 from . import client as clientlib
 from gocardless.resources import (Bill, Subscription, PreAuthorization, User,
-                                  Merchant)
+                                  Merchant, prefetch_related)
+from gocardless.context import using
 
 environment = 'production'
 """The environment GoCardless executes API requests against, should be
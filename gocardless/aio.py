@@ -0,0 +1,420 @@
+"""asyncio support for the GoCardless client library
+
+:py:class:`AsyncClient` has the same interface as
+:py:class:`gocardless.Client` but every method which talks to the API returns
+an awaitable, as do the sub resource and reference accessors of resources
+fetched through it:
+
+.. code-block:: python
+
+    >>> client = AsyncClient(app_id, app_secret, access_token, merchant_id)
+    >>> merchant = await client.merchant()
+    >>> bills = await merchant.bills()
+    >>> user = await bills[0].user()
+
+The `iter_` accessors return an :py:class:`AsyncPageIterator`, to be used
+with ``async for``.
+
+:py:class:`FakeTransport` serves requests from a
+:py:class:`gocardless.fake.FakeGoCardless` without a network.
+
+Requests are sent by a pluggable :py:class:`AsyncTransport`, whose coroutine
+method ``perform(request)`` sends a :py:class:`gocardless.request.Request` and
+returns the decoded JSON body. The default transport uses `aiohttp`, which
+must be installed separately. Async transports are kept apart from the
+synchronous :py:class:`gocardless.request.Transport` of
+:py:attr:`gocardless.Client.transport`, the two cannot be swapped.
+
+This module requires Python 3.5 or later.
+"""
+
+import asyncio
+import collections
+
+import requests
+
+from gocardless.client import API_PATH, Client
+from gocardless.concurrency import Outcome
+from gocardless.exceptions import RequestTimeoutError
+from gocardless.request import Transport, TRANSIENT_ERRORS
+from gocardless.resources import ResourceList
+from gocardless.utils import monotonic
+
+
+async def chain(awaitable, func):
+    """Await `awaitable` and apply `func` to its result"""
+    return func(await awaitable)
+
+
+async def bounded_gather(func, items, max_workers=8, ordered=False):
+    """Await `func(item)` for every item with at most `max_workers` in flight
+
+    The asynchronous counterpart of
+    :py:func:`gocardless.concurrency.bounded_map`. Items are taken from
+    `items` as calls finish, so it may be a lazy iterable. Returns a list of
+    :py:class:`gocardless.concurrency.Outcome` in the order the calls
+    finished, or in input order if `ordered` is true. Exceptions raised by
+    `func` are captured in the outcomes.
+    """
+    items = enumerate(items)
+    outcomes = []
+
+    async def worker():
+        # Workers share the iterator, each taking the next item when free
+        for index, item in items:
+            try:
+                result, error = await func(item), None
+            except Exception as exc:
+                result, error = None, exc
+            outcomes.append(Outcome(index, item, result, error))
+    await asyncio.gather(*[worker() for _ in range(max_workers)])
+    if ordered:
+        outcomes.sort(key=lambda outcome: outcome.index)
+    return outcomes
+
+
+class AsyncTransport(object):
+    """Sends requests for :py:class:`AsyncClient`
+
+    Subclasses implement the coroutine :py:meth:`perform`, which should pass
+    the response to :py:meth:`gocardless.request.Request.receive` so that
+    failed statuses raise and rate limits are reported. Connection failures
+    should be raised as `requests.exceptions.ConnectionError` and timeouts as
+    :py:exc:`gocardless.exceptions.RequestTimeoutError` so they are retried.
+    """
+
+    async def perform(self, request):
+        """Send a :py:class:`gocardless.request.Request` and return the
+        decoded JSON body of the response"""
+        raise NotImplementedError()
+
+
+class _AiohttpResponse(object):
+    """The parts of the `requests.Response` interface used by
+    :py:meth:`gocardless.request.Request.receive`"""
+
+    def __init__(self, status, headers, body):
+        self.status_code = status
+        self.headers = headers
+        self._body = body
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        if self._body is None:
+            raise ValueError("The response has no JSON body")
+        return self._body
+
+
+class AiohttpTransport(AsyncTransport):
+    """Sends requests using a shared `aiohttp.ClientSession`"""
+
+    def __init__(self, limit=100, keep_alive=True):
+        """Create a transport
+
+        :param limit: The maximum number of simultaneous connections.
+        :param keep_alive: Whether to keep connections open between requests.
+        """
+        self._limit = limit
+        self._keep_alive = keep_alive
+        self._session = None
+
+    def _get_session(self):
+        if self._session is None:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError("aiohttp is required to use AiohttpTransport"
+                                  ", install it with `pip install aiohttp`")
+            connector = aiohttp.TCPConnector(
+                limit=self._limit, force_close=not self._keep_alive)
+            self._session = aiohttp.ClientSession(connector=connector)
+        return self._session
+
+    async def perform(self, request):
+        import aiohttp
+        session = self._get_session()
+        options = request.options
+        kwargs = {"headers": options["headers"]}
+        if "params" in options:
+            kwargs["params"] = options["params"]
+        if "data" in options:
+            kwargs["data"] = options["data"]
+        if "auth" in options:
+            kwargs["auth"] = aiohttp.BasicAuth(*options["auth"])
+        timeout = options.get("timeout")
+        if isinstance(timeout, tuple):
+            kwargs["timeout"] = aiohttp.ClientTimeout(sock_connect=timeout[0],
+                                                      sock_read=timeout[1])
+        elif timeout is not None:
+            kwargs["timeout"] = aiohttp.ClientTimeout(total=timeout)
+        try:
+            async with session.request(request.method, request.url,
+                                       **kwargs) as response:
+                try:
+                    body = await response.json(content_type=None)
+                except ValueError:
+                    body = None
+                request.receive(_AiohttpResponse(response.status,
+                                                 response.headers, body))
+                return body
+        except asyncio.TimeoutError as error:
+            raise RequestTimeoutError("Request to {0} timed out: {1}".format(
+                request.url, error))
+        except aiohttp.ClientConnectionError as error:
+            raise requests.exceptions.ConnectionError(error)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class FakeTransport(AsyncTransport):
+    """Serves requests from a :py:class:`gocardless.fake.FakeGoCardless`,
+    waiting for its latency without blocking the event loop"""
+
+    def __init__(self, fake):
+        self.fake = fake
+
+    async def perform(self, request):
+        delay = self.fake.delay()
+        if delay:
+            await asyncio.sleep(delay)
+        response = self.fake.handle(request.method, request.url,
+                                    **request.options)
+        request.receive(response)
+        return response.json()
+
+
+class AsyncPageIterator(object):
+    """Asynchronously iterates over a paginated list of resources
+
+    The asynchronous counterpart of :py:func:`gocardless.resources.iter_pages`,
+    returned by the `iter_` accessors of resources fetched with an
+    :py:class:`AsyncClient`:
+
+    .. code-block:: python
+
+        >>> async for bill in merchant.iter_bills(per_page=50):
+        ...     print(bill.id)
+
+    Pages are fetched as iteration reaches them, and with `prefetch` the next
+    page is requested while the current one is consumed. Streaming is not
+    supported.
+    """
+
+    def __init__(self, client, path, klass, per_page=100, prefetch=False,
+                 deadline=None, stream=False, **params):
+        if stream:
+            raise ValueError("AsyncClient does not support streaming")
+        self._client = client
+        self._path = path
+        self._klass = klass
+        self._per_page = per_page
+        self._prefetch = prefetch
+        self._params = params
+        self._kwargs = {}
+        if deadline is not None:
+            self._kwargs["deadline"] = monotonic() + deadline
+        self._page = 1
+        self._items = collections.deque()
+        self._pending = None
+        self._done = False
+
+    def _fetch(self, page):
+        params = dict(self._params, page=page, per_page=self._per_page)
+        return self._client.api_get(self._path, params=params, **self._kwargs)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._items:
+            if self._done:
+                raise StopAsyncIteration
+            if self._pending is not None:
+                pending, self._pending = self._pending, None
+                data = await pending
+            else:
+                data = await self._fetch(self._page)
+            self._items.extend(data)
+            self._page += 1
+            self._done = len(data) < self._per_page
+            if self._prefetch and not self._done:
+                self._pending = asyncio.ensure_future(self._fetch(self._page))
+        return self._klass(self._items.popleft(), self._client)
+
+    async def aclose(self):
+        """Stop iterating, cancelling any prefetched page"""
+        self._done = True
+        self._items.clear()
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
+
+
+class AsyncClient(Client):
+    """An asynchronous version of :py:class:`gocardless.Client`
+
+    Construct it with the same arguments as :py:class:`gocardless.Client`,
+    except for those configuring its `requests` session, plus an optional
+    `transport`. API methods return awaitables which must be awaited on a
+    running event loop.
+
+    Failed requests are retried according to the client's `retry_policy`,
+    waiting with `asyncio.sleep`, and `timeout`, `deadline`, `cache`,
+    `rate_limiter` and `max_concurrency` work as they do for
+    :py:class:`gocardless.Client`. Validator caches and identity maps are
+    only supported by synchronous clients.
+    """
+
+    def __init__(self, app_id, app_secret, access_token=None,
+                 merchant_id=None, transport=None, **kwargs):
+        """Create a client
+
+        :param transport: The :py:class:`AsyncTransport` used to send
+            requests, defaults to an :py:class:`AiohttpTransport`. It is
+            available as :py:attr:`async_transport`.
+        :param kwargs: Other arguments of :py:class:`gocardless.Client`.
+        """
+        if isinstance(transport, Transport):
+            raise TypeError("AsyncClient requires an AsyncTransport, not the "
+                            "synchronous {0}".format(type(transport).__name__))
+        for name in ("validator_cache", "identity_map"):
+            if kwargs.get(name) is not None:
+                raise ValueError("AsyncClient does not support {0}".format(
+                    name))
+        max_concurrency = kwargs.pop("max_concurrency", None)
+        super(AsyncClient, self).__init__(app_id, app_secret,
+                                          access_token=access_token,
+                                          merchant_id=merchant_id, **kwargs)
+        self.async_transport = transport or AiohttpTransport()
+        self._max_concurrency = max_concurrency
+        # Created on first use, as older asyncio primitives bind to the event
+        # loop which is current when they are constructed
+        self._async_concurrency = None
+
+    asynchronous = True
+
+    @property
+    def session(self):
+        return None
+
+    def create_bills(self, bills, max_in_flight=8, idempotency_keys=False,
+                     ordered=False):
+        """Create many bills concurrently
+
+        Arguments are as for :py:meth:`gocardless.Client.create_bills`.
+        Returns an awaitable of the list of
+        :py:class:`gocardless.concurrency.Outcome` tuples, once every bill
+        has been attempted.
+        """
+        return bounded_gather(
+            lambda item: self._create_bill_item(
+                item, idempotency_keys=idempotency_keys),
+            bills, max_workers=max_in_flight, ordered=ordered)
+
+    async def find_many(self, klass, ids, max_workers=8, ordered=True):
+        """Fetch many resources of class `klass` concurrently, see
+        :py:meth:`gocardless.resources.Resource.find_many`
+
+        Returns a :py:class:`gocardless.resources.ResourceList`, in the order
+        of `ids` if `ordered` is true and otherwise in the order the
+        resources were fetched.
+        """
+        ids = list(ids)
+        unique_ids = list(collections.OrderedDict.fromkeys(ids))
+        outcomes = await bounded_gather(
+            lambda id: klass.find_with_client(id, self), unique_ids,
+            max_workers=max_workers)
+        found = collections.OrderedDict()
+        for outcome in outcomes:
+            if outcome.error is not None:
+                raise outcome.error
+            found[outcome.item] = outcome.result
+        if not ordered:
+            return ResourceList(found.values())
+        return ResourceList(found[id] for id in ids)
+
+    def iter_pages(self, path, klass, **kwargs):
+        """Return an :py:class:`AsyncPageIterator` over a paginated list"""
+        return AsyncPageIterator(self, path, klass, **kwargs)
+
+    def _semaphore(self):
+        if self._max_concurrency is None:
+            return None
+        if self._async_concurrency is None:
+            self._async_concurrency = asyncio.BoundedSemaphore(
+                self._max_concurrency)
+        return self._async_concurrency
+
+    def api_get(self, path, params=None, **kwargs):
+        if self.cache is None or kwargs.get('stream'):
+            return self._request('get', API_PATH + path, params=params,
+                                 **kwargs)
+        return self._cached_get(path, params, **kwargs)
+
+    async def _cached_get(self, path, params, **kwargs):
+        # The awaited response is cached, a coroutine can only be awaited once
+        scope = self._cache_scope()
+        response = self.cache.get(path, params, scope=scope)
+        if response is None:
+            response = await self._request('get', API_PATH + path,
+                                           params=params, **kwargs)
+            self.cache.set(path, params, response, scope=scope)
+        return response
+
+    def api_post(self, path, data=None, **kwargs):
+        return self._write('post', path, data=data, **kwargs)
+
+    def api_put(self, path, data={}, **kwargs):
+        return self._write('put', path, data=data, **kwargs)
+
+    def api_delete(self, path, **kwargs):
+        return self._write('delete', path, **kwargs)
+
+    async def _write(self, method, path, **kwargs):
+        response = await self._request(method, API_PATH + path, **kwargs)
+        if self.cache is not None:
+            self.cache.invalidate(path)
+        return response
+
+    async def _request(self, method, path, **kwargs):
+        idempotent = kwargs.get('idempotency_key') is not None
+        deadline = kwargs.get('deadline')
+        attempt = 1
+        while True:
+            request = self._build_request(method, path, **kwargs)
+            try:
+                semaphore = self._semaphore()
+                if semaphore is None:
+                    response = await self._perform(request)
+                else:
+                    async with semaphore:
+                        response = await self._perform(request)
+                return self._handle_response(response)
+            except TRANSIENT_ERRORS as error:
+                if not self.retry_policy.should_retry(method, error, attempt,
+                                                      idempotent=idempotent):
+                    raise
+                if deadline is not None and monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(self.retry_policy.retry_delay(
+                    method, request.url, attempt, error, deadline=deadline))
+                attempt += 1
+
+    async def _perform(self, request):
+        if self.rate_limiter is not None:
+            delay = self.rate_limiter.bucket(request.method).reserve()
+            if delay:
+                await asyncio.sleep(delay)
+        return await self.async_transport.perform(request)
+
+    async def close(self):
+        """Close any connections held by the client's transport"""
+        close = getattr(self.async_transport, "close", None)
+        if close is not None:
+            await close()
@@ -0,0 +1,238 @@
+import collections
+import threading
+
+from gocardless import utils
+from gocardless.resources import (Merchant, Subscription, PreAuthorization,
+                                  Bill, Payout, User)
+
+import six
+
+#The collections which API paths address, e.g. "bills" in "/bills/1"
+RESOURCE_COLLECTIONS = frozenset(
+    klass.endpoint.split("/")[1]
+    for klass in (Merchant, Subscription, PreAuthorization, Bill, Payout, User))
+
+
+class LRUCache(object):
+    """A thread safe mapping which evicts its least recently used entries
+
+    Counts of `hits`, `misses` and `evictions` are available from
+    :py:attr:`stats`, entries removed by `get` because they are no longer
+    valid count as misses.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @property
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats, size=len(self._data))
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / float(lookups) if lookups else 0.0
+        return stats
+
+    def get(self, key, default=None, valid=None):
+        """Return the entry for `key`
+
+        :param valid: A function which is passed the entry and returns
+          whether it may still be used, invalid entries are removed.
+        """
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                self._stats["misses"] += 1
+                return default
+            if valid is not None and not valid(value):
+                self._stats["misses"] += 1
+                return default
+            self._data[key] = value
+            self._stats["hits"] += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def discard_where(self, predicate):
+        """Remove every entry whose (key, value) satisfies `predicate`"""
+        with self._lock:
+            for key in [k for k, v in self._data.items() if predicate(k, v)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _collection(path):
+    """Split an API path into the resource collection it returns and the id
+    of the resource, which is None for lists
+
+    For example "/bills/1" is ("bills", "1") and "/merchants/1/bills" is
+    ("bills", None).
+    """
+    segments = [s for s in path.split("?", 1)[0].split("/") if s]
+    if not segments:
+        return None, None
+    if len(segments) % 2 == 0:
+        return segments[-2], segments[-1]
+    return segments[-1], None
+
+
+class ResponseCache(object):
+    """Caches decoded API responses for a limited time
+
+    Entries for individual resources and for lists of resources are kept for
+    `ttl` seconds, or for the time given in `ttls` for the resource type,
+    and at most `maxsize` entries are kept. Writing to a resource removes
+    the cached resource and any cached lists of that type of resource.
+
+    Pass an instance to :py:class:`gocardless.Client` to use it:
+
+    .. code-block:: python
+
+        >>> cache = ResponseCache(ttl=10, ttls={User: 300, Merchant: 300})
+        >>> client = Client(app_id, app_secret, token, merchant_id,
+        ...                 cache=cache)
+
+    Cached responses are shared by every resource built from them. Clients
+    pass a `scope`, their merchant and access token, with every lookup, so
+    a cache shared between clients never returns one merchant's response to
+    another.
+    """
+
+    def __init__(self, ttl=30, maxsize=1024, ttls=None):
+        """Create a cache
+
+        :param ttl: The default number of seconds to keep entries for.
+        :param maxsize: The maximum number of entries to keep.
+        :param ttls: A dictionary of resource classes, or collection names
+          such as "bills", to the number of seconds to keep their entries.
+        """
+        self.ttl = ttl
+        self.ttls = {}
+        for key, value in (ttls or {}).items():
+            if not isinstance(key, six.string_types):
+                key = key.endpoint.split("/")[1]
+            self.ttls[key] = value
+        self._entries = LRUCache(maxsize)
+
+    @property
+    def stats(self):
+        """A dictionary of `hits`, `misses`, `evictions`, `size` and
+        `hit_rate`"""
+        return self._entries.stats
+
+    def _key(self, path, params, scope):
+        if params:
+            path = "{0}?{1}".format(path, utils.to_query(params))
+        return (scope, path)
+
+    def get(self, path, params=None, default=None, scope=None):
+        """Return the cached response for `path` and `params`
+
+        :param scope: A hashable value identifying whose response it is,
+          entries are only returned for the scope they were stored with.
+        """
+        now = utils.monotonic()
+        entry = self._entries.get(self._key(path, params, scope),
+                                  valid=lambda entry: now < entry[0])
+        if entry is None:
+            return default
+        return entry[1]
+
+    def set(self, path, params, value, scope=None):
+        collection, id = _collection(path)
+        ttl = self.ttls.get(collection, self.ttl)
+        if ttl <= 0:
+            return
+        self._entries.set(self._key(path, params, scope),
+                          (utils.monotonic() + ttl, value, collection, id))
+
+    def invalidate(self, path):
+        """Remove the entries affected by a write to `path`
+
+        For example, after a POST to "/bills/1/retry" the cached bill 1 and
+        any cached lists of bills are removed, whatever their scope. Writes to other paths, such as
+        "/confirm", remove every cached list.
+        """
+        segments = [s for s in path.split("?", 1)[0].split("/") if s]
+        if not segments:
+            return
+        collection = segments[0]
+        id = segments[1] if len(segments) > 1 else None
+
+        def affected(key, entry):
+            if collection not in RESOURCE_COLLECTIONS:
+                return entry[3] is None
+            return entry[2] == collection and (entry[3] is None or
+                                               entry[3] == id)
+        self._entries.discard_where(affected)
+
+    def clear(self):
+        self._entries.clear()
+
+
+ValidatedResponse = collections.namedtuple(
+    "ValidatedResponse", ["etag", "last_modified", "body"])
+
+
+class ValidatorCache(object):
+    """Keeps GET responses with their `ETag` and `Last-Modified` validators
+
+    Requests for a URL with a cached response are sent with `If-None-Match`
+    and `If-Modified-Since` headers, and when the server replies 304 Not
+    Modified the cached body is used instead of downloading and decoding it
+    again. Pass an instance to :py:class:`gocardless.Client` as
+    `validator_cache` to use it.
+
+    :py:attr:`stats` counts the conditional `requests` sent and how many
+    were `not_modified`, their ratio is the `hit_rate`.
+    """
+
+    def __init__(self, maxsize=1024):
+        self._entries = LRUCache(maxsize)
+        self._stats = {"requests": 0, "not_modified": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats["size"] = self._entries.stats["size"]
+        requests = stats["requests"]
+        stats["hit_rate"] = (stats["not_modified"] / float(requests)
+                             if requests else 0.0)
+        return stats
+
+    def get(self, key):
+        """Return the :py:class:`ValidatedResponse` for `key`, if any"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            with self._lock:
+                self._stats["requests"] += 1
+        return entry
+
+    def not_modified(self, key):
+        """Record that the response for `key` has not changed"""
+        with self._lock:
+            self._stats["not_modified"] += 1
+
+    def set(self, key, etag, last_modified, body):
+        self._entries.set(key, ValidatedResponse(etag, last_modified, body))
+
+    def clear(self):
+        self._entries.clear()
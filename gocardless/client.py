@@ -1,11 +1,23 @@
 import base64
+import contextlib
+import functools
+import itertools
 import logging
-
-import gocardless
-from gocardless import urlbuilder
-from gocardless.utils import generate_signature, to_query, signature_valid
-from gocardless.request import Request
-from gocardless.exceptions import ClientError, SignatureError
+import threading
+import uuid
+
+from concurrent.futures import ProcessPoolExecutor
+
+from gocardless import context, urlbuilder
+from gocardless.utils import (generate_signature, to_query, signature_valid,
+                              signatures_valid, then, monotonic, cap_timeout)
+from gocardless.request import (Request, create_session, connection_stats,
+                                TRANSIENT_ERRORS)
+from gocardless.retry import RetryPolicy
+from gocardless.concurrency import bounded_map
+from gocardless.identity import IdentityMap
+from gocardless.exceptions import (ClientError, SignatureError,
+                                   RequestTimeoutError)
 from gocardless.resources import (Merchant, Subscription, Bill,
                                   PreAuthorization, User, Payout)
 
@@ -14,12 +26,27 @@ import six
 logger = logging.getLogger(__name__)
 
 API_PATH = '/api/v1'
+DEFAULT_TIMEOUT = (10, 60)
+"""The default (connect, read) timeout in seconds for API requests"""
+
 BASE_URLS = {
     'production': 'https://gocardless.com',
     'sandbox': 'https://sandbox.gocardless.com',
 }
 
 
+class _hybridmethod(object):
+    """A method which receives the class when called on the class and the
+    instance when called on an instance"""
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, inst, owner):
+        return functools.partial(self.func, owner if inst is None else inst)
+
+
 class Client(object):
     """The main interface to the GoCardless API
 
@@ -35,17 +62,43 @@ class Client(object):
     """
 
     base_url = None
+    environment = None
+    asynchronous = False
+    """Whether API methods return awaitables, see
+    :py:class:`gocardless.aio.AsyncClient`"""
 
-    @classmethod
-    def get_base_url(cls):
+    @_hybridmethod
+    def get_base_url(self):
         """
         Return the correct base URL for the current environment. If one has
         been manually set, default to that.
+
+        Called on a client, the `base_url` or `environment` it was created
+        with take precedence, then those set with :py:func:`gocardless.using`
+        and finally `Client.base_url` and :py:data:`gocardless.environment`.
         """
-        return cls.base_url or BASE_URLS[gocardless.environment]
+        if isinstance(self, type):
+            cls, own_url, own_environment = self, None, None
+        else:
+            cls = type(self)
+            own_url = self.__dict__.get("base_url")
+            own_environment = self.environment
+        if own_url:
+            return own_url
+        if own_environment:
+            return BASE_URLS[own_environment]
+        base_url = context.current_base_url() or cls.base_url
+        if base_url:
+            return base_url
+        return BASE_URLS[context.current_environment()]
 
     def __init__(self, app_id, app_secret, access_token=None,
-                 merchant_id=None):
+                 merchant_id=None, session=None, pool_connections=10,
+                 pool_maxsize=10, keep_alive=True, retry_policy=None,
+                 timeout=DEFAULT_TIMEOUT, cache=None, identity_map=None,
+                 validator_cache=None, rate_limiter=None,
+                 max_concurrency=None, environment=None, base_url=None,
+                 transport=None):
         """Create a client
 
         :param string app_id: Your application id.
@@ -56,6 +109,46 @@ class Client(object):
         :param string merchant_id: The merchant id for this account, should be
             your merchant id unless you are trying to manage another account
             via OAuth.
+        :param session: A `requests.Session` to send requests with. If not
+            given the client creates its own pooled session the first time it
+            makes a request, which is shared by every thread using the client.
+        :param pool_connections: The number of host connection pools to keep
+            in the client's session.
+        :param pool_maxsize: The maximum number of connections to keep open
+            per host, this should be at least the number of threads sharing
+            the client.
+        :param keep_alive: Whether to keep connections open between requests.
+        :param retry_policy: A :py:class:`gocardless.retry.RetryPolicy`
+            deciding which failed requests are retried, by default GET and PUT
+            requests are attempted up to 3 times. Use
+            :py:data:`gocardless.retry.NO_RETRIES` to disable retries.
+        :param timeout: The timeout in seconds for each request, either a
+            number or a (connect, read) tuple. It can be overridden for a
+            single call by passing `timeout` to `api_get`, `api_post` or
+            `api_put`. None waits forever.
+        :param cache: A :py:class:`gocardless.cache.ResponseCache` to keep
+            GET responses in. Writes through the client remove the entries
+            they affect. Entries are scoped to the client's merchant and
+            access token, so a cache can be shared between clients.
+        :param identity_map: A :py:class:`gocardless.identity.IdentityMap`
+            which reference accessors such as `bill.user()` look resources
+            up in before fetching them. See also :py:meth:`unit_of_work`.
+        :param validator_cache: A :py:class:`gocardless.cache.ValidatorCache`
+            used to make GET requests conditional on the response having
+            changed since it was last fetched.
+        :param rate_limiter: A :py:class:`gocardless.ratelimit.RateLimiter`
+            which requests wait for before being sent. Share one between
+            clients to limit them together.
+        :param max_concurrency: The maximum number of requests the client
+            has in flight at once across all threads, None for no limit.
+        :param environment: The environment this client sends requests to,
+            "production" or "sandbox", overriding
+            :py:data:`gocardless.environment`.
+        :param base_url: The base url this client sends requests to,
+            overriding its environment's.
+        :param transport: A :py:class:`gocardless.request.Transport` which
+            sends the client's requests instead of its session, for example
+            a :py:class:`gocardless.fake.FakeGoCardless`.
         """
         self._app_id = app_id
         self._app_secret = app_secret
@@ -63,6 +156,83 @@ class Client(object):
             self._access_token = access_token
         if merchant_id:
             self._merchant_id = merchant_id
+        self._session = session
+        self._session_options = {
+            "pool_connections": pool_connections,
+            "pool_maxsize": pool_maxsize,
+            "keep_alive": keep_alive,
+        }
+        self._session_lock = threading.Lock()
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.timeout = timeout
+        self.cache = cache
+        self._identity_map = identity_map
+        self.validator_cache = validator_cache
+        self.rate_limiter = rate_limiter
+        self._concurrency = None
+        if max_concurrency is not None:
+            self._concurrency = threading.BoundedSemaphore(max_concurrency)
+        self.environment = environment
+        self.transport = transport
+        if base_url is not None:
+            self.base_url = base_url
+
+    @property
+    def session(self):
+        """The pooled `requests.Session` used to make requests"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = create_session(**self._session_options)
+        return self._session
+
+    @property
+    def identity_map(self):
+        """The identity map of the current :py:meth:`unit_of_work` block, or
+        else the one the client was created with"""
+        identity_map = context.current_identity_map(self)
+        if identity_map is None:
+            identity_map = self._identity_map
+        return identity_map
+
+    @identity_map.setter
+    def identity_map(self, identity_map):
+        self._identity_map = identity_map
+
+    @contextlib.contextmanager
+    def unit_of_work(self):
+        """Use a fresh identity map for the duration of a `with` block
+
+        Within the block each referenced resource is only fetched once:
+
+        .. code-block:: python
+
+            >>> with client.unit_of_work():
+            ...     users = [bill.user() for bill in merchant.bills()]
+
+        The block's identity map is returned by the context manager. It is
+        local to the current thread or asyncio task, like
+        :py:func:`gocardless.using`, so blocks on other threads sharing the
+        client keep their own maps.
+        """
+        with context.unit_of_work(self, IdentityMap()) as identity_map:
+            yield identity_map
+
+    def connection_stats(self):
+        """Return connection reuse counters for the client's session
+
+        The result is a dictionary with the keys `connections` (sockets
+        opened), `requests` (requests sent) and `reused` (requests sent over
+        an already open socket).
+        """
+        return connection_stats(self.session)
+
+    def close(self):
+        """Close any pooled connections held by the client"""
+        with self._session_lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
 
     def api_get(self, path, params=None, **kwargs):
         """
@@ -70,17 +240,37 @@ class Client(object):
 
         :param path: the path that will be added to the API prefix
         :param params: query string parameters
+        :param stream: if true, list responses are returned as an iterator
+          which decodes each element as it is downloaded. Streamed responses
+          bypass the client's caches.
         """
-        return self._request('get', API_PATH + path, params=params, **kwargs)
+        if self.cache is None or kwargs.get('stream'):
+            return self._request('get', API_PATH + path, params=params,
+                                 **kwargs)
+        scope = self._cache_scope()
+        response = self.cache.get(path, params, scope=scope)
+        if response is None:
+            response = self._request('get', API_PATH + path, params=params,
+                                     **kwargs)
+            self.cache.set(path, params, response, scope=scope)
+        return response
 
-    def api_post(self, path, data, **kwargs):
+    def _cache_scope(self):
+        # Responses depend on whose credentials fetched them
+        return (getattr(self, "_merchant_id", None),
+                getattr(self, "_access_token", None))
+
+    def api_post(self, path, data=None, **kwargs):
         """Issue a POST request to the API server
 
         :param path: The path that will be added to the API prefix
-        :param data: The data to post to the url.
+        :param data: The data to post to the url, if any.
         """
-        return self._request('post', API_PATH + path, data=data,
-                             **kwargs)
+        response = self._request('post', API_PATH + path, data=data,
+                                 **kwargs)
+        if self.cache is not None:
+            self.cache.invalidate(path)
+        return response
 
     def api_put(self, path, data={}, **kwargs):
         """Issue a PUT request to the API server
@@ -88,15 +278,21 @@ class Client(object):
         :param path: The path that will be added to the API prefix
         :param data: The data to put to the url.
         """
-        return self._request('put', API_PATH + path, data=data,
-                             **kwargs)
+        response = self._request('put', API_PATH + path, data=data,
+                                 **kwargs)
+        if self.cache is not None:
+            self.cache.invalidate(path)
+        return response
 
     def api_delete(self, path, **kwargs):
         """Issue a delete to the API server.
 
         :param path: the path that will be added to the API prefix
         """
-        return self._request('delete', API_PATH + path, **kwargs)
+        response = self._request('delete', API_PATH + path, **kwargs)
+        if self.cache is not None:
+            self.cache.invalidate(path)
+        return response
 
     def _request(self, method, path, **kwargs):
         """
@@ -104,11 +300,53 @@ class Client(object):
 
         :param method: the HTTP method to use (e.g. +:get+, +:post+)
         :param path: the path fragment of the URL
+        :param timeout: the timeout for this request, overriding the client's
+        :param deadline: a time from :py:func:`gocardless.utils.monotonic`
+          after which no more attempts are made
         """
+        idempotent = kwargs.get('idempotency_key') is not None
+        deadline = kwargs.get('deadline')
+        attempt = 1
+        while True:
+            request = self._build_request(method, path, **kwargs)
+            try:
+                if self._concurrency is None:
+                    response = request.perform()
+                else:
+                    with self._concurrency:
+                        response = request.perform()
+                return self._handle_response(response)
+            except TRANSIENT_ERRORS as error:
+                if not self.retry_policy.should_retry(method, error, attempt,
+                                                      idempotent=idempotent):
+                    raise
+                if deadline is not None and monotonic() >= deadline:
+                    raise
+                self.retry_policy.wait(method, request.url, attempt, error,
+                                       deadline=deadline)
+                attempt += 1
+
+    def _build_request(self, method, path, **kwargs):
         request_url = self.get_base_url() + path
-        request = Request(method, request_url, params=kwargs.get("params"))
+        if self.transport is not None:
+            request = Request(method, request_url,
+                              params=kwargs.get("params"),
+                              transport=self.transport)
+        else:
+            request = Request(method, request_url,
+                              params=kwargs.get("params"),
+                              session=self.session)
         logger.debug("Executing request to {0}".format(request_url))
 
+        timeout = kwargs.get('timeout', self.timeout)
+        if kwargs.get('deadline') is not None:
+            remaining = kwargs['deadline'] - monotonic()
+            if remaining <= 0:
+                raise RequestTimeoutError("Deadline passed before request to "
+                                          "{0} was sent".format(request_url))
+            timeout = cap_timeout(timeout, remaining)
+        request.set_timeout(timeout)
+
         if 'auth' in kwargs:
             # If using HTTP basic auth, let requests handle it
             request.use_http_auth(*kwargs['auth'])
@@ -116,8 +354,18 @@ class Client(object):
             # Default to using bearer auth with the access token
             request.use_bearer_auth(self._access_token)
 
+        if self.validator_cache is not None:
+            request.use_validator_cache(self.validator_cache)
+        if self.rate_limiter is not None:
+            request.use_rate_limiter(self.rate_limiter)
+        if kwargs.get('stream'):
+            request.use_streaming()
+        if kwargs.get('idempotency_key') is not None:
+            request.set_idempotency_key(kwargs['idempotency_key'])
         request.set_payload(kwargs.get('data'))
-        response = request.perform()
+        return request
+
+    def _handle_response(self, response):
         if type(response) == dict and "errors" in response.keys():
             raise ClientError("Error calling api, message was ",
                 response["errors"])
@@ -131,7 +379,8 @@ class Client(object):
         Returns the current Merchant's details.
         """
         merchant_url = '/merchants/%s' % self._merchant_id
-        return Merchant(self.api_get(merchant_url), self)
+        return then(self.api_get(merchant_url),
+                    lambda data: Merchant(data, self))
 
     def user(self, id):
         """
@@ -169,7 +418,58 @@ class Client(object):
         """
         return Payout.find_with_client(id, self)
 
-    def create_bill(self, amount, pre_auth_id, name=None, description=None, currency=None):
+    def users(self, ids, max_workers=8, ordered=True):
+        """
+        Find many users concurrently, see
+        :py:meth:`gocardless.resources.Resource.find_many`
+
+        :param ids: The users' ids
+        """
+        return User.find_many(ids, self, max_workers=max_workers,
+                              ordered=ordered)
+
+    def pre_authorizations(self, ids, max_workers=8, ordered=True):
+        """
+        Find many pre authorizations concurrently, see
+        :py:meth:`gocardless.resources.Resource.find_many`
+
+        :param ids: The pre authorization ids
+        """
+        return PreAuthorization.find_many(ids, self, max_workers=max_workers,
+                                          ordered=ordered)
+
+    def subscriptions(self, ids, max_workers=8, ordered=True):
+        """
+        Find many subscriptions concurrently, see
+        :py:meth:`gocardless.resources.Resource.find_many`
+
+        :param ids: The subscription ids
+        """
+        return Subscription.find_many(ids, self, max_workers=max_workers,
+                                      ordered=ordered)
+
+    def bills(self, ids, max_workers=8, ordered=True):
+        """
+        Find many bills concurrently, see
+        :py:meth:`gocardless.resources.Resource.find_many`
+
+        :param ids: The bill ids
+        """
+        return Bill.find_many(ids, self, max_workers=max_workers,
+                              ordered=ordered)
+
+    def payouts(self, ids, max_workers=8, ordered=True):
+        """
+        Find many payouts concurrently, see
+        :py:meth:`gocardless.resources.Resource.find_many`
+
+        :param ids: The payout ids
+        """
+        return Payout.find_many(ids, self, max_workers=max_workers,
+                                ordered=ordered)
+
+    def create_bill(self, amount, pre_auth_id, name=None, description=None,
+                    currency=None, idempotency_key=None):
         """Creates a new bill under an existing pre_authorization
 
         :param amount: The amount to bill
@@ -177,10 +477,52 @@ class Client(object):
           has not expire
         :param name: A name for this bill
         :param description: A description for this bill
+        :param idempotency_key: A unique key for this bill, if given the
+          request is safe to retry after a failure
 
         """
+        kwargs = {}
+        if idempotency_key is not None:
+            kwargs["idempotency_key"] = idempotency_key
         return Bill.create_under_preauth(amount, pre_auth_id, self,
-                                         name=name, description=description, currency=currency)
+                                         name=name, description=description,
+                                         currency=currency, **kwargs)
+
+    def create_bills(self, bills, max_in_flight=8, idempotency_keys=False,
+                     ordered=False):
+        """Create many bills concurrently
+
+        Each item of `bills` describes one bill, either as a tuple of
+        positional arguments to :py:meth:`create_bill`, e.g.
+        `(amount, pre_auth_id)`, or as a dictionary of keyword arguments,
+        which may include an `idempotency_key`. Items are consumed lazily, so
+        `bills` can be a generator.
+
+        Returns an iterator of :py:class:`gocardless.concurrency.Outcome`
+        tuples `(index, item, result, error)`, one for each item as its
+        request finishes, where `result` is the created
+        :py:class:`gocardless.resources.Bill` or `error` the exception raised.
+
+        :param bills: An iterable of bill descriptions.
+        :param max_in_flight: The maximum number of requests in progress at
+          once. The client's connection pool should be at least this big.
+        :param idempotency_keys: If true, give every bill without an
+          idempotency key a random one, so that failed requests are retried.
+        :param ordered: If true, return outcomes in the order of `bills`.
+        """
+        create = functools.partial(self._create_bill_item,
+                                   idempotency_keys=idempotency_keys)
+        return bounded_map(create, bills, max_workers=max_in_flight,
+                           ordered=ordered)
+
+    def _create_bill_item(self, item, idempotency_keys=False):
+        if isinstance(item, dict):
+            args, kwargs = (), dict(item)
+        else:
+            args, kwargs = tuple(item), {}
+        if idempotency_keys and kwargs.get("idempotency_key") is None:
+            kwargs["idempotency_key"] = str(uuid.uuid4())
+        return self.create_bill(*args, **kwargs)
 
     def new_subscription_url(self, amount, interval_length, interval_unit,
                              name=None, description=None, interval_count=None,
@@ -411,7 +753,10 @@ class Client(object):
         url = "/oauth/access_token?{0}".format(query)
         # have to use _request so we don't add api_base to the url
         auth_details = (self._app_id, self._app_secret)
-        result = self._request("post", url, auth=auth_details)
+        return then(self._request("post", url, auth=auth_details),
+                    self._set_access_token)
+
+    def _set_access_token(self, result):
         self._access_token = result["access_token"]
         self._merchant_id = result["scope"].split(":")[1]
         return self._access_token
@@ -428,3 +773,24 @@ class Client(object):
         """
         return signature_valid(params, self._app_secret)
 
+    def validate_webhooks(self, webhooks, processes=None, chunksize=500):
+        """Check the signatures of many webhooks
+
+        Takes an iterable of dictionaries like those passed to
+        :py:meth:`validate_webhook` and returns a list of booleans in the
+        same order, a payload without a signature is invalid.
+
+        :param webhooks: An iterable of dictionaries to validate.
+        :param processes: If given, the number of worker processes to spread
+          validation across.
+        :param chunksize: The number of webhooks sent to a worker process at
+          a time.
+        """
+        if not processes:
+            return signatures_valid(self._app_secret, webhooks)
+        webhooks = iter(webhooks)
+        chunks = iter(lambda: list(itertools.islice(webhooks, chunksize)), [])
+        validate = functools.partial(signatures_valid, self._app_secret)
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            return [valid for results in executor.map(validate, chunks)
+                    for valid in results]
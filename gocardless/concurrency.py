@@ -0,0 +1,66 @@
+import collections
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from gocardless import context
+
+Outcome = collections.namedtuple("Outcome", ["index", "item", "result",
+                                             "error"])
+"""The outcome of applying a function to one item of a bulk operation
+
+`index` is the position of `item` in the input. Exactly one of `result` and
+`error` is set, `error` being the exception raised for the item.
+"""
+
+
+def bounded_map(func, items, max_workers=8, ordered=False):
+    """Apply `func` to every item on a pool of threads
+
+    No more than `max_workers` calls are in flight at once and items are only
+    taken from `items` as workers become free, so it may be a lazy iterable
+    of any length. An :py:class:`Outcome` is yielded for every item, as soon
+    as it finishes or, if `ordered` is true, in input order.
+
+    Exceptions raised by `func` are captured in the outcome rather than
+    stopping the remaining calls. `func` runs with the client and environment
+    set by :py:func:`gocardless.using` where `bounded_map` was called.
+    """
+    items = enumerate(items)
+    pending = {}
+    finished = {}
+    next_index = 0
+
+    def call(item):
+        try:
+            return func(item), None
+        except Exception as error:
+            return None, error
+    run = context.bind(call)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def submit():
+            for index, item in items:
+                pending[executor.submit(run, item)] = (index, item)
+                return True
+            return False
+
+        try:
+            while len(pending) < max_workers and submit():
+                pass
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, item = pending.pop(future)
+                    result, error = future.result()
+                    outcome = Outcome(index, item, result, error)
+                    submit()
+                    if not ordered:
+                        yield outcome
+                        continue
+                    finished[index] = outcome
+                    while next_index in finished:
+                        yield finished.pop(next_index)
+                        next_index += 1
+        finally:
+            for future in pending:
+                future.cancel()
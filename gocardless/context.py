@@ -0,0 +1,154 @@
+"""Context local configuration
+
+:py:func:`using` sets the client used by `Resource.find` and the
+environment requests are sent to for the current thread, or asyncio task,
+without changing the module level :py:data:`gocardless.client` and
+:py:data:`gocardless.environment` which other threads rely on:
+
+.. code-block:: python
+
+    >>> with gocardless.using(client, environment="sandbox"):
+    ...     bill = Bill.find("PWSDXRYSCOKA7Z")
+
+Outside a :py:func:`using` block the module level settings apply. The
+identity maps of :py:meth:`gocardless.Client.unit_of_work` blocks are kept
+the same way, so a client shared between threads gives each block its own.
+
+Context variables are used where available (Python 3.7 and later), which
+asyncio tasks copy when they are created. Older Pythons fall back to thread
+local storage, which does not separate tasks running on the same thread.
+Worker threads, such as those of `Resource.find_many`, run their work with
+:py:func:`bind` so that they see the settings of the thread which started
+them.
+"""
+
+import contextlib
+import threading
+
+import gocardless
+
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+
+class _ThreadLocalVar(object):
+    """The subset of `contextvars.ContextVar` used here, per thread"""
+
+    def __init__(self, name, default=None):
+        self.name = name
+        self._default = default
+        self._local = threading.local()
+
+    def get(self):
+        return getattr(self._local, "value", self._default)
+
+    def set(self, value):
+        token = self.get()
+        self._local.value = value
+        return token
+
+    def reset(self, token):
+        self._local.value = token
+
+
+def _var(name):
+    if contextvars is not None:
+        return contextvars.ContextVar(name, default=None)
+    return _ThreadLocalVar(name)
+
+
+_client = _var("gocardless_client")
+_environment = _var("gocardless_environment")
+_base_url = _var("gocardless_base_url")
+_identity_maps = _var("gocardless_identity_maps")
+_VARS = (_client, _environment, _base_url, _identity_maps)
+
+
+def current_client():
+    """The client set by :py:func:`using`, or :py:data:`gocardless.client`"""
+    client = _client.get()
+    return client if client is not None else gocardless.client
+
+
+def current_environment():
+    """The environment set by :py:func:`using`, or
+    :py:data:`gocardless.environment`"""
+    return _environment.get() or gocardless.environment
+
+
+def current_base_url():
+    """The base url set by :py:func:`using`, if any"""
+    return _base_url.get()
+
+
+@contextlib.contextmanager
+def using(client=None, environment=None, base_url=None):
+    """Use a client, environment or base url within a block
+
+    Settings which are not given keep their current values, and every
+    setting is restored when the block exits.
+
+    :param client: The client used by `Resource.find` and friends.
+    :param environment: "production" or "sandbox".
+    :param base_url: A base url overriding the environment's.
+    """
+    tokens = []
+    for var, value in ((_client, client), (_environment, environment),
+                       (_base_url, base_url)):
+        if value is not None:
+            tokens.append((var, var.set(value)))
+    try:
+        yield client
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+def current_identity_map(client):
+    """The identity map of the innermost unit of work of `client` in the
+    current context, if any"""
+    units = _identity_maps.get()
+    if units:
+        return units.get(client)
+    return None
+
+
+@contextlib.contextmanager
+def unit_of_work(client, identity_map):
+    """Use `identity_map` for resources fetched by `client` within a block,
+    see :py:meth:`gocardless.Client.unit_of_work`"""
+    units = dict(_identity_maps.get() or {})
+    units[client] = identity_map
+    token = _identity_maps.set(units)
+    try:
+        yield identity_map
+    finally:
+        _identity_maps.reset(token)
+
+
+def bind(func):
+    """Return a function which calls `func` with the current settings
+
+    The settings are captured when :py:func:`bind` is called, so the
+    function can be run on another thread, or many times concurrently, and
+    still use the client, environment and units of work of the caller.
+    """
+    if contextvars is not None:
+        captured = contextvars.copy_context()
+
+        def bound(*args, **kwargs):
+            # A context can only be entered by one thread at a time
+            return captured.copy().run(func, *args, **kwargs)
+        return bound
+    values = [(var, var.get()) for var in _VARS]
+
+    def bound(*args, **kwargs):
+        tokens = [(var, var.set(value)) for var, value in values]
+        try:
+            return func(*args, **kwargs)
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
+    return bound
@@ -22,6 +22,29 @@ class ClientError(GoCardlessError):
         return ", ".join(msgs)
 
 
+class ServerError(ClientError):
+    """Thrown when the API server responded with a 5xx status"""
+    def __init__(self, message, errors=None, status_code=None):
+        self.status_code = status_code
+        super(ServerError, self).__init__(message, errors)
+
+
+class RateLimitError(ClientError):
+    """Thrown when the API server responded 429 Too Many Requests
+
+    `retry_after` is the number of seconds the server asked to wait before
+    trying again, if it said.
+    """
+    def __init__(self, message, errors=None, retry_after=None):
+        self.retry_after = retry_after
+        super(RateLimitError, self).__init__(message, errors)
+
+
+class RequestTimeoutError(GoCardlessError):
+    """Thrown when a request or a multi-page operation ran out of time"""
+    pass
+
+
 class SignatureError(GoCardlessError):
     pass
 
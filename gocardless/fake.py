@@ -0,0 +1,369 @@
+"""An in-process fake of the GoCardless API
+
+:py:class:`FakeGoCardless` is a :py:class:`gocardless.request.Transport`
+which answers requests from fixtures held in memory, so a client can be
+exercised without a network:
+
+.. code-block:: python
+
+    >>> fake = FakeGoCardless.generate(bills=1000, latency=0.005)
+    >>> client = Client(app_id, app_secret, "token", fake.merchant_id,
+    ...                 transport=fake)
+    >>> len(client.merchant().bills())
+    1000
+
+It serves merchants, bills, subscriptions, pre-authorizations, users and
+payouts, creating, cancelling, retrying and refunding bills, cancelling
+subscriptions and pre-authorizations, and confirming resources. Latency and
+failures can be injected to test how a client behaves under load. An async
+version is available as :py:class:`gocardless.aio.FakeTransport`.
+"""
+
+import collections
+import datetime
+import json
+import random
+import re
+import threading
+import time
+
+from six.moves.urllib.parse import urlparse
+
+from gocardless.exceptions import RequestTimeoutError
+from gocardless.request import Transport
+from gocardless.utils import DATETIME_FORMAT
+
+import six
+
+COLLECTIONS = ("merchants", "bills", "subscriptions", "pre_authorizations",
+               "users", "payouts")
+
+FAKE_BASE_URL = "https://gocardless.com"
+
+_API_PREFIX = "/api/v1"
+_RESOURCE_PATH = re.compile(r"^/(\w+)/([^/]+)(?:/(\w+))?$")
+
+
+class FakeResponse(object):
+    """A response with the parts of the `requests.Response` interface used
+    by the library"""
+
+    def __init__(self, status_code, body=None, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.content = b"" if body is None else json.dumps(body).encode(
+            "utf-8")
+
+    @property
+    def ok(self):
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content.decode("utf-8"))
+
+    def iter_content(self, chunk_size=1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+
+class FakeGoCardless(Transport):
+    """Serves the GoCardless API from memory
+
+    Resources are kept as dictionaries of their JSON attributes in
+    :py:attr:`resources`, one ordered dictionary per collection keyed by id.
+    Every request is counted in :py:attr:`stats`.
+    """
+
+    def __init__(self, merchant_id="0FAKEMERCHANT", latency=0,
+                 error_rate=0.0, error_status=503, timeout_rate=0.0,
+                 seed=None):
+        """Create a fake with a single merchant and no other resources
+
+        :param merchant_id: The id of the merchant.
+        :param latency: The seconds each request takes, or a (min, max) range
+          to pick from at random.
+        :param error_rate: The fraction of requests which fail with
+          `error_status`.
+        :param error_status: The status of injected failures.
+        :param timeout_rate: The fraction of requests which time out.
+        :param seed: A seed making latency and failures reproducible.
+        """
+        self.merchant_id = merchant_id
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.timeout_rate = timeout_rate
+        self.resources = dict((name, collections.OrderedDict())
+                              for name in COLLECTIONS)
+        self.stats = collections.Counter()
+        self._failures = collections.deque()
+        self._idempotent = {}
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._next_id = 0
+        self.add("merchants", {
+            "id": merchant_id,
+            "name": "Fake Merchant",
+            "description": None,
+            "first_name": "Fake",
+            "last_name": "Merchant",
+            "email": "merchant@example.com",
+            "balance": "0.00",
+            "pending_balance": "0.00",
+            "next_payout_amount": None,
+            "next_payout_date": None,
+            "currency": "GBP",
+            "created_at": "2014-01-01T00:00:00Z",
+            "sub_resource_uris": dict(
+                (name, "{0}{1}/merchants/{2}/{3}".format(
+                    FAKE_BASE_URL, _API_PREFIX, merchant_id, name))
+                for name in COLLECTIONS if name != "merchants"),
+        })
+
+    @classmethod
+    def generate(cls, users=10, pre_authorizations=10, subscriptions=10,
+                 bills=100, payouts=5, **kwargs):
+        """Create a fake populated with generated resources
+
+        The resources are the same for the same counts. Other keyword
+        arguments are passed to the constructor.
+        """
+        fake = cls(**kwargs)
+        start = datetime.datetime(2014, 1, 1)
+
+        def timestamp(n):
+            return (start + datetime.timedelta(minutes=n)).strftime(
+                DATETIME_FORMAT)
+        user_ids = [fake.add("users", {
+            "first_name": "User", "last_name": str(n),
+            "email": "user{0}@example.com".format(n),
+            "created_at": timestamp(n),
+        })["id"] for n in range(users)]
+        payout_ids = [fake.add("payouts", {
+            "amount": "{0}.00".format(100 * (n + 1)),
+            "bank_reference": "REF{0}".format(n),
+            "transaction_fees": "1.00", "app_ids": [],
+            "created_at": timestamp(n), "paid_at": timestamp(n + 60),
+        })["id"] for n in range(payouts)]
+        preauth_ids = [fake.add("pre_authorizations", {
+            "max_amount": "100.00", "remaining_amount": "100.00",
+            "currency": "GBP", "name": None, "description": None,
+            "status": "active", "interval_length": 1,
+            "interval_unit": "month", "calendar_intervals": False,
+            "setup_fee": "0.00", "expires_at": None,
+            "next_interval_start": timestamp(n + 43200),
+            "user_id": user_ids[n % users] if users else None,
+            "created_at": timestamp(n),
+        })["id"] for n in range(pre_authorizations)]
+        for n in range(subscriptions):
+            fake.add("subscriptions", {
+                "amount": "10.00", "currency": "GBP", "name": None,
+                "description": None, "status": "active",
+                "interval_length": 1, "interval_unit": "month",
+                "start_at": None, "setup_fee": "0.00", "expires_at": None,
+                "next_interval_start": timestamp(n + 43200),
+                "user_id": user_ids[n % users] if users else None,
+                "created_at": timestamp(n),
+            })
+        statuses = ("pending", "paid", "paid", "withdrawn", "failed")
+        for n in range(bills):
+            status = statuses[n % len(statuses)]
+            pence = (10 + n % 90) * 100 + n % 100
+            fake.add("bills", {
+                "amount": "{0}.{1:02d}".format(*divmod(pence, 100)),
+                "gocardless_fees": "0.10", "partner_fees": "0.00",
+                "amount_minus_fees": "{0}.{1:02d}".format(
+                    *divmod(pence - 10, 100)),
+                "currency": "GBP", "name": None, "description": None,
+                "status": status, "source_type": "pre_authorization",
+                "source_id": preauth_ids[n % pre_authorizations]
+                if pre_authorizations else None,
+                "user_id": user_ids[n % users] if users else None,
+                "payout_id": payout_ids[n % payouts]
+                if payouts and status == "withdrawn" else None,
+                "can_be_retried": status == "failed",
+                "can_be_cancelled": status == "pending",
+                "is_setup_fee": False, "charge_customer_at": None,
+                "paid_at": timestamp(n + 1) if status != "pending" else None,
+                "created_at": timestamp(n),
+            })
+        return fake
+
+    def _new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return "0FAKE{0:09d}".format(self._next_id)
+
+    def add(self, collection, attrs):
+        """Add a resource to a collection, returning its attributes
+
+        An id, `merchant_id` and `uri` are filled in if missing.
+        """
+        attrs = dict(attrs)
+        attrs.setdefault("id", self._new_id())
+        if collection != "merchants":
+            attrs.setdefault("merchant_id", self.merchant_id)
+        attrs.setdefault("uri", "{0}{1}/{2}/{3}".format(
+            FAKE_BASE_URL, _API_PREFIX, collection, attrs["id"]))
+        with self._lock:
+            self.resources[collection][attrs["id"]] = attrs
+        return attrs
+
+    def fail_next(self, count=1, status=None, retry_after=None):
+        """Fail the next `count` requests with `status`, by default the
+        fake's `error_status`, and optionally a `Retry-After` header"""
+        with self._lock:
+            for _ in range(count):
+                self._failures.append((status or self.error_status,
+                                       retry_after))
+
+    def delay(self):
+        """The number of seconds the next request should take"""
+        if isinstance(self.latency, tuple):
+            with self._lock:
+                return self._random.uniform(*self.latency)
+        return self.latency
+
+    def send(self, method, url, **options):
+        """Handle a request after the configured latency, implementing
+        :py:meth:`gocardless.request.Transport.send`"""
+        delay = self.delay()
+        if delay:
+            time.sleep(delay)
+        return self.handle(method, url, **options)
+
+    def handle(self, method, url, params=None, data=None, headers=None,
+               **options):
+        """Handle a request immediately, returning a :py:class:`FakeResponse`
+        """
+        path = urlparse(url).path
+        if path.startswith(_API_PREFIX):
+            path = path[len(_API_PREFIX):]
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats[method] += 1
+            failure = self._failures.popleft() if self._failures else None
+            if failure is None and self.error_rate and \
+                    self._random.random() < self.error_rate:
+                failure = (self.error_status, None)
+            timeout = self.timeout_rate and \
+                self._random.random() < self.timeout_rate
+            if timeout:
+                self.stats["timeouts"] += 1
+            elif failure is not None:
+                self.stats["errors"] += 1
+        if timeout:
+            raise RequestTimeoutError("Request to {0} timed out".format(url))
+        if failure is not None:
+            status, retry_after = failure
+            failure_headers = {}
+            if retry_after is not None:
+                failure_headers["Retry-After"] = str(retry_after)
+            return FakeResponse(status, {"error": ["Injected failure"]},
+                                failure_headers)
+        payload = json.loads(data) if data else {}
+        key = (headers or {}).get("Idempotency-Key")
+        if key is not None:
+            with self._lock:
+                if key in self._idempotent:
+                    return self._idempotent[key]
+        response = self._route(method, path, params or {}, payload)
+        if key is not None and response.ok:
+            with self._lock:
+                self._idempotent.setdefault(key, response)
+        return response
+
+    def _route(self, method, path, params, payload):
+        if path == "/confirm" and method == "post":
+            return FakeResponse(200, {"success": True})
+        if path == "/bills" and method == "post":
+            return self._create_bill(payload.get("bill", {}))
+        match = _RESOURCE_PATH.match(path)
+        if match is None:
+            return _not_found()
+        collection, id, action = match.groups()
+        if collection not in self.resources:
+            return _not_found()
+        with self._lock:
+            attrs = self.resources[collection].get(id)
+        if attrs is None:
+            return _not_found()
+        if action is None and method == "get":
+            return FakeResponse(200, attrs)
+        if collection == "merchants" and method == "get" and \
+                action in self.resources:
+            return self._list(action, params)
+        return self._act(collection, attrs, action, method)
+
+    def _list(self, collection, params):
+        params = dict(params)
+        page = int(params.pop("page", 1))
+        per_page = params.pop("per_page", None)
+        after = params.pop("after", None)
+        before = params.pop("before", None)
+        with self._lock:
+            items = list(self.resources[collection].values())
+        matching = [
+            item for item in items
+            if (after is None or item.get("created_at") > after) and
+            (before is None or item.get("created_at") < before) and
+            all(six.text_type(item.get(k)) == six.text_type(v)
+                for k, v in six.iteritems(params))]
+        if per_page is None:
+            return FakeResponse(200, matching)
+        start = (page - 1) * int(per_page)
+        return FakeResponse(200, matching[start:start + int(per_page)])
+
+    def _create_bill(self, bill):
+        with self._lock:
+            preauth = self.resources["pre_authorizations"].get(
+                bill.get("pre_authorization_id"))
+        if preauth is None:
+            return FakeResponse(422, {"errors": {
+                "pre_authorization_id": ["is invalid"]}})
+        if "amount" not in bill:
+            return FakeResponse(422, {"errors": {"amount": ["is missing"]}})
+        now = datetime.datetime.utcnow().strftime(DATETIME_FORMAT)
+        attrs = self.add("bills", {
+            "amount": six.text_type(bill["amount"]),
+            "gocardless_fees": "0.00", "partner_fees": "0.00",
+            "amount_minus_fees": six.text_type(bill["amount"]),
+            "currency": bill.get("currency") or preauth.get("currency"),
+            "name": bill.get("name"), "description": bill.get("description"),
+            "status": "pending", "source_type": "pre_authorization",
+            "source_id": preauth["id"], "user_id": preauth.get("user_id"),
+            "payout_id": None, "can_be_retried": False,
+            "can_be_cancelled": True, "is_setup_fee": False,
+            "charge_customer_at": bill.get("charge_customer_at"),
+            "paid_at": None, "created_at": now,
+        })
+        return FakeResponse(201, attrs)
+
+    def _act(self, collection, attrs, action, method):
+        transitions = {
+            ("bills", "cancel", "put"): ("pending", "cancelled"),
+            ("bills", "retry", "post"): ("failed", "pending"),
+            ("bills", "refund", "post"): ("paid", "refunded"),
+            ("subscriptions", "cancel", "put"): ("active", "cancelled"),
+            ("pre_authorizations", "cancel", "put"): ("active", "cancelled"),
+        }
+        transition = transitions.get((collection, action, method))
+        if transition is None:
+            return _not_found()
+        with self._lock:
+            if attrs.get("status") != transition[0]:
+                return FakeResponse(422, {"error": [
+                    "Cannot {0} a {1} resource".format(
+                        action, attrs.get("status"))]})
+            attrs = dict(attrs, status=transition[1],
+                         updated_at=datetime.datetime.utcnow().strftime(
+                             DATETIME_FORMAT))
+            if collection == "bills":
+                attrs["can_be_cancelled"] = attrs["status"] == "pending"
+                attrs["can_be_retried"] = False
+            self.resources[collection][attrs["id"]] = attrs
+        return FakeResponse(200, attrs)
+
+
+def _not_found():
+    return FakeResponse(404, {"error": ["Resource not found"]})
@@ -0,0 +1,46 @@
+import threading
+
+
+class IdentityMap(object):
+    """Holds at most one instance of each resource, keyed by (class, id)
+
+    While a client has an identity map, reference accessors such as
+    `bill.user()` return the instance already in the map rather than fetching
+    it again, so iterating over many bills only fetches each distinct user
+    once. See :py:meth:`gocardless.Client.unit_of_work` and
+    :py:func:`gocardless.resources.prefetch_related`.
+
+    Identity maps are only supported by synchronous clients.
+    """
+
+    def __init__(self):
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def get(self, klass, id):
+        return self._resources.get((klass, id))
+
+    def add(self, resource):
+        """Add `resource` unless an instance with its id is already held,
+        returning the instance held"""
+        with self._lock:
+            return self._resources.setdefault((type(resource), resource.id),
+                                              resource)
+
+    def get_or_load(self, klass, id, load):
+        """Return the held instance, or the result of calling `load` which is
+        then held"""
+        resource = self.get(klass, id)
+        if resource is None:
+            resource = self.add(load())
+        return resource
+
+    def __contains__(self, key):
+        return key in self._resources
+
+    def __len__(self):
+        return len(self._resources)
+
+    def clear(self):
+        with self._lock:
+            self._resources.clear()
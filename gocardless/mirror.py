@@ -0,0 +1,151 @@
+"""A local SQLite mirror of GoCardless resources
+
+The mirror stores the attributes of resources, as returned by the API, and
+answers queries on their indexed fields without making any requests:
+
+.. code-block:: python
+
+    >>> mirror = Mirror("gocardless.db", client)
+    >>> mirror.save(merchant.iter_bills())
+    >>> mirror.query(Bill, status="failed", user_id="0K636ZX8TFW7CA")
+    [<gocardless.resources.Bill at 0x29a6050>]
+
+It can be kept up to date with the change events of a
+:py:class:`gocardless.sync.Synchronizer`, see :py:meth:`Mirror.apply`.
+"""
+
+import json
+import sqlite3
+import threading
+
+import six
+
+INDEXED_FIELDS = ("status", "user_id", "source_id", "payout_id",
+                  "created_at")
+"""The fields which the mirror can be queried by, as well as `id`"""
+
+_COLUMNS = ("resource_type", "id") + INDEXED_FIELDS + ("data",)
+
+
+def _resource_type(klass):
+    return klass.endpoint.split("/")[1]
+
+
+class Mirror(object):
+    """Persists resources to an SQLite database"""
+
+    def __init__(self, path=":memory:", client=None):
+        """Open a mirror, creating its tables if needed
+
+        :param path: The database file, by default the mirror is kept in
+          memory.
+        :param client: The client given to resources loaded from the mirror,
+          used by their accessors.
+        """
+        self.client = client
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS resources ("
+                "resource_type TEXT NOT NULL, id TEXT NOT NULL, "
+                "status TEXT, user_id TEXT, source_id TEXT, payout_id TEXT, "
+                "created_at TEXT, data TEXT NOT NULL, "
+                "PRIMARY KEY (resource_type, id))")
+            for field in INDEXED_FIELDS:
+                self._conn.execute(
+                    "CREATE INDEX IF NOT EXISTS resources_{0} ON resources "
+                    "(resource_type, {0})".format(field))
+            self._conn.commit()
+
+    def save(self, resources):
+        """Insert or replace resources, returning the number saved"""
+        rows = []
+        for resource in resources:
+            attrs = resource._raw_attrs
+            rows.append(
+                (_resource_type(type(resource)), resource.id) +
+                tuple(attrs.get(field) for field in INDEXED_FIELDS) +
+                (json.dumps(attrs),))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO resources ({0}) VALUES ({1})".format(
+                    ", ".join(_COLUMNS), ", ".join("?" * len(_COLUMNS))),
+                rows)
+            self._conn.commit()
+        return len(rows)
+
+    def apply(self, events):
+        """Save the resources of :py:class:`gocardless.sync.ChangeEvent`
+        objects, returning the number saved"""
+        return self.save(event.resource for event in events)
+
+    def _where(self, klass, filters):
+        clauses = ["resource_type = ?"]
+        args = [_resource_type(klass)]
+        for field, value in sorted(six.iteritems(filters)):
+            if field != "id" and field not in INDEXED_FIELDS:
+                raise ValueError("Cannot query by {0}, the mirror is indexed "
+                                 "by id, {1}".format(
+                                     field, ", ".join(INDEXED_FIELDS)))
+            if isinstance(value, (list, tuple, set, frozenset)):
+                value = list(value)
+                clauses.append("{0} IN ({1})".format(
+                    field, ", ".join("?" * len(value))))
+                args.extend(value)
+            elif value is None:
+                clauses.append("{0} IS NULL".format(field))
+            else:
+                clauses.append("{0} = ?".format(field))
+                args.append(value)
+        return " AND ".join(clauses), args
+
+    def query(self, klass, order_by="created_at", limit=None, **filters):
+        """Find resources of class `klass` matching all of `filters`
+
+        Filters are keyword arguments naming `id` or one of the
+        :py:data:`INDEXED_FIELDS`. A list of values matches any of them and
+        None matches missing values.
+
+        :param klass: The resource class, e.g. `gocardless.resources.Bill`.
+        :param order_by: The indexed field to sort by, prefix with "-" for
+          descending order.
+        :param limit: The maximum number of resources to return.
+        """
+        where, args = self._where(klass, filters)
+        descending = order_by.startswith("-")
+        order_field = order_by.lstrip("-")
+        if order_field != "id" and order_field not in INDEXED_FIELDS:
+            raise ValueError("Cannot order by {0}".format(order_field))
+        sql = "SELECT data FROM resources WHERE {0} ORDER BY {1}{2}".format(
+            where, order_field, " DESC" if descending else "")
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [klass(json.loads(row[0]), self.client) for row in rows]
+
+    def get(self, klass, id):
+        """Return the resource of class `klass` with `id`, or None"""
+        found = self.query(klass, id=id)
+        return found[0] if found else None
+
+    def count(self, klass, **filters):
+        """Count the resources of class `klass` matching `filters`"""
+        where, args = self._where(klass, filters)
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM resources WHERE " + where,
+                args).fetchone()[0]
+
+    def delete(self, klass, id):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM resources WHERE resource_type = ? AND id = ?",
+                (_resource_type(klass), id))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,176 @@
+"""Clients for many merchants
+
+Partners holding access tokens for many merchants can keep them in a
+:py:class:`ClientPool` rather than constructing a client for each one. The
+pool stores only each merchant's token, creates clients when they are asked
+for and sends every request over one shared connection pool:
+
+.. code-block:: python
+
+    >>> pool = ClientPool(app_id, app_secret, tokens={merchant_id: token})
+    >>> result = pool.map(lambda client: client.merchant().bills())
+    >>> result.results[merchant_id]
+    [<gocardless.resources.Bill at 0x29a6050>]
+"""
+
+import collections
+import threading
+import weakref
+
+from gocardless.client import Client
+from gocardless.context import using
+from gocardless.concurrency import bounded_map
+from gocardless.request import create_session
+
+import six
+
+# Options holding state which is not kept apart per merchant
+_PER_CLIENT_OPTIONS = ("identity_map", "validator_cache")
+
+MapResult = collections.namedtuple("MapResult", ["results", "errors"])
+"""The outcome of :py:meth:`ClientPool.map`, dictionaries of merchant ids to
+the result of the function or to the exception it raised"""
+
+
+class ClientPool(object):
+    """Holds the access tokens of many merchants
+
+    Clients are created on demand and share the pool's session. While a
+    client for a merchant is still referenced, :py:meth:`client` returns that
+    same client, so its `max_concurrency` cap covers every caller.
+    """
+
+    def __init__(self, app_id, app_secret, tokens=None, session=None,
+                 pool_maxsize=10, max_concurrency=None, **client_options):
+        """Create a pool
+
+        :param app_id: Your application id.
+        :param app_secret: Your app secret.
+        :param tokens: A dictionary, or (merchant id, access token) pairs, of
+          the merchants to add.
+        :param session: A `requests.Session` shared by every client, by
+          default one is created with `pool_maxsize` connections.
+        :param pool_maxsize: The maximum number of connections to keep open,
+          this should be at least the number of threads using the pool.
+        :param max_concurrency: The maximum number of requests in flight for
+          any one merchant, None for no limit.
+        :param client_options: Other keyword arguments, such as
+          `retry_policy` or `timeout`, given to every
+          :py:class:`gocardless.Client`. A `cache` may be shared since its
+          entries are scoped to each merchant, but an `identity_map` or
+          `validator_cache` would mix merchants' resources and is rejected.
+        """
+        for name in _PER_CLIENT_OPTIONS:
+            if client_options.get(name) is not None:
+                raise ValueError("A {0} cannot be shared between the "
+                                 "merchants of a ClientPool".format(name))
+        self._app_id = app_id
+        self._app_secret = app_secret
+        self._tokens = {}
+        self._session = session
+        self._pool_maxsize = pool_maxsize
+        self._max_concurrency = max_concurrency
+        self._client_options = client_options
+        self._clients = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+        if tokens is not None:
+            if isinstance(tokens, dict):
+                tokens = six.iteritems(tokens)
+            for merchant_id, access_token in tokens:
+                self.add(merchant_id, access_token)
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = create_session(
+                    pool_maxsize=self._pool_maxsize)
+            return self._session
+
+    @property
+    def merchant_ids(self):
+        return list(self._tokens)
+
+    def __len__(self):
+        return len(self._tokens)
+
+    def __contains__(self, merchant_id):
+        return merchant_id in self._tokens
+
+    def add(self, merchant_id, access_token):
+        """Add a merchant, or replace its access token"""
+        with self._lock:
+            self._tokens[merchant_id] = access_token
+            self._clients.pop(merchant_id, None)
+
+    def remove(self, merchant_id):
+        with self._lock:
+            del self._tokens[merchant_id]
+            self._clients.pop(merchant_id, None)
+
+    def client(self, merchant_id):
+        """Return a :py:class:`gocardless.Client` for a merchant"""
+        session = self.session
+        with self._lock:
+            client = self._clients.get(merchant_id)
+            if client is None:
+                try:
+                    access_token = self._tokens[merchant_id]
+                except KeyError:
+                    raise KeyError("Unknown merchant {0}".format(merchant_id))
+                client = Client(self._app_id, self._app_secret,
+                                access_token=access_token,
+                                merchant_id=merchant_id, session=session,
+                                max_concurrency=self._max_concurrency,
+                                **self._client_options)
+                self._clients[merchant_id] = client
+            return client
+
+    def imap(self, func, merchant_ids=None, max_workers=8, ordered=False):
+        """Apply `func` to the client of each merchant concurrently
+
+        `func` runs inside :py:func:`gocardless.using` with the merchant's
+        client, so `Resource.find` uses it too, and keeps any environment or
+        base url set where `imap` was called. Yields a
+        :py:class:`gocardless.concurrency.Outcome` for each merchant,
+        whose `item` is the merchant id, as soon as it finishes or in
+        `merchant_ids` order if `ordered` is true.
+
+        :param func: A function taking a client.
+        :param merchant_ids: The merchants to apply `func` for, by default
+          every merchant in the pool.
+        :param max_workers: The maximum number of merchants processed at once.
+        """
+        if merchant_ids is None:
+            merchant_ids = self.merchant_ids
+
+        def call(merchant_id):
+            with using(self.client(merchant_id)) as client:
+                return func(client)
+        return bounded_map(call, merchant_ids, max_workers=max_workers,
+                           ordered=ordered)
+
+    def map(self, func, merchant_ids=None, max_workers=8):
+        """Apply `func` to the client of each merchant concurrently and
+        collect the results
+
+        Failures do not stop the other merchants being processed, they are
+        collected in the `errors` of the :py:data:`MapResult` returned.
+        Arguments are as for :py:meth:`imap`.
+        """
+        results = collections.OrderedDict()
+        errors = collections.OrderedDict()
+        for outcome in self.imap(func, merchant_ids, max_workers=max_workers,
+                                 ordered=True):
+            if outcome.error is not None:
+                errors[outcome.item] = outcome.error
+            else:
+                results[outcome.item] = outcome.result
+        return MapResult(results, errors)
+
+    def close(self):
+        """Close the connections held by the pool's session"""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
@@ -0,0 +1,198 @@
+"""Client side rate limiting
+
+A :py:class:`RateLimiter` keeps a client's requests under the API's rate
+limits. Reads (GET requests) and writes (everything else) draw from separate
+token buckets, each allowing a sustained number of requests per second plus a
+burst. Pass one to :py:class:`gocardless.Client` and share the client, or the
+limiter, between threads:
+
+.. code-block:: python
+
+    >>> limiter = RateLimiter(read_rate=20, write_rate=5)
+    >>> client = Client(app_id, app_secret, token, merchant_id,
+    ...                 rate_limiter=limiter)
+
+Requests are granted tokens in the order they ask for them, so a busy thread
+cannot starve the others. When the API replies with `Retry-After` or reports
+that no requests remain in its `X-RateLimit-Remaining` header, the bucket is
+paused until the limit resets.
+"""
+
+import calendar
+import email.utils
+import threading
+import time
+
+from gocardless import utils
+
+READ = "read"
+WRITE = "write"
+
+
+def parse_retry_after(value, now=None):
+    """Return the number of seconds a `Retry-After` header asks to wait
+
+    The header is either a number of seconds or an HTTP date. None is
+    returned for missing or malformed values.
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    parsed = email.utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    if now is None:
+        now = time.time()
+    return max(email.utils.mktime_tz(parsed) - now, 0.0)
+
+
+class TokenBucket(object):
+    """A thread safe token bucket
+
+    Tokens are added at `rate` per second up to `capacity`. Each call to
+    :py:meth:`acquire` takes one token, reserving the next one to become
+    available when the bucket is empty, so callers are served first come
+    first served and wait outside the lock.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """Create a bucket which starts full
+
+        :param rate: The number of tokens added per second.
+        :param capacity: The maximum number of tokens, i.e. the largest burst
+          allowed, defaults to `rate`.
+        """
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = utils.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {"acquired": 0, "delayed": 0, "waited": 0.0}
+
+    @property
+    def stats(self):
+        """A dictionary of the number of tokens `acquired`, how many of those
+        were `delayed` and the total seconds `waited` for them"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity,
+                               self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def reserve(self):
+        """Take a token, returning the number of seconds to wait before it
+        may be used"""
+        with self._lock:
+            now = utils.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            delay = max(-self._tokens / self.rate, 0.0)
+            self._stats["acquired"] += 1
+            if delay:
+                self._stats["delayed"] += 1
+                self._stats["waited"] += delay
+        return delay
+
+    def acquire(self):
+        """Wait until a token is available and take it"""
+        delay = self.reserve()
+        if delay:
+            self.sleep(delay)
+        return delay
+
+    def pause(self, seconds):
+        """Grant no tokens for at least `seconds`"""
+        with self._lock:
+            self._refill(utils.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+    def limit_to(self, remaining):
+        """Hold no more than `remaining` tokens, e.g. as reported by the
+        server"""
+        with self._lock:
+            self._refill(utils.monotonic())
+            self._tokens = min(self._tokens, float(remaining))
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class RateLimiter(object):
+    """Limits the rate of a client's reads and writes
+
+    :py:meth:`acquire` is called before each request is sent and
+    :py:meth:`update` with the headers of each response.
+    """
+
+    def __init__(self, read_rate=10, write_rate=5, read_burst=None,
+                 write_burst=None):
+        """Create a rate limiter
+
+        :param read_rate: The number of GET requests allowed per second.
+        :param write_rate: The number of other requests allowed per second.
+        :param read_burst: The number of GET requests which may be sent at
+          once after a quiet period, defaults to `read_rate`.
+        :param write_burst: As `read_burst`, for other requests.
+        """
+        self.buckets = {
+            READ: TokenBucket(read_rate, read_burst),
+            WRITE: TokenBucket(write_rate, write_burst),
+        }
+
+    def bucket(self, method):
+        """The :py:class:`TokenBucket` requests using `method` draw from"""
+        return self.buckets[READ if method == "get" else WRITE]
+
+    @property
+    def stats(self):
+        return dict((name, bucket.stats)
+                    for name, bucket in self.buckets.items())
+
+    def acquire(self, method):
+        """Wait until a request using `method` may be sent"""
+        return self.bucket(method).acquire()
+
+    def update(self, method, headers):
+        """Adjust to the rate limit headers of a response
+
+        `Retry-After` pauses the bucket for the time given, and an
+        `X-RateLimit-Remaining` of zero pauses it until `X-RateLimit-Reset`,
+        a number of seconds or a Unix timestamp.
+        """
+        bucket = self.bucket(method)
+        retry_after = parse_retry_after(headers.get("Retry-After"))
+        if retry_after:
+            bucket.pause(retry_after)
+        remaining = headers.get("X-RateLimit-Remaining")
+        if remaining is None:
+            return
+        try:
+            remaining = int(remaining)
+        except ValueError:
+            return
+        bucket.limit_to(remaining)
+        if remaining > 0:
+            return
+        reset = _reset_seconds(headers.get("X-RateLimit-Reset"))
+        if reset:
+            bucket.pause(reset)
+
+
+def _reset_seconds(value):
+    if value is None:
+        return None
+    try:
+        reset = float(value)
+    except ValueError:
+        return parse_retry_after(value)
+    # Values larger than a day are timestamps rather than durations
+    if reset > 86400:
+        reset -= calendar.timegm(time.gmtime())
+    return max(reset, 0.0)
@@ -1,13 +1,105 @@
 import gocardless
+import itertools
 import json
 import requests
 
+from gocardless.exceptions import (ServerError, RateLimitError,
+                                   RequestTimeoutError)
+from gocardless.ratelimit import parse_retry_after
+from gocardless.utils import iter_json_array, to_query
+
+#Errors raised while sending a request which are worth retrying
+TRANSIENT_ERRORS = (requests.exceptions.ConnectionError, RequestTimeoutError,
+                    ServerError, RateLimitError)
+_TIMEOUT_ERRORS = (requests.exceptions.Timeout,)
+
+STREAM_CHUNK_SIZE = 16384
+
+
+def create_session(pool_connections=10, pool_maxsize=10, keep_alive=True):
+    """Create a `requests.Session` backed by a pool of persistent connections
+
+    :param pool_connections: The number of host pools to keep.
+    :param pool_maxsize: The maximum number of connections kept per host, this
+      should be at least the number of threads sharing the session.
+    :param keep_alive: Whether connections should be kept open between
+      requests.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                            pool_maxsize=pool_maxsize)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def connection_stats(session):
+    """Return the connection reuse counters for a session
+
+    The result is a dictionary containing the number of connections opened,
+    the number of requests sent over them and the number of requests which
+    reused an already open connection.
+    """
+    connections = requests_sent = 0
+    adapters = set(session.adapters.values())
+    for adapter in adapters:
+        pools = getattr(adapter, 'poolmanager', None)
+        if pools is None:
+            continue
+        for key in list(pools.pools.keys()):
+            pool = pools.pools.get(key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+    return {
+        'connections': connections,
+        'requests': requests_sent,
+        'reused': max(requests_sent - connections, 0),
+    }
+
+
+class Transport(object):
+    """Sends HTTP requests for :py:class:`Request`
+
+    Subclasses implement :py:meth:`send`, which returns an object with the
+    interface of a `requests.Response` used by the library: `status_code`,
+    `ok`, `headers`, `json()` and `iter_content(chunk_size)`.
+    """
+
+    def send(self, method, url, **options):
+        """Send a request
+
+        :param method: The HTTP method, e.g. "get".
+        :param url: The full url of the request.
+        :param options: The keyword arguments `requests` would be called
+          with, such as `headers`, `params`, `data`, `auth` and `timeout`.
+        """
+        raise NotImplementedError()
+
+
+class RequestsTransport(Transport):
+    """Sends requests with the `requests` library, using `session` if given"""
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def send(self, method, url, **options):
+        return getattr(self.session or requests, method)(url, **options)
+
 
 class Request(object):
 
-    def __init__(self, method, url, params=None):
+    def __init__(self, method, url, params=None, session=None,
+                 transport=None):
         self._method = method
         self._url = url
+        self._transport = transport or RequestsTransport(session)
+        self._validators = None
+        self._rate_limiter = None
+        self._stream = False
         headers = {}
         headers["Accept"] = "application/json"
         lib_version = gocardless.get_version()
@@ -20,6 +112,19 @@ class Request(object):
         if not self._valid_method(method):
             raise ValueError('Invalid method {0}'.format(method))
 
+    @property
+    def method(self):
+        return self._method
+
+    @property
+    def url(self):
+        return self._url
+
+    @property
+    def options(self):
+        """The keyword arguments the request is sent with"""
+        return self._opts
+
     def _valid_method(self, method):
         return method in ('get', 'post', 'put')
 
@@ -30,6 +135,40 @@ class Request(object):
         auth_header = 'bearer {0}'.format(token)
         self._opts['headers']['Authorization'] = auth_header
 
+    def use_validator_cache(self, cache):
+        """Make GET requests conditional using a
+        :py:class:`gocardless.cache.ValidatorCache`"""
+        self._validators = cache
+
+    def use_rate_limiter(self, limiter):
+        """Wait for a :py:class:`gocardless.ratelimit.RateLimiter` before
+        sending and report the response's rate limit headers to it"""
+        self._rate_limiter = limiter
+
+    def _validator_key(self):
+        if self._opts.get("params"):
+            return "{0}?{1}".format(self._url, to_query(self._opts["params"]))
+        return self._url
+
+    def set_timeout(self, timeout):
+        """Set the timeout in seconds, or a (connect, read) tuple"""
+        if timeout is not None:
+            self._opts['timeout'] = timeout
+
+    def use_streaming(self):
+        """Decode list responses incrementally
+
+        :py:meth:`perform` then returns an iterator over the elements of a
+        JSON array body, which are decoded as the body is downloaded. Other
+        bodies, such as error objects, are decoded and returned whole.
+        Streamed responses are never conditional.
+        """
+        self._stream = True
+        self._opts['stream'] = True
+
+    def set_idempotency_key(self, key):
+        self._opts['headers']['Idempotency-Key'] = key
+
     def set_payload(self, payload):
         if payload is not None:
             # Set the payload type - always JSON
@@ -38,7 +177,100 @@ class Request(object):
             self._opts['data'] = json.dumps(payload)
 
     def perform(self):
-        fetch_func = getattr(requests, self._method)
-        response = fetch_func(self._url, **self._opts)
-        return response.json()
+        cached = None
+        if self._validators is not None and self._method == 'get' and \
+                not self._stream:
+            key = self._validator_key()
+            cached = self._validators.get(key)
+            if cached is not None:
+                headers = self._opts['headers']
+                if cached.etag:
+                    headers['If-None-Match'] = cached.etag
+                if cached.last_modified:
+                    headers['If-Modified-Since'] = cached.last_modified
+
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(self._method)
+        try:
+            response = self._transport.send(self._method, self._url,
+                                            **self._opts)
+        except _TIMEOUT_ERRORS as error:
+            raise RequestTimeoutError("Request to {0} timed out: {1}".format(
+                self._url, error))
+        self.receive(response)
+        if cached is not None and response.status_code == 304:
+            self._validators.not_modified(key)
+            return cached.body
+        if self._stream:
+            return _stream_body(response)
+        body = response.json()
+        if self._validators is not None and self._method == 'get' and \
+                response.ok:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._validators.set(key, etag, last_modified, body)
+        return body
+
+    def receive(self, response):
+        """Report the rate limit headers of `response` to the request's rate
+        limiter and raise for a failed status, see :py:meth:`check_status`
+
+        Transports which send a request themselves, such as those of
+        :py:class:`gocardless.aio.AsyncClient`, call this before decoding
+        the body.
+        """
+        if self._rate_limiter is not None:
+            self._rate_limiter.update(self._method, response.headers)
+        self.check_status(response)
+
+    def check_status(self, response):
+        """Raise :py:exc:`gocardless.exceptions.RateLimitError` or
+        :py:exc:`gocardless.exceptions.ServerError` for a response which
+        failed with a 429 or 5xx status"""
+        if response.status_code == 429:
+            self._raise_rate_limit_error(response)
+        if not response.ok and response.status_code >= 500:
+            self._raise_server_error(response)
+
+    def _raise_rate_limit_error(self, response):
+        errors = _error_messages(response)
+        message = "Rate limit exceeded calling api"
+        if errors is not None:
+            message += ", message was "
+        raise RateLimitError(message, errors, retry_after=parse_retry_after(
+            response.headers.get('Retry-After')))
+
+    def _raise_server_error(self, response):
+        errors = _error_messages(response)
+        message = "Server error {0} calling api".format(response.status_code)
+        if errors is not None:
+            message += ", message was "
+        raise ServerError(message, errors, status_code=response.status_code)
+
+
+def _error_messages(response):
+    try:
+        body = response.json()
+    except ValueError:
+        return None
+    if isinstance(body, dict):
+        return body.get("errors") or body.get("error")
+    return None
+
 
+def _stream_body(response):
+    """Return an iterator over the elements of an array body, or the decoded
+    body if it is not an array"""
+    chunks = response.iter_content(chunk_size=STREAM_CHUNK_SIZE)
+    head = []
+    stripped = b""
+    for chunk in chunks:
+        head.append(chunk)
+        stripped = chunk.lstrip()
+        if stripped:
+            break
+    chunks = itertools.chain(head, chunks)
+    if stripped[:1] == b"[":
+        return iter_json_array(chunks)
+    return json.loads(b"".join(chunks).decode("utf-8"))
@@ -1,14 +1,166 @@
-import datetime
+import collections
+import decimal
+import functools
 import re
 import sys
 
-from . import utils
-import gocardless
+from concurrent.futures import ThreadPoolExecutor
+
+from . import context, utils
 from gocardless.exceptions import ClientError
+from gocardless.concurrency import bounded_map
+from gocardless.identity import IdentityMap
 
 import six
 
 
+def _discard(response):
+    return None
+
+
+def iter_pages(client, path, klass, per_page=100, prefetch=False,
+               deadline=None, stream=False, **params):
+    """Lazily iterate over a paginated list of resources
+
+    Pages of `per_page` resources are fetched as the iterator reaches them, so
+    stopping early never downloads the remaining pages. If `prefetch` is true
+    the next page is fetched in a background thread while the current one is
+    being consumed.
+
+    :param client: The client to fetch pages with.
+    :param path: The path of the list, as passed to `client.api_get`.
+    :param klass: The `Resource` subclass to instantiate for each item.
+    :param per_page: The number of resources to fetch with each request.
+    :param prefetch: Whether to fetch the next page in the background.
+    :param deadline: The number of seconds allowed for fetching every page,
+      after which :py:exc:`gocardless.exceptions.RequestTimeoutError` is
+      raised.
+    :param stream: Whether to decode each page incrementally as it is
+      downloaded, so only one item of a page is held in memory at a time.
+      A streamed page must be consumed before the next one is requested, so
+      it cannot be combined with `prefetch`.
+    """
+    if stream and prefetch:
+        raise ValueError("prefetch cannot be combined with stream")
+    kwargs = {}
+    if deadline is not None:
+        kwargs["deadline"] = utils.monotonic() + deadline
+    if stream:
+        kwargs["stream"] = True
+
+    def fetch(page):
+        page_params = dict(params, page=page, per_page=per_page)
+        return client.api_get(path, params=page_params, **kwargs)
+    if prefetch:
+        # Pages fetched in the background use the caller's environment
+        fetch = context.bind(fetch)
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    pending = None
+    try:
+        page = 1
+        if executor:
+            pending = executor.submit(fetch, page)
+        while True:
+            data = pending.result() if executor else fetch(page)
+            if executor and len(data) >= per_page:
+                pending = executor.submit(fetch, page + 1)
+            count = 0
+            for attrs in data:
+                count += 1
+                yield klass(attrs, client)
+            if count < per_page:
+                return
+            page += 1
+    finally:
+        if executor:
+            pending.cancel()
+            executor.shutdown(wait=False)
+
+
+_klasses = {}
+
+
+def _get_klass_from_name(module_name, name):
+    """Find the resource class called `name` (e.g. "pre_authorizations")"""
+    key = (module_name, name)
+    klass = _klasses.get(key)
+    if klass is None:
+        module = sys.modules[module_name]
+        klass = getattr(module, utils.singularize(utils.camelize(name)))
+        _klasses[key] = klass
+    return klass
+
+
+class ReferenceAccessor(object):
+    """Fetches the resource referenced by one of a class's `reference_fields`
+
+    Accessing the attribute on an instance returns a function which fetches
+    the referenced resource using the instance's client.
+    """
+
+    def __init__(self, fieldname):
+        self.fieldname = fieldname
+        self.name = fieldname.replace("_id", "")
+
+    def __get__(self, inst, owner):
+        if inst is None:
+            return self
+        return functools.partial(self.fetch, inst)
+
+    def klass(self, owner):
+        return _get_klass_from_name(owner.__module__, self.name)
+
+    def fetch(self, inst):
+        klass = self.klass(type(inst))
+        id = inst._raw_attrs[self.fieldname]
+        client = inst.client
+        identity_map = getattr(client, "identity_map", None)
+        if isinstance(identity_map, IdentityMap):
+            return identity_map.get_or_load(
+                klass, id, lambda: klass.find_with_client(id, client))
+        return klass.find_with_client(id, client)
+
+
+class DateField(object):
+    """A date field which is parsed from the raw attributes when accessed"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, inst, owner):
+        if inst is None:
+            return self
+        overflow = inst._overflow
+        if overflow and self.name in overflow:
+            return overflow[self.name]
+        val = inst._raw_attrs.get(self.name)
+        if val is None:
+            return None
+        return utils.parse_datetime(val)
+
+    def __set__(self, inst, value):
+        inst._set_field(self.name, value)
+
+
+class MoneyField(object):
+    """An amount of money which is parsed into a `Decimal` when accessed"""
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, inst, owner):
+        if inst is None:
+            return self
+        overflow = inst._overflow
+        if overflow and self.name in overflow:
+            return overflow[self.name]
+        return utils.parse_amount(inst._raw_attrs.get(self.name))
+
+    def __set__(self, inst, value):
+        inst._set_field(self.name, value)
+
+
 class ResourceMetaClass(type):
 
     def __new__(meta, name, bases, attrs):
@@ -16,7 +168,28 @@ class ResourceMetaClass(type):
         for base in bases:
             if hasattr(base, "date_fields") and "date_fields" in attrs:
                 attrs["date_fields"].extend(base.date_fields)
-        return type.__new__(meta, name, bases, attrs)
+            if hasattr(base, "money_fields") and "money_fields" in attrs:
+                attrs["money_fields"].extend(base.money_fields)
+        for fieldname in attrs.get("date_fields", []):
+            attrs[fieldname] = DateField(fieldname)
+        for fieldname in attrs.get("money_fields", []):
+            attrs[fieldname] = MoneyField(fieldname)
+        for fieldname in attrs.get("reference_fields", []):
+            accessor = ReferenceAccessor(fieldname)
+            attrs[accessor.name] = accessor
+        cls = type.__new__(meta, name, bases, attrs)
+        #fields which are not copied on to instances as plain attributes
+        cls._special_fields = frozenset(
+            ["id", "sub_resource_uris"] + cls.date_fields +
+            cls.money_fields + cls.reference_fields)
+        #known fields stored in slots, any other field goes in the overflow
+        slot_fields = set()
+        for klass in cls.__mro__:
+            slot_fields.update(klass.__dict__.get("__slots__", ()))
+        cls._slot_fields = frozenset(
+            field for field in slot_fields
+            if not field.startswith("_") and field not in ("id", "client"))
+        return cls
 
 
 @six.add_metaclass(ResourceMetaClass)
@@ -29,80 +202,132 @@ class Resource(object):
     The class attribute `endpoint` is the path to the resource on the server.
 
     The class attribute `date_fields` names fields which will be converted
-    into `datetime.datetime` objects on construction.
+    into `datetime.datetime` objects when they are first accessed.
 
     The class attribute `reference_fields` names fields which are uris to other
     resources and will be converted into functions which can be called to
     retrieve those resources.
+
+    The class attribute `money_fields` names fields holding amounts of money,
+    which will be converted into `decimal.Decimal` objects when they are
+    accessed. :py:meth:`minor_units` returns them as an integer number of
+    pence or cents instead.
+
+    Each entry in a resource's `sub_resource_uris` becomes a method returning
+    the list of sub resources, e.g. `merchant.bills()`, and an `iter_` method
+    which lazily pages through them, e.g. `merchant.iter_bills(per_page=50)`.
+    Both kinds of accessor are resolved when they are first looked up, so
+    constructing a resource only stores its data.
+
+    Subclasses list the fields they expect in `__slots__`, these are stored
+    compactly on the instance. Any other fields are kept in an overflow
+    dictionary and are still available as attributes.
     """
 
+    __slots__ = ("id", "client", "_raw_attrs", "_overflow")
+
     date_fields = ["created_at"]
     reference_fields = []
+    money_fields = []
 
     def __init__(self, in_attrs, client):
         """Construct a resource
 
         :param in_attrs: A dictionary of attributes, usually obtained from a
-        JSON response.
+        JSON response. The resource keeps this dictionary rather than a copy
+        of it, so it should not be modified afterwards.
         :param client: an instance of gocardless.Client
         """
-        attrs = in_attrs.copy()
-        self._raw_attrs = attrs.copy()
-        self.id = attrs["id"]
-        self.client = client
-        if "sub_resource_uris" in attrs:
-            #For each subresource_uri create a method which grabs data
-            #from the URI and uses it to instantiate the relevant class
-            #and return it.
-            for name, uri in six.iteritems(attrs.pop("sub_resource_uris")):
-                path = re.sub(".*/api/v1", "", uri)
-                sub_klass = self._get_klass_from_name(name)
-                def create_get_resource_func(the_path, the_klass):
-                    # In python functions close over their environment so in
-                    # order to create the correct closure we need a function
-                    # creator, see
-                    # http://stackoverflow.com/questions/233673/
-                    #         lexical-closures-in-python/235764#235764
-                    def get_resources(inst, **params):
-                        data = inst.client.api_get(the_path, params=params)
-                        return [the_klass(attrs, self.client) for attrs in data]
-                    return get_resources
-                res_func = create_get_resource_func(path, sub_klass)
-                func_name = "{0}".format(name)
-                res_func.name = func_name
-                setattr(self, func_name,
-                        six.create_bound_method(res_func, self))
-
-        for fieldname in self.date_fields:
-            val = attrs.pop(fieldname)
-            if val is not None:
-                setattr(self, fieldname,
-                        datetime.datetime.strptime(val, "%Y-%m-%dT%H:%M:%SZ"))
-            else:
-                setattr(self, fieldname, None)
-
-        for fieldname in self.reference_fields:
-            id = attrs.pop(fieldname)
-            def create_get_func(the_klass, the_id):
-                def get_referenced_resource(inst):
-                    return the_klass.find_with_client(the_id, self.client)
-                return get_referenced_resource
-            name = fieldname.replace("_id", "")
-            klass = self._get_klass_from_name(name)
-            func = create_get_func(klass, id)
-            setattr(self, name, six.create_bound_method(func, self))
-
-        for key, value in six.iteritems(attrs):
-            setattr(self, key, value)
+        set_attr = object.__setattr__
+        set_attr(self, "_raw_attrs", in_attrs)
+        set_attr(self, "_overflow", None)
+        set_attr(self, "id", in_attrs["id"])
+        set_attr(self, "client", client)
+
+        special_fields = self._special_fields
+        for key, value in six.iteritems(in_attrs):
+            if key not in special_fields:
+                self._set_field(key, value)
+
+    def _set_field(self, name, value):
+        if name in self._slot_fields:
+            object.__setattr__(self, name, value)
+        else:
+            if self._overflow is None:
+                object.__setattr__(self, "_overflow", {})
+            self._overflow[name] = value
+
+    def __setattr__(self, name, value):
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            self._set_field(name, value)
+
+    def __delattr__(self, name):
+        try:
+            object.__delattr__(self, name)
+        except AttributeError:
+            if not self._overflow or name not in self._overflow:
+                raise
+            del self._overflow[name]
+
+    def __getattr__(self, name):
+        # Only called when normal lookup fails, so this is where fields kept
+        # in the overflow and the sub resource accessors named in
+        # `sub_resource_uris` are resolved
+        try:
+            raw_attrs = object.__getattribute__(self, "_raw_attrs")
+            overflow = object.__getattribute__(self, "_overflow")
+        except AttributeError:
+            raise AttributeError(name)
+        if overflow and name in overflow:
+            return overflow[name]
+        uris = raw_attrs.get("sub_resource_uris") or {}
+        if name in uris:
+            return functools.partial(self._get_sub_resources, name)
+        if name.startswith("iter_") and name[5:] in uris:
+            return functools.partial(self._iter_sub_resources, name[5:])
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(
+            type(self).__name__, name))
+
+    def _sub_resource_path(self, name):
+        uri = self._raw_attrs["sub_resource_uris"][name]
+        return re.sub(".*/api/v1", "", uri)
+
+    def _get_sub_resources(self, name, **params):
+        klass = self._get_klass_from_name(name)
+        client = self.client
+        data = client.api_get(self._sub_resource_path(name), params=params)
+        return utils.then(data, lambda data: ResourceList(
+            klass(attrs, client) for attrs in data))
+
+    def _iter_sub_resources(self, name, per_page=100, prefetch=False,
+                            deadline=None, stream=False, **params):
+        client = self.client
+        if getattr(type(client), "asynchronous", False):
+            # Pages fetched by an async client have to be awaited, so it
+            # returns an asynchronous iterator instead
+            return client.iter_pages(self._sub_resource_path(name),
+                                     self._get_klass_from_name(name),
+                                     per_page=per_page, prefetch=prefetch,
+                                     deadline=deadline, stream=stream,
+                                     **params)
+        return iter_pages(client, self._sub_resource_path(name),
+                          self._get_klass_from_name(name), per_page=per_page,
+                          prefetch=prefetch, deadline=deadline, stream=stream,
+                          **params)
 
     def _get_klass_from_name(self, name):
-        module = sys.modules[self.__module__]
-        klass = getattr(module, utils.singularize(utils.camelize(name)))
-        return klass
+        return _get_klass_from_name(type(self).__module__, name)
 
     def get_endpoint(self):
         return self.endpoint.replace(":id", self.id)
 
+    def minor_units(self, name):
+        """Return the money field `name` as an integer, e.g. 1005 for 10.05"""
+        amount = getattr(self, name)
+        return None if amount is None else utils.to_minor_units(amount)
+
     def __eq__(self, other):
         if isinstance(other, self.__class__):
             return self._raw_attrs == other._raw_attrs
@@ -114,55 +339,313 @@ class Resource(object):
     @classmethod
     def find_with_client(cls, id, client):
         path = cls.endpoint.replace(":id", id)
-        return cls(client.api_get(path), client)
+        return utils.then(client.api_get(path), lambda data: cls(data, client))
 
     @classmethod
     def find(cls, id):
-        if not gocardless.client:
+        return cls.find_with_client(id, cls._default_client())
+
+    @classmethod
+    def find_many(cls, ids, client=None, max_workers=8, ordered=True):
+        """Fetch many resources concurrently
+
+        Duplicate ids are only fetched once. If `ordered` is true a
+        :py:class:`ResourceList` in the same order as `ids` is returned, otherwise an
+        iterator yielding each resource as soon as it has been fetched.
+        The first failed fetch raises its exception. With an asynchronous
+        client an awaitable :py:class:`ResourceList` is returned, see
+        :py:meth:`gocardless.aio.AsyncClient.find_many`.
+
+        :param ids: The ids of the resources to fetch.
+        :param client: The client to fetch with, defaults to the client set
+          with :py:func:`gocardless.set_details`.
+        :param max_workers: The maximum number of requests in progress at
+          once.
+        :param ordered: Whether to return the resources in input order.
+        """
+        if client is None:
+            client = cls._default_client()
+        if getattr(type(client), "asynchronous", False):
+            return client.find_many(cls, ids, max_workers=max_workers,
+                                    ordered=ordered)
+        ids = list(ids)
+        unique_ids = list(collections.OrderedDict.fromkeys(ids))
+        outcomes = bounded_map(lambda id: cls.find_with_client(id, client),
+                               unique_ids, max_workers=max_workers)
+        if not ordered:
+            return _outcome_results(outcomes)
+        found = {}
+        for outcome in outcomes:
+            if outcome.error is not None:
+                raise outcome.error
+            found[outcome.item] = outcome.result
+        return ResourceList(found[id] for id in ids)
+
+    @classmethod
+    def _default_client(cls):
+        client = context.current_client()
+        if not client:
             raise ClientError("You must set your account details first")
-        return cls.find_with_client(id, gocardless.client)
+        return client
+
+
+def prefetch_related(resources, *names, **kwargs):
+    """Fetch the resources referenced by many resources in bulk
+
+    For each reference name, e.g. "user" or "payout", the distinct ids
+    referenced by `resources` which are not already in the client's identity
+    map are fetched concurrently with :py:meth:`Resource.find_many` and added
+    to it. Afterwards calling the reference accessors does not make any
+    requests:
+
+    .. code-block:: python
+
+        >>> with client.unit_of_work():
+        ...     bills = merchant.bills()
+        ...     prefetch_related(bills, "user", "payout")
+        ...     users = [bill.user() for bill in bills]
+
+    :param resources: Resources fetched with a client which has an identity
+      map.
+    :param names: The names of the reference accessors to prefetch.
+    :param max_workers: The maximum number of requests in progress at once.
+    """
+    max_workers = kwargs.pop("max_workers", 8)
+    resources = list(resources)
+    if not resources:
+        return
+    client = resources[0].client
+    identity_map = getattr(client, "identity_map", None)
+    if not isinstance(identity_map, IdentityMap):
+        raise ClientError("prefetch_related requires the client to have an "
+                          "identity map, see Client.unit_of_work")
+    wanted = collections.OrderedDict()
+    for name in names:
+        for resource in resources:
+            accessor = getattr(type(resource), name)
+            if not isinstance(accessor, ReferenceAccessor):
+                raise ValueError("{0} is not a reference of {1}".format(
+                    name, type(resource).__name__))
+            id = resource._raw_attrs.get(accessor.fieldname)
+            klass = accessor.klass(type(resource))
+            if id is not None and (klass, id) not in identity_map:
+                wanted.setdefault(klass, collections.OrderedDict())[id] = True
+    for klass, ids in six.iteritems(wanted):
+        for resource in klass.find_many(ids, client, max_workers=max_workers,
+                                        ordered=False):
+            identity_map.add(resource)
+
+
+#Fields exported as categorical codes by ResourceList.to_columns
+CATEGORICAL_FIELDS = ("status", "currency", "source_type", "interval_unit")
+
+Categorical = collections.namedtuple("Categorical", ["codes", "categories"])
+"""A categorical column, `codes` are indexes into `categories` or -1 where
+the value is missing"""
+
+_MONEY, _DATE, _CATEGORY, _RAW = range(4)
+
+
+class ResourceList(list):
+    """A list of resources which can be exported as typed columns
+
+    Sub resource accessors and :py:meth:`Resource.find_many` return these,
+    for example:
+
+    .. code-block:: python
+
+        >>> columns = merchant.bills().to_numpy()
+        >>> columns["amount"].sum()
+        1250050
+        >>> numpy.bincount(columns["status"].codes,
+        ...                weights=columns["amount"])
+
+    Columns are built in a single pass over the raw attributes the resources
+    were constructed from.
+    """
+
+    def _default_fields(self):
+        if not self:
+            return []
+        klass = type(self[0])
+        fields = ["id"] + list(klass.money_fields) + list(klass.date_fields)
+        return fields + [field for field in CATEGORICAL_FIELDS
+                         if field in klass._slot_fields]
+
+    def _kinds(self, fields):
+        klass = type(self[0]) if self else Resource
+        kinds = []
+        for field in fields:
+            if field in klass.money_fields:
+                kinds.append(_MONEY)
+            elif field in klass.date_fields:
+                kinds.append(_DATE)
+            elif field in CATEGORICAL_FIELDS:
+                kinds.append(_CATEGORY)
+            else:
+                kinds.append(_RAW)
+        return kinds
+
+    def to_columns(self, fields=None):
+        """Return an ordered dictionary of field names to columns
+
+        Money fields become integer minor units, date fields `datetime`
+        objects and the :py:data:`CATEGORICAL_FIELDS` :py:class:`Categorical`
+        columns. Other fields are copied as they are. Missing values are None.
+
+        :param fields: The fields to export, defaults to the id, money, date
+          and categorical fields of the first resource's class.
+        """
+        if fields is None:
+            fields = self._default_fields()
+        fields = list(fields)
+        kinds = self._kinds(fields)
+        columns = [[] for _ in fields]
+        categories = [collections.OrderedDict() for _ in fields]
+        columns_kinds = list(zip(fields, kinds, columns, categories))
+        to_minor_units = utils.to_minor_units
+        parse_datetime = utils.parse_datetime
+        for resource in self:
+            attrs = resource._raw_attrs
+            for field, kind, column, seen in columns_kinds:
+                value = attrs.get(field)
+                if kind == _CATEGORY:
+                    if value is None:
+                        column.append(-1)
+                    else:
+                        column.append(seen.setdefault(value, len(seen)))
+                elif value is None or kind == _RAW:
+                    column.append(value)
+                elif kind == _MONEY:
+                    column.append(to_minor_units(value))
+                else:
+                    column.append(parse_datetime(value))
+        result = collections.OrderedDict()
+        for field, kind, column, seen in columns_kinds:
+            if kind == _CATEGORY:
+                column = Categorical(column, list(seen))
+            result[field] = column
+        return result
+
+    def total(self, name, minor_units=False):
+        """Sum the money field `name` over the resources
+
+        Missing amounts are skipped. The total is a `Decimal`, or an integer
+        number of minor units if `minor_units` is true.
+        """
+        parse_amount = utils.parse_amount
+        total = decimal.Decimal(0)
+        for resource in self:
+            value = resource._raw_attrs.get(name)
+            if value is not None:
+                total += parse_amount(value)
+        return utils.to_minor_units(total) if minor_units else total
+
+    def to_numpy(self, fields=None):
+        """Return an ordered dictionary of field names to NumPy arrays
+
+        Money fields become `int64` arrays, masked where values are missing,
+        date fields `datetime64[s]` arrays and categorical fields
+        :py:class:`Categorical` columns of `int32` codes. Other fields become
+        object arrays. Requires NumPy.
+
+        :param fields: The fields to export, as for :py:meth:`to_columns`.
+        """
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError("numpy is required to use to_numpy, install it "
+                              "with `pip install numpy`")
+        columns = self.to_columns(fields)
+        result = collections.OrderedDict()
+        for kind, (field, column) in zip(self._kinds(columns),
+                                         six.iteritems(columns)):
+            if kind == _MONEY:
+                missing = [value is None for value in column]
+                values = numpy.array([0 if value is None else value
+                                      for value in column], dtype=numpy.int64)
+                if any(missing):
+                    values = numpy.ma.masked_array(values, mask=missing)
+            elif kind == _DATE:
+                values = numpy.array(column, dtype="datetime64[s]")
+            elif kind == _CATEGORY:
+                values = Categorical(numpy.array(column.codes,
+                                                 dtype=numpy.int32),
+                                     column.categories)
+            else:
+                values = numpy.empty(len(column), dtype=object)
+                values[:] = column
+            result[field] = values
+        return result
+
+
+def _outcome_results(outcomes):
+    for outcome in outcomes:
+        if outcome.error is not None:
+            raise outcome.error
+        yield outcome.result
 
 
 class Merchant(Resource):
+    __slots__ = ("name", "description", "first_name", "last_name", "email",
+                 "uri", "currency")
     endpoint = "/merchants/:id"
     date_fields = ["next_payout_date"]
+    money_fields = ["balance", "pending_balance", "next_payout_amount"]
 
 
 class Subscription(Resource):
+    __slots__ = ("currency", "name", "description", "status",
+                 "interval_length", "interval_unit", "start_at", "uri")
     endpoint = "/subscriptions/:id"
     reference_fields = ["user_id", "merchant_id"]
     date_fields = ["expires_at", "next_interval_start"]
+    money_fields = ["amount", "setup_fee"]
 
     def cancel(self):
         path = "{0}/cancel".format(self.endpoint.replace(":id", self.id))
-        self.client.api_put(path)
+        return utils.then(self.client.api_put(path), _discard)
 
 
 class PreAuthorization(Resource):
+    __slots__ = ("currency", "name", "description", "status",
+                 "interval_length", "interval_unit", "calendar_intervals",
+                 "uri")
     endpoint = "/pre_authorizations/:id"
     date_fields = ["expires_at", "next_interval_start"]
     reference_fields = ["user_id", "merchant_id"]
+    money_fields = ["max_amount", "remaining_amount", "setup_fee"]
 
     def create_bill(self, amount, name=None, description=None,
-                    charge_customer_at=None, currency=None):
+                    charge_customer_at=None, currency=None,
+                    idempotency_key=None):
+        kwargs = {}
+        if idempotency_key is not None:
+            kwargs["idempotency_key"] = idempotency_key
         return Bill.create_under_preauth(amount, self.id, self.client,
                                          name=name, description=description,
                                          charge_customer_at=charge_customer_at,
-                                         currency=currency)
+                                         currency=currency, **kwargs)
 
     def cancel(self):
         path = "{0}/cancel".format(self.endpoint.replace(":id", self.id))
-        self.client.api_put(path)
+        return utils.then(self.client.api_put(path), _discard)
 
 
 class Bill(Resource):
+    __slots__ = ("currency", "name", "description", "status", "source_type",
+                 "source_id", "can_be_retried", "can_be_cancelled",
+                 "is_setup_fee", "charge_customer_at", "uri")
     endpoint = "/bills/:id"
     date_fields = ["paid_at"]
     reference_fields = ["merchant_id", "user_id", "payout_id"]
+    money_fields = ["amount", "gocardless_fees", "partner_fees",
+                    "amount_minus_fees"]
 
     @classmethod
     def create_under_preauth(self, amount, pre_auth_id, client, name=None,
-                             description=None, charge_customer_at=None, currency=None):
+                             description=None, charge_customer_at=None,
+                             currency=None, idempotency_key=None):
         path = "/bills"
         params = {
             "bill": {
@@ -178,15 +661,20 @@ class Bill(Resource):
             params["bill"]["charge_customer_at"] = charge_customer_at
         if currency:
             params["bill"]["currency"] = currency
-        return Bill(client.api_post(path, params), client)
+        kwargs = {}
+        if idempotency_key is not None:
+            # Only bills created with an idempotency key are retried
+            kwargs["idempotency_key"] = idempotency_key
+        return utils.then(client.api_post(path, params, **kwargs),
+                          lambda data: Bill(data, client))
 
     def retry(self):
         path = "{0}/retry".format(self.endpoint.replace(":id", self.id))
-        self.client.api_post(path)
+        return utils.then(self.client.api_post(path), _discard)
 
     def cancel(self):
         path = "{0}/cancel".format(self.endpoint.replace(":id", self.id))
-        self.client.api_put(path)
+        return utils.then(self.client.api_put(path), _discard)
 
     """Please note the refund endpoint is disabled by default
 
@@ -195,11 +683,14 @@ class Bill(Resource):
     """
     def refund(self):
         path = "{0}/refund".format(self.endpoint.replace(":id", self.id))
-        self.client.api_post(path)
+        return utils.then(self.client.api_post(path), _discard)
 
 class Payout(Resource):
+    __slots__ = ("bank_reference", "app_ids", "uri")
     endpoint = "/payouts/:id"
     date_fields = ["paid_at"]
+    money_fields = ["amount", "transaction_fees"]
 
 class User(Resource):
+    __slots__ = ("first_name", "last_name", "email", "uri")
     endpoint = "/users/:id"
@@ -0,0 +1,133 @@
+import logging
+import random
+import threading
+import time
+
+from gocardless.exceptions import (ServerError, RateLimitError,
+                                   RequestTimeoutError)
+from gocardless.utils import monotonic
+
+logger = logging.getLogger(__name__)
+
+
+class RetryPolicy(object):
+    """Decides whether and when a failed API call is retried
+
+    Connection errors, timeouts and server errors with one of
+    `retry_statuses` are retried for requests using one of `retry_methods`.
+    Other methods, such as the POST which creates a bill, are only retried
+    when the request carries an idempotency key. Requests rejected with 429
+    Too Many Requests were not processed, so they are retried whatever their
+    method.
+
+    The delay before retry `n` is `backoff_factor * 2 ** (n - 1)` seconds,
+    capped at `max_backoff`. With `jitter` a random delay between zero and
+    that value is used instead, so that clients which failed together do not
+    retry together. A `Retry-After` given by the server is always waited for
+    in full.
+
+    Counts of retries and of calls which ran out of attempts are available
+    from :py:attr:`stats`, and `on_retry` is called before every retry with
+    the method, url, attempt number, error and delay.
+    """
+
+    def __init__(self, max_attempts=3, backoff_factor=0.5, max_backoff=30,
+                 jitter=True, retry_statuses=(500, 502, 503, 504),
+                 retry_methods=("get", "put", "delete"), on_retry=None):
+        """Create a retry policy
+
+        :param max_attempts: The maximum number of times a call is attempted,
+          1 disables retries.
+        :param backoff_factor: The base delay in seconds between attempts.
+        :param max_backoff: The maximum delay in seconds between attempts.
+        :param jitter: Whether to randomise the delay.
+        :param retry_statuses: The server error statuses which are retried.
+        :param retry_methods: The HTTP methods which are safe to retry.
+        :param on_retry: A function called before each retry.
+        """
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_methods = frozenset(retry_methods)
+        self.on_retry = on_retry
+        self._stats = {"retries": 0, "exhausted": 0}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        """A dictionary of the number of `retries` made and of calls which
+        were `exhausted` after running out of attempts"""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def should_retry(self, method, error, attempt, idempotent=False):
+        """Whether a call which failed with `error` should be attempted again
+
+        :param method: The HTTP method of the call.
+        :param error: The exception the attempt failed with.
+        :param attempt: The number of attempts made so far.
+        :param idempotent: Whether the call has an idempotency key.
+        """
+        if method not in self.retry_methods and not idempotent and \
+                not isinstance(error, RateLimitError):
+            return False
+        if isinstance(error, ServerError) and \
+                error.status_code not in self.retry_statuses:
+            return False
+        if attempt >= self.max_attempts:
+            self._count("exhausted")
+            return False
+        return True
+
+    def backoff(self, attempt):
+        """The number of seconds to wait after attempt number `attempt`"""
+        delay = min(self.max_backoff,
+                    self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def wait(self, method, url, attempt, error, deadline=None):
+        """Record a retry and sleep until it should be attempted"""
+        delay = self.retry_delay(method, url, attempt, error,
+                                 deadline=deadline)
+        self.sleep(delay)
+        return delay
+
+    def retry_delay(self, method, url, attempt, error, deadline=None):
+        """Record a retry and return the number of seconds to wait before it
+        is attempted, for callers which sleep themselves
+
+        :param deadline: A time from :py:func:`gocardless.utils.monotonic`
+          the retry must be attempted by. If waiting would pass it,
+          :py:exc:`gocardless.exceptions.RequestTimeoutError` is raised
+          straight away instead.
+        """
+        delay = self.backoff(attempt)
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        if deadline is not None and monotonic() + delay >= deadline:
+            raise RequestTimeoutError(
+                "Deadline would pass before retrying {0} {1} in {2:.2f}s "
+                "after: {3}".format(method.upper(), url, delay, error))
+        self._count("retries")
+        logger.warning("Retrying {0} {1} in {2:.2f}s after attempt {3} "
+                       "failed: {4}".format(method.upper(), url, delay,
+                                            attempt, error))
+        if self.on_retry is not None:
+            self.on_retry(method, url, attempt, error, delay)
+        return delay
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+NO_RETRIES = RetryPolicy(max_attempts=1)
+"""A policy which never retries"""
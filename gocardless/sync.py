@@ -0,0 +1,212 @@
+"""Incremental synchronisation of a merchant's resources
+
+A :py:class:`Synchronizer` pages through a merchant's bills, subscriptions
+and pre-authorizations using the merchant's `iter_` sub resource accessors.
+It only requests records created since the newest creation time seen by the
+previous run (its watermark) and reports each new or changed record as a
+:py:class:`ChangeEvent`:
+
+.. code-block:: python
+
+    >>> store = SQLiteStore("gocardless-sync.db")
+    >>> for event in Synchronizer(client, store).sync():
+    ...     print(event.kind, event.resource_type, event.resource.id)
+
+Watermarks and a fingerprint of each record seen are kept in a store, either
+a :py:class:`MemoryStore` or a :py:class:`SQLiteStore`. A record's
+fingerprint is only stored once the consumer asks for the event after it,
+and a type's watermark once all of its records have been consumed, so an
+interrupted run repeats its events rather than losing them. The API's
+`after` filter is exclusive and timestamps only have a resolution of one
+second, so records created in the `overlap` seconds before the watermark are
+requested again and skipped if their fingerprint is unchanged.
+
+The API filters lists by creation time, so an incremental sync only sees
+records created since the watermark and reports an `updated` event for a
+record changed between being created and being synced. Changes to older
+records, such as a bill being paid, are only found by a full sync,
+``sync(full=True)``, which reads every record and compares fingerprints.
+"""
+
+import collections
+import datetime
+import hashlib
+import json
+import sqlite3
+import threading
+
+from gocardless import utils
+
+ChangeEvent = collections.namedtuple("ChangeEvent", ["kind", "resource_type",
+                                                     "resource"])
+"""A record which was `inserted` or `updated` since the last sync"""
+
+INSERTED = "inserted"
+UPDATED = "updated"
+
+
+def fingerprint(attrs):
+    """A digest of a resource's attributes which changes when they do"""
+    encoded = json.dumps(attrs, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+class MemoryStore(object):
+    """Keeps sync state in memory, mainly useful for testing"""
+
+    def __init__(self):
+        self._watermarks = {}
+        self._fingerprints = {}
+
+    def get_watermark(self, resource_type):
+        return self._watermarks.get(resource_type)
+
+    def set_watermark(self, resource_type, value):
+        self._watermarks[resource_type] = value
+
+    def get_fingerprint(self, resource_type, id):
+        return self._fingerprints.get((resource_type, id))
+
+    def set_fingerprint(self, resource_type, id, value):
+        self._fingerprints[(resource_type, id)] = value
+
+
+class SQLiteStore(object):
+    """Keeps sync state in an SQLite database file
+
+    Fingerprints are committed together with the watermark of their
+    resource type.
+    """
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS watermarks ("
+                "resource_type TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                "resource_type TEXT, id TEXT, value TEXT, "
+                "PRIMARY KEY (resource_type, id))")
+            self._conn.commit()
+
+    def _fetch_value(self, query, args):
+        with self._lock:
+            row = self._conn.execute(query, args).fetchone()
+        return row[0] if row else None
+
+    def get_watermark(self, resource_type):
+        return self._fetch_value(
+            "SELECT value FROM watermarks WHERE resource_type = ?",
+            (resource_type,))
+
+    def set_watermark(self, resource_type, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?)",
+                (resource_type, value))
+            self._conn.commit()
+
+    def get_fingerprint(self, resource_type, id):
+        return self._fetch_value(
+            "SELECT value FROM fingerprints WHERE resource_type = ? AND "
+            "id = ?", (resource_type, id))
+
+    def set_fingerprint(self, resource_type, id, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints VALUES (?, ?, ?)",
+                (resource_type, id, value))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class Synchronizer(object):
+    """Fetches the records which changed since the previous sync"""
+
+    def __init__(self, client, store=None,
+                 resource_types=("bills", "subscriptions",
+                                 "pre_authorizations"),
+                 per_page=100, filter_param="after",
+                 watermark_fields=("created_at",), overlap=1):
+        """Create a synchronizer
+
+        :param client: The client of the merchant to synchronise.
+        :param store: Where to keep watermarks and fingerprints, defaults to
+          a :py:class:`MemoryStore`.
+        :param resource_types: The merchant sub resources to synchronise.
+        :param per_page: The number of records to fetch with each request.
+        :param filter_param: The query parameter which asks the API for
+          records after the watermark.
+        :param watermark_fields: The record timestamps which advance the
+          watermark, the first one present in a record is used. These should
+          be the fields `filter_param` filters on.
+        :param overlap: The number of seconds before the watermark which are
+          requested again, so records created in the same second as the
+          watermark are not missed.
+        """
+        self.client = client
+        self.store = store if store is not None else MemoryStore()
+        self.resource_types = resource_types
+        self.per_page = per_page
+        self.filter_param = filter_param
+        self.watermark_fields = watermark_fields
+        self.overlap = overlap
+
+    def _watermark_of(self, attrs):
+        for field in self.watermark_fields:
+            if attrs.get(field):
+                return attrs[field]
+        return None
+
+    def _filter_value(self, watermark):
+        if not self.overlap:
+            return watermark
+        try:
+            moment = utils.parse_datetime(watermark)
+        except ValueError:
+            return watermark
+        moment -= datetime.timedelta(seconds=self.overlap)
+        return moment.strftime(utils.DATETIME_FORMAT)
+
+    def sync(self, resource_types=None, full=False):
+        """Iterate over the changes since the previous sync
+
+        :param resource_types: The resource types to synchronise, defaults
+          to those the synchronizer was created with.
+        :param full: Whether to read every record rather than only those
+          created since the watermark, finding changes to older records.
+        """
+        merchant = self.client.merchant()
+        for resource_type in resource_types or self.resource_types:
+            for event in self._sync_type(merchant, resource_type, full):
+                yield event
+
+    def _sync_type(self, merchant, resource_type, full=False):
+        store = self.store
+        watermark = store.get_watermark(resource_type)
+        params = {}
+        if watermark is not None and not full:
+            params[self.filter_param] = self._filter_value(watermark)
+        records = getattr(merchant, "iter_{0}".format(resource_type))(
+            per_page=self.per_page, **params)
+        newest = watermark
+        for resource in records:
+            attrs = resource._raw_attrs
+            digest = fingerprint(attrs)
+            previous = store.get_fingerprint(resource_type, resource.id)
+            mark = self._watermark_of(attrs)
+            if mark is not None and (newest is None or mark > newest):
+                newest = mark
+            if previous == digest:
+                continue
+            kind = INSERTED if previous is None else UPDATED
+            yield ChangeEvent(kind, resource_type, resource)
+            # Only reached once the consumer asks for the next event, so an
+            # event it did not finish with is repeated by the next run
+            store.set_fingerprint(resource_type, resource.id, digest)
+        if newest is not None:
+            store.set_watermark(resource_type, newest)
@@ -1,8 +1,11 @@
 import base64
+import bisect
 import datetime
 import os
 from . import utils
 
+import six
+
 
 class UrlBuilder(object):
     """Handles correctly encoding and signing api urls"""
@@ -42,12 +45,17 @@ class UrlBuilder(object):
         param_dict["timestamp"] = iso_time[:-7] + "Z"
         param_dict["nonce"] = base64.b64encode(os.urandom(40)).decode()
 
-        signature = utils.generate_signature(param_dict, self.client._app_secret)
-        param_dict["signature"] = signature
+        # Encode the parameters once, the signature is then inserted into the
+        # already sorted pairs rather than encoding everything again
+        pairs = sorted(utils.query_pairs(param_dict))
+        signature = utils.sign_query(utils.encode_query(pairs),
+                                     self.client._app_secret)
+        bisect.insort(pairs, (utils.percent_encode(six.u("signature")),
+                              utils.percent_encode(signature)))
         url = "{0}/connect/{1}/new?{2}".format(
             self.client.get_base_url(),
             params.resource_name,
-            utils.to_query(param_dict),
+            utils.encode_query(pairs),
         )
         return url
 
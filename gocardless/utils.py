@@ -1,6 +1,12 @@
+import codecs
+import datetime
+import decimal
+import functools
 import hashlib
 import hmac
+import json
 import re
+import time
 
 import six
 from six.moves.urllib.parse import quote
@@ -11,18 +17,47 @@ def percent_encode(string):
     return quote(string.encode('utf-8'), '~')
 
 
-def to_query(obj, ns=None):
-    """Create a query string from a list or dictionary"""
+def query_pairs(obj, ns=None, pairs=None):
+    """Flatten a list or dictionary into percent encoded (key, value) pairs
+
+    Nested values are named using the bracket syntax, e.g. `user[email]` and
+    `example[]`. The pairs are appended to `pairs` if given, which allows the
+    whole structure to be flattened in a single pass. The pairs are returned
+    unsorted.
+    """
+    if pairs is None:
+        pairs = []
     if isinstance(obj, dict):
-        pairs = sum((to_query(v, six.u("{0}[{1}]".format(ns, k)) if ns else k)
-                     for k, v in six.iteritems(obj)), [])
-        if ns:
-            return pairs
-        return "&".join(six.u("{0}={1}".format(*p)) for p in sorted(pairs))
+        for k, v in six.iteritems(obj):
+            query_pairs(v, six.u("{0}[{1}]".format(ns, k)) if ns else k,
+                        pairs)
     elif isinstance(obj, (list, tuple)):
-        return sum((to_query(v, six.u("{0}[]".format(ns))) for v in obj), [])
+        key = six.u("{0}[]".format(ns))
+        for v in obj:
+            query_pairs(v, key, pairs)
     else:
-        return [(percent_encode(six.text_type(ns)), percent_encode(six.text_type(obj)))]
+        pairs.append((percent_encode(six.text_type(ns)),
+                      percent_encode(six.text_type(obj))))
+    return pairs
+
+
+def encode_query(pairs):
+    """Join (key, value) pairs from `query_pairs` into a query string"""
+    return six.u("&").join(six.u("=").join(pair) for pair in pairs)
+
+
+def to_query(obj, ns=None):
+    """Create a query string from a list or dictionary"""
+    if isinstance(obj, dict) and not ns:
+        return encode_query(sorted(query_pairs(obj)))
+    return query_pairs(obj, ns)
+
+
+def sign_query(query, secret):
+    """Return the HMAC-SHA256 hex digest of an encoded query string"""
+    return hmac.new(six.b(secret),
+                    msg=six.b(query),
+                    digestmod=hashlib.sha256).hexdigest()
 
 
 def generate_signature(data, secret):
@@ -31,16 +66,236 @@ def generate_signature(data, secret):
     and your application's secret, returning a HMAC-SHA256
     digest of the data.
     """
-    return hmac.new(six.b(secret),
-                    msg=six.b(to_query(data)),
-                    digestmod=hashlib.sha256).hexdigest()
+    return sign_query(to_query(data), secret)
+
+
+def constant_time_compare(a, b):
+    """Compare two signatures in time independent of where they differ"""
+    if isinstance(a, six.text_type):
+        a = a.encode("utf-8")
+    if isinstance(b, six.text_type):
+        b = b.encode("utf-8")
+    if hasattr(hmac, "compare_digest"):
+        return hmac.compare_digest(a, b)
+    if len(a) != len(b):
+        return False
+    result = 0
+    for x, y in zip(six.iterbytes(a), six.iterbytes(b)):
+        result |= x ^ y
+    return result == 0
 
 
 def signature_valid(data, secret):
     params = data.copy()
     sig = params.pop("signature")
     valid_sig = generate_signature(params, secret)
-    return sig == valid_sig
+    return constant_time_compare(sig, valid_sig)
+
+
+class Signer(object):
+    """Generates and checks signatures with a single secret
+
+    The HMAC key state is computed once and copied for each signature,
+    which avoids rehashing the secret when signing many payloads.
+    """
+
+    def __init__(self, secret):
+        self._hmac = hmac.new(six.b(secret), digestmod=hashlib.sha256)
+
+    def sign(self, data):
+        mac = self._hmac.copy()
+        mac.update(six.b(to_query(data)))
+        return mac.hexdigest()
+
+    def valid(self, data):
+        """Check the signature of `data`, False if it has no signature"""
+        params = dict(data)
+        sig = params.pop("signature", None)
+        if sig is None:
+            return False
+        return constant_time_compare(sig, self.sign(params))
+
+
+def signatures_valid(secret, payloads):
+    """Check the signatures of a list of payloads signed with `secret`
+
+    Returns a list of booleans, one for each payload.
+    """
+    signer = Signer(secret)
+    return [signer.valid(payload) for payload in payloads]
+
+
+monotonic = getattr(time, "monotonic", time.time)
+
+
+def cap_timeout(timeout, remaining):
+    """Limit a requests style timeout to `remaining` seconds
+
+    `timeout` may be None, a number or a (connect, read) tuple.
+    """
+    if timeout is None:
+        return remaining
+    if isinstance(timeout, tuple):
+        return tuple(remaining if t is None else min(t, remaining)
+                     for t in timeout)
+    return min(timeout, remaining)
+
+
+def then(result, func):
+    """Apply `func` to the result of an API call
+
+    API calls made through an asynchronous client return awaitables, in
+    which case an awaitable of `func`'s result is returned instead.
+    """
+    if hasattr(result, "__await__"):
+        from gocardless.aio import chain
+        return chain(result, func)
+    return func(result)
+
+
+_json_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_VALUE_DELIMITERS = ",]" + _WHITESPACE
+_ARRAY_START, _FIRST_VALUE, _NEXT_VALUE, _SEPARATOR = range(4)
+
+
+def iter_json_array(chunks):
+    """Decode a JSON array from an iterable of byte strings one element at a
+    time
+
+    Each element is yielded as soon as the chunks containing it have been
+    read, so only the element being decoded and the unread part of the
+    current chunk are held in memory. Chunks may split the document anywhere,
+    including inside multibyte UTF-8 characters. Raises `ValueError` if the
+    document is not a well formed array.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buf = ""
+    pos = 0
+    exhausted = False
+    # What may come next: the opening bracket, the first value or the
+    # closing bracket, a value after a comma, or a comma or closing bracket
+    expect = _ARRAY_START
+    while True:
+        while pos < len(buf) and buf[pos] in _WHITESPACE:
+            pos += 1
+        if pos < len(buf):
+            char = buf[pos]
+            if expect == _ARRAY_START:
+                if char != "[":
+                    raise ValueError("Expected a JSON array")
+                expect = _FIRST_VALUE
+                pos += 1
+                continue
+            if char == "]":
+                if expect == _NEXT_VALUE:
+                    raise ValueError("Expected a value after ','")
+                return
+            if char == ",":
+                if expect != _SEPARATOR:
+                    raise ValueError("Unexpected ',' in JSON array")
+                expect = _NEXT_VALUE
+                pos += 1
+                continue
+            if expect == _SEPARATOR:
+                raise ValueError("Expected ',' or ']' in JSON array")
+            try:
+                value, end = _json_decoder.raw_decode(buf, pos)
+            except ValueError:
+                if exhausted:
+                    raise
+            else:
+                # The start of a number split across chunks, such as the
+                # "1" of "1.5e3", decodes on its own, so only accept a value
+                # once a delimiter follows it
+                if exhausted or (end < len(buf) and
+                                 buf[end] in _VALUE_DELIMITERS):
+                    yield value
+                    expect = _SEPARATOR
+                    buf, pos = buf[end:], 0
+                    continue
+        elif exhausted:
+            raise ValueError("Unterminated JSON array")
+        chunk = next(chunks, None)
+        if chunk is None:
+            exhausted = True
+            buf = buf[pos:] + decoder.decode(b"", final=True)
+        else:
+            buf = buf[pos:] + decoder.decode(chunk)
+        pos = 0
+
+
+def _bounded_memo(maxsize):
+    """Memoize a function of one hashable argument, forgetting every result
+    once `maxsize` are held
+
+    The API's timestamps and amounts tend to recur within a response, so
+    the parsers below keep recent results rather than parsing them again.
+    """
+    def decorator(func):
+        memo = {}
+
+        @functools.wraps(func)
+        def memoized(value):
+            result = memo.get(value)
+            if result is None:
+                result = func(value)
+                if len(memo) >= maxsize:
+                    memo.clear()
+                memo[value] = result
+            return result
+        return memoized
+    return decorator
+
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+@_bounded_memo(4096)
+def parse_datetime(value):
+    """Parse a timestamp in the API's `%Y-%m-%dT%H:%M:%SZ` format
+
+    Timestamps are sliced apart directly rather than going through
+    `strptime`, and recent results are memoized.
+    """
+    if (len(value) == 20 and value[4] == "-" and value[7] == "-" and
+            value[10] == "T" and value[13] == ":" and
+            value[16] == ":" and value[19] == "Z"):
+        return datetime.datetime(
+            int(value[0:4]), int(value[5:7]), int(value[8:10]),
+            int(value[11:13]), int(value[14:16]), int(value[17:19]))
+    return datetime.datetime.strptime(value, DATETIME_FORMAT)
+
+
+@_bounded_memo(4096)
+def _parse_amount(value):
+    if isinstance(value, float):
+        return decimal.Decimal(repr(value))
+    return decimal.Decimal(value)
+
+
+def parse_amount(value):
+    """Parse an amount of money such as "10.05" into a `Decimal`
+
+    Recent results are memoized. None is returned unchanged.
+    """
+    if value is None:
+        return None
+    return _parse_amount(value)
+
+
+def to_minor_units(value, exponent=2):
+    """Convert an amount such as "10.05" into an integer number of minor
+    units, e.g. 1005 pence
+
+    The conversion is exact for amounts with at most `exponent` decimal
+    places, others are rounded half up. None is returned unchanged.
+    """
+    if value is None:
+        return None
+    amount = parse_amount(value).scaleb(exponent)
+    return int(amount.to_integral_value(rounding=decimal.ROUND_HALF_UP))
 
 
 def camelize(to_uncamel):
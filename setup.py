@@ -37,6 +37,11 @@ setup(
     long_description=LONG_DESCRIPTION,
     platforms=['any'],
     classifiers=CLASSIFIERS,
-    install_requires=['requests>=1.0.0', 'six>=1.9.0'],
+    install_requires=['requests>=1.0.0', 'six>=1.9.0',
+                      'futures; python_version < "3"'],
+    # gocardless.aio requires Python 3.5 or later, the rest of the library
+    # supports every Python in .travis.yml
+    extras_require={'numpy': ['numpy'],
+                    'aio': ['aiohttp; python_version >= "3.5"']},
     test_suite='test',
 )
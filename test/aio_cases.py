@@ -0,0 +1,360 @@
+"""Tests for gocardless.aio, imported by test_aio on Python 3.5 and later"""
+
+import asyncio
+import unittest
+import mock
+
+from . import fixtures
+from gocardless import utils
+from gocardless.aio import AsyncClient, AsyncPageIterator
+from gocardless.aio import FakeTransport as FakeServerTransport
+from gocardless.cache import ResponseCache, ValidatorCache
+from gocardless.exceptions import (ClientError, RequestTimeoutError,
+                                   ServerError, SignatureError)
+from gocardless.fake import FakeGoCardless
+from gocardless.identity import IdentityMap
+from gocardless.ratelimit import RateLimiter
+from gocardless.retry import RetryPolicy
+from gocardless.resources import Bill, Merchant, ResourceList, User
+
+
+class FakeTransport(object):
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.requests = []
+
+    async def perform(self, request):
+        self.requests.append(request)
+        return self.responses[request.url.split("/api/v1")[-1]]
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+class AsyncClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = FakeTransport({
+            "/merchants/WOQRUJU9OH2HH1": fixtures.merchant_json,
+            "/merchants/WOQRUJU9OH2HH1/bills": [fixtures.bill_json],
+            "/bills/PWSDXRYSCOKA7Z": fixtures.bill_json,
+            "/users/BWJ2GP659OXPAU": {"id": "BWJ2GP659OXPAU",
+                                      "created_at": "2011-11-22T11:59:12Z"},
+            "/bills": fixtures.bill_json,
+            "/error": {"error": "anerror"},
+            "/confirm": {"success": True},
+        })
+        self.client = AsyncClient("id01", "sec01", access_token="tok01",
+                                  merchant_id="WOQRUJU9OH2HH1",
+                                  transport=self.transport)
+
+    def test_api_get_is_awaitable(self):
+        result = run(self.client.api_get("/bills/PWSDXRYSCOKA7Z"))
+        self.assertEqual(result, fixtures.bill_json)
+
+    def test_request_uses_bearer_auth(self):
+        run(self.client.api_get("/bills/PWSDXRYSCOKA7Z"))
+        headers = self.transport.requests[0].options["headers"]
+        self.assertEqual(headers["Authorization"], "bearer tok01")
+
+    def test_errors_raise_clienterror(self):
+        with self.assertRaises(ClientError):
+            run(self.client.api_get("/error"))
+
+    def test_bill(self):
+        bill = run(self.client.bill("PWSDXRYSCOKA7Z"))
+        self.assertIsInstance(bill, Bill)
+        self.assertEqual(bill.id, "PWSDXRYSCOKA7Z")
+
+    def test_create_bill_posts(self):
+        bill = run(self.client.create_bill(10, "FAZ6FGSMTCOZUG"))
+        self.assertIsInstance(bill, Bill)
+        self.assertEqual(self.transport.requests[0].method, "post")
+
+    def test_sub_resource_and_reference_accessors_are_awaitable(self):
+        async def fetch():
+            merchant = await self.client.merchant()
+            bills = await merchant.bills()
+            return merchant, bills, await bills[0].user()
+        merchant, bills, user = run(fetch())
+        self.assertIsInstance(merchant, Merchant)
+        self.assertIsInstance(bills[0], Bill)
+        self.assertIsInstance(user, User)
+
+    def test_confirm_resource(self):
+        params = {"resource_uri": "http://aresource.com/api/v1/bills/1",
+                  "resource_id": "1", "resource_type": "bill"}
+        params["signature"] = utils.generate_signature(params, "sec01")
+        result = run(self.client.confirm_resource(params))
+        self.assertEqual(result, {"success": True})
+        self.assertEqual(self.transport.requests[0].options["auth"],
+                         ("id01", "sec01"))
+
+    def test_confirm_resource_checks_signature(self):
+        params = {"resource_uri": "http://aresource.com/api/v1/bills/1",
+                  "resource_id": "1", "resource_type": "bill",
+                  "signature": "invalid"}
+        with self.assertRaises(SignatureError):
+            self.client.confirm_resource(params)
+
+    def test_concurrent_requests(self):
+        async def fetch_many():
+            return await asyncio.gather(*[
+                self.client.bill("PWSDXRYSCOKA7Z") for _ in range(50)])
+        bills = run(fetch_many())
+        self.assertEqual(len(bills), 50)
+        self.assertEqual(len(self.transport.requests), 50)
+
+
+class FakeServerTestCase(unittest.TestCase):
+
+    def test_async_transport_is_kept_apart_from_sync_transport(self):
+        fake = FakeGoCardless()
+        transport = FakeServerTransport(fake)
+        client = AsyncClient("id", "secret", "token", fake.merchant_id,
+                             transport=transport)
+        self.assertIs(client.async_transport, transport)
+        self.assertIsNone(client.transport)
+
+    def test_sync_transport_is_rejected(self):
+        fake = FakeGoCardless()
+        with self.assertRaises(TypeError):
+            AsyncClient("id", "secret", "token", fake.merchant_id,
+                        transport=fake)
+
+    def test_async_client_with_fake_server(self):
+        fake = FakeGoCardless.generate(bills=5, latency=0.001)
+        client = AsyncClient("id", "secret", "token", fake.merchant_id,
+                             transport=FakeServerTransport(fake))
+
+        async def fetch():
+            merchant = await client.merchant()
+            return await merchant.bills()
+        bills = run(fetch())
+        self.assertEqual(len(bills), 5)
+        self.assertIsInstance(bills[0], Bill)
+
+
+class AsyncRetryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(bills=3)
+        self.bill_id = list(self.fake.resources["bills"])[0]
+        self.policy = RetryPolicy(backoff_factor=0, jitter=False)
+
+    def client(self, **kwargs):
+        kwargs.setdefault("retry_policy", self.policy)
+        return AsyncClient("id", "secret", "token", self.fake.merchant_id,
+                           transport=FakeServerTransport(self.fake), **kwargs)
+
+    def test_server_errors_are_retried(self):
+        self.fake.fail_next(2)
+        bill = run(self.client().bill(self.bill_id))
+        self.assertEqual(bill.id, self.bill_id)
+        self.assertEqual(self.fake.stats["requests"], 3)
+        self.assertEqual(self.policy.stats["retries"], 2)
+
+    def test_gives_up_after_max_attempts(self):
+        self.fake.fail_next(3)
+        with self.assertRaises(ServerError):
+            run(self.client().bill(self.bill_id))
+        self.assertEqual(self.fake.stats["requests"], 3)
+
+    def test_post_without_idempotency_key_is_not_retried(self):
+        self.fake.fail_next(1)
+        preauth_id = list(self.fake.resources["pre_authorizations"])[0]
+        with self.assertRaises(ServerError):
+            run(self.client().create_bill(10, preauth_id))
+        self.assertEqual(self.fake.stats["requests"], 1)
+
+    def test_waits_with_asyncio_sleep(self):
+        policy = RetryPolicy(backoff_factor=0.5, jitter=False)
+        self.fake.fail_next(1)
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+        with mock.patch("gocardless.aio.asyncio.sleep", sleep), \
+                mock.patch.object(policy, "sleep") as blocking_sleep:
+            run(self.client(retry_policy=policy).bill(self.bill_id))
+        self.assertEqual(delays, [0.5])
+        self.assertFalse(blocking_sleep.called)
+
+    def test_retry_wait_past_deadline_raises_without_sleeping(self):
+        self.fake.fail_next(1, status=429, retry_after=60)
+        delays = []
+
+        async def sleep(delay):
+            delays.append(delay)
+        with mock.patch("gocardless.aio.asyncio.sleep", sleep):
+            with self.assertRaises(RequestTimeoutError):
+                run(self.client().api_get(
+                    "/bills/{0}".format(self.bill_id),
+                    deadline=utils.monotonic() + 5))
+        self.assertEqual(delays, [])
+
+    def test_max_concurrency_caps_requests_in_flight(self):
+        self.fake.latency = 0.01
+        client = self.client(max_concurrency=2)
+        in_flight = []
+        peak = []
+        perform = client.async_transport.perform
+
+        async def tracking_perform(request):
+            in_flight.append(request)
+            peak.append(len(in_flight))
+            try:
+                return await perform(request)
+            finally:
+                in_flight.remove(request)
+        client.async_transport.perform = tracking_perform
+
+        async def fetch_many():
+            return await asyncio.gather(*[client.bill(self.bill_id)
+                                          for _ in range(6)])
+        self.assertEqual(len(run(fetch_many())), 6)
+        self.assertEqual(max(peak), 2)
+
+    def test_rate_limiter_tokens_are_taken(self):
+        limiter = RateLimiter(read_rate=100)
+        run(self.client(rate_limiter=limiter).bill(self.bill_id))
+        self.assertEqual(limiter.stats["read"]["acquired"], 1)
+
+    def test_sync_only_options_are_rejected(self):
+        for name, value in (("validator_cache", ValidatorCache()),
+                            ("identity_map", IdentityMap())):
+            with self.assertRaises(ValueError):
+                self.client(**{name: value})
+
+
+class AsyncCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(bills=3)
+        self.bill_id = list(self.fake.resources["bills"])[0]
+        self.client = AsyncClient("id", "secret", "token",
+                                  self.fake.merchant_id,
+                                  transport=FakeServerTransport(self.fake),
+                                  cache=ResponseCache())
+
+    def test_responses_are_cached_after_being_awaited(self):
+        async def fetch_twice():
+            return (await self.client.bill(self.bill_id),
+                    await self.client.bill(self.bill_id))
+        first, second = run(fetch_twice())
+        self.assertEqual(first, second)
+        self.assertEqual(self.fake.stats["get"], 1)
+
+    def test_cache_set_after_construction(self):
+        self.client.cache = ResponseCache()
+
+        async def fetch_twice():
+            await self.client.bill(self.bill_id)
+            return await self.client.bill(self.bill_id)
+        self.assertEqual(run(fetch_twice()).id, self.bill_id)
+        self.assertEqual(self.fake.stats["get"], 1)
+
+    def test_writes_invalidate_once_they_have_run(self):
+        path = "/bills/{0}".format(self.bill_id)
+        run(self.client.api_get(path))
+        with mock.patch.object(self.client.cache, "invalidate") as invalidate:
+            write = self.client.api_put(path + "/cancel")
+            self.assertFalse(invalidate.called)
+            run(write)
+        invalidate.assert_called_once_with(path + "/cancel")
+
+
+class AsyncIterPagesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(bills=5)
+        self.client = AsyncClient("id", "secret", "token",
+                                  self.fake.merchant_id,
+                                  transport=FakeServerTransport(self.fake))
+
+    def collect(self, **kwargs):
+        async def collect():
+            merchant = await self.client.merchant()
+            bills = merchant.iter_bills(**kwargs)
+            self.assertIsInstance(bills, AsyncPageIterator)
+            collected = []
+            async for bill in bills:
+                collected.append(bill)
+            return collected
+        return run(collect())
+
+    def test_iter_accessor_is_an_async_iterator(self):
+        bills = self.collect(per_page=2)
+        self.assertEqual([bill.id for bill in bills],
+                         list(self.fake.resources["bills"]))
+        self.assertIsInstance(bills[0], Bill)
+        self.assertEqual(self.fake.stats["get"], 4)
+
+    def test_prefetch(self):
+        bills = self.collect(per_page=2, prefetch=True)
+        self.assertEqual(len(bills), 5)
+
+    def test_stream_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.collect(stream=True)
+
+
+class AsyncCreateBillsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(bills=0)
+        self.preauth_id = list(self.fake.resources["pre_authorizations"])[0]
+        self.client = AsyncClient("id", "secret", "token",
+                                  self.fake.merchant_id,
+                                  transport=FakeServerTransport(self.fake))
+
+    def test_create_bills_creates_every_bill(self):
+        bills = ((amount, self.preauth_id) for amount in range(1, 6))
+        outcomes = run(self.client.create_bills(bills, max_in_flight=2,
+                                                ordered=True))
+        self.assertEqual([o.index for o in outcomes], list(range(5)))
+        self.assertEqual([o.error for o in outcomes], [None] * 5)
+        self.assertIsInstance(outcomes[0].result, Bill)
+        self.assertEqual(self.fake.stats["post"], 5)
+        self.assertEqual(len(self.fake.resources["bills"]), 5)
+
+    def test_failures_are_captured(self):
+        outcomes = run(self.client.create_bills(
+            [(10, self.preauth_id), (10, "MISSING"),
+             {"amount": 5, "pre_auth_id": self.preauth_id}],
+            idempotency_keys=True, ordered=True))
+        self.assertIsNone(outcomes[0].error)
+        self.assertIsInstance(outcomes[1].error, ClientError)
+        self.assertIsNone(outcomes[2].error)
+
+
+class AsyncFindManyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(bills=4)
+        self.ids = list(self.fake.resources["bills"])
+        self.client = AsyncClient("id", "secret", "token",
+                                  self.fake.merchant_id,
+                                  transport=FakeServerTransport(self.fake))
+
+    def test_find_many_is_awaitable(self):
+        ids = self.ids + self.ids[:1]
+        bills = run(Bill.find_many(ids, self.client, max_workers=2))
+        self.assertIsInstance(bills, ResourceList)
+        self.assertEqual([bill.id for bill in bills], ids)
+        self.assertEqual(self.fake.stats["get"], 4)
+
+    def test_plural_lookup(self):
+        bills = run(self.client.bills(self.ids[:2], ordered=False))
+        self.assertEqual(sorted(bill.id for bill in bills),
+                         sorted(self.ids[:2]))
+
+    def test_failed_fetch_raises(self):
+        with self.assertRaises(ClientError):
+            run(self.client.bills(self.ids[:1] + ["MISSING"]))
@@ -0,0 +1,6 @@
+import sys
+
+# The asyncio tests use `async def`, which older Pythons cannot even compile,
+# so they are only imported where gocardless.aio is supported
+if sys.version_info >= (3, 5):
+    from .aio_cases import *  # noqa
@@ -0,0 +1,95 @@
+import unittest
+import mock
+
+from gocardless import utils
+from gocardless.cache import LRUCache, ResponseCache
+from gocardless.resources import User
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), 1)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats["evictions"], 1)
+
+    def test_counts_hits_and_misses(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.get("a")
+        cache.get("b")
+        cache.get("a", valid=lambda value: False)
+        stats = cache.stats
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["hit_rate"], 1 / 3.0)
+        self.assertEqual(stats["size"], 0)
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResponseCache(ttl=10, ttls={User: 100, "payouts": 0})
+        self.now = 1000.0
+        patcher = mock.patch.object(utils, "monotonic",
+                                    side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_returns_cached_response(self):
+        self.cache.set("/bills/1", None, {"id": "1"})
+        self.assertEqual(self.cache.get("/bills/1"), {"id": "1"})
+
+    def test_params_are_part_of_key(self):
+        self.cache.set("/merchants/1/bills", {"page": 1}, [1])
+        self.assertEqual(self.cache.get("/merchants/1/bills", {"page": 1}),
+                         [1])
+        self.assertIsNone(self.cache.get("/merchants/1/bills", {"page": 2}))
+
+    def test_scope_is_part_of_key(self):
+        self.cache.set("/bills/1", None, {"id": "1"}, scope=("M1", "t1"))
+        self.assertEqual(self.cache.get("/bills/1", scope=("M1", "t1")),
+                         {"id": "1"})
+        self.assertIsNone(self.cache.get("/bills/1", scope=("M2", "t2")))
+        self.assertIsNone(self.cache.get("/bills/1"))
+
+    def test_invalidate_removes_every_scope(self):
+        self.cache.set("/bills/1", None, {"id": "1"}, scope="a")
+        self.cache.set("/bills/1", None, {"id": "1"}, scope="b")
+        self.cache.invalidate("/bills/1/cancel")
+        self.assertIsNone(self.cache.get("/bills/1", scope="a"))
+        self.assertIsNone(self.cache.get("/bills/1", scope="b"))
+
+    def test_entries_expire(self):
+        self.cache.set("/bills/1", None, {"id": "1"})
+        self.now += 11
+        self.assertIsNone(self.cache.get("/bills/1"))
+
+    def test_ttl_per_resource_class(self):
+        self.cache.set("/users/1", None, {"id": "1"})
+        self.cache.set("/payouts/1", None, {"id": "1"})
+        self.now += 50
+        self.assertEqual(self.cache.get("/users/1"), {"id": "1"})
+        self.assertIsNone(self.cache.get("/payouts/1"))
+
+    def test_write_invalidates_resource_and_lists(self):
+        self.cache.set("/bills/1", None, {"id": "1"})
+        self.cache.set("/bills/2", None, {"id": "2"})
+        self.cache.set("/merchants/1/bills", None, [])
+        self.cache.set("/users/1", None, {"id": "1"})
+        self.cache.invalidate("/bills/1/cancel")
+        self.assertIsNone(self.cache.get("/bills/1"))
+        self.assertIsNone(self.cache.get("/merchants/1/bills"))
+        self.assertEqual(self.cache.get("/bills/2"), {"id": "2"})
+        self.assertEqual(self.cache.get("/users/1"), {"id": "1"})
+
+    def test_confirm_invalidates_lists(self):
+        self.cache.set("/merchants/1/bills", None, [])
+        self.cache.set("/bills/1", None, {"id": "1"})
+        self.cache.invalidate("/confirm")
+        self.assertIsNone(self.cache.get("/merchants/1/bills"))
+        self.assertEqual(self.cache.get("/bills/1"), {"id": "1"})
@@ -6,6 +6,7 @@ import mock
 from mock import patch
 import os
 import sys
+import threading
 import time
 import re
 
@@ -17,7 +18,11 @@ import gocardless
 import gocardless.client
 from gocardless.client import Client
 from gocardless import utils, urlbuilder, resources
-from gocardless.exceptions import SignatureError, ClientError
+from gocardless.exceptions import (SignatureError, ClientError, ServerError,
+                                   RateLimitError, RequestTimeoutError)
+from gocardless.retry import RetryPolicy, NO_RETRIES
+from gocardless.cache import ResponseCache, ValidatorCache
+from gocardless.ratelimit import RateLimiter
 from .test_resources import create_mock_attrs
 
 mock_account_details = {
@@ -136,6 +141,18 @@ class ClientTestCase(unittest.TestCase):
                 {"paid_at":datetime.datetime.now().isoformat()[:-7] + "Z",
                 "user_id":"someuserid", "payout_id": "XXX"}))
 
+    def test_find_many_methods(self):
+        for name, klass in [("bills", resources.Bill),
+                            ("users", resources.User),
+                            ("payouts", resources.Payout),
+                            ("subscriptions", resources.Subscription),
+                            ("pre_authorizations",
+                             resources.PreAuthorization)]:
+            with patch.object(klass, 'find_many') as mock_find:
+                getattr(self.client, name)(["1", "2"])
+                mock_find.assert_called_with(["1", "2"], self.client,
+                                             max_workers=8, ordered=True)
+
     def _get_resource_tester(self, resource_name, resource_fixture):
         expected_klass = getattr(sys.modules["gocardless.resources"], utils.camelize(resource_name))
         with patch.object(self.client, 'api_get'):
@@ -185,6 +202,276 @@ class ClientTestCase(unittest.TestCase):
         self.client._request("post", "somepath", auth=("username", "password"))
         mock_request.use_http_auth.assert_called_with("username", "password")
 
+    @patch('gocardless.clientlib.Request')
+    def test_requests_share_the_client_session(self, mock_reqclass):
+        mock_reqclass.return_value.perform.return_value = ["someval"]
+        self.client.api_get("/somepath")
+        self.client.api_get("/otherpath")
+        sessions = [c[1]["session"] for c in mock_reqclass.call_args_list]
+        self.assertIs(sessions[0], sessions[1])
+        self.assertIs(sessions[0], self.client.session)
+
+    def test_client_uses_session_passed_in(self):
+        session = mock.Mock()
+        client = Client("id", "secret", access_token="tok",
+                        merchant_id="merch", session=session)
+        self.assertIs(client.session, session)
+
+    def test_close_discards_session(self):
+        session = self.client.session
+        self.client.close()
+        self.assertIsNot(self.client.session, session)
+
+
+class CachedClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Client("id", "secret", access_token="tok",
+                             merchant_id="merch", cache=ResponseCache())
+
+    @patch('gocardless.clientlib.Request')
+    def test_repeated_gets_are_cached(self, mock_reqclass):
+        mock_reqclass.return_value.perform.return_value = fixtures.bill_json
+        self.client.bill("PWSDXRYSCOKA7Z")
+        bill = self.client.bill("PWSDXRYSCOKA7Z")
+        self.assertEqual(bill.id, "PWSDXRYSCOKA7Z")
+        self.assertEqual(mock_reqclass.return_value.perform.call_count, 1)
+        self.assertEqual(self.client.cache.stats["hits"], 1)
+
+    @patch('gocardless.clientlib.Request')
+    def test_writes_invalidate_cache(self, mock_reqclass):
+        mock_reqclass.return_value.perform.return_value = fixtures.bill_json
+        bill = self.client.bill("PWSDXRYSCOKA7Z")
+        bill.cancel()
+        self.client.bill("PWSDXRYSCOKA7Z")
+        self.assertEqual(mock_reqclass.return_value.perform.call_count, 3)
+
+    @patch('gocardless.clientlib.Request')
+    def test_shared_cache_is_scoped_to_each_client(self, mock_reqclass):
+        mock_reqclass.return_value.perform.return_value = fixtures.bill_json
+        other = Client("id", "secret", access_token="tok2",
+                       merchant_id="merch2", cache=self.client.cache)
+        self.client.bill("PWSDXRYSCOKA7Z")
+        other.bill("PWSDXRYSCOKA7Z")
+        self.assertEqual(mock_reqclass.return_value.perform.call_count, 2)
+
+    def test_deletes_invalidate_cache(self):
+        with patch.object(self.client, '_request') as mock_request, \
+                patch.object(self.client.cache, 'invalidate') as invalidate:
+            self.client.api_delete("/bills/1")
+        self.assertTrue(mock_request.called)
+        invalidate.assert_called_once_with("/bills/1")
+
+    @patch('gocardless.clientlib.Request')
+    def test_validator_cache_is_given_to_requests(self, mock_reqclass):
+        validators = ValidatorCache()
+        client = Client("id", "secret", access_token="tok",
+                        merchant_id="merch", validator_cache=validators)
+        mock_reqclass.return_value.perform.return_value = {}
+        client.api_get("/bills/1")
+        mock_reqclass.return_value.use_validator_cache.assert_called_with(
+            validators)
+
+    @patch('gocardless.clientlib.Request')
+    def test_rate_limiter_is_given_to_requests(self, mock_reqclass):
+        limiter = RateLimiter()
+        client = Client("id", "secret", access_token="tok",
+                        merchant_id="merch", rate_limiter=limiter)
+        mock_reqclass.return_value.perform.return_value = {}
+        client.api_post("/bills", {})
+        mock_reqclass.return_value.use_rate_limiter.assert_called_with(
+            limiter)
+
+    @patch('gocardless.clientlib.Request')
+    def test_streamed_gets_bypass_cache(self, mock_reqclass):
+        mock_reqclass.return_value.perform.side_effect = \
+            lambda: iter([fixtures.bill_json])
+        for _ in range(2):
+            bills = self.client.api_get("/bills", stream=True)
+            self.assertEqual(list(bills), [fixtures.bill_json])
+        self.assertEqual(mock_reqclass.return_value.perform.call_count, 2)
+        mock_reqclass.return_value.use_streaming.assert_called_with()
+
+
+class UnitOfWorkTestCase(unittest.TestCase):
+
+    def test_unit_of_work_sets_identity_map(self):
+        client = create_mock_client(mock_account_details)
+        self.assertIsNone(client.identity_map)
+        with client.unit_of_work() as identity_map:
+            self.assertIs(client.identity_map, identity_map)
+        self.assertIsNone(client.identity_map)
+
+    def test_units_on_other_threads_keep_their_own_maps(self):
+        client = create_mock_client(mock_account_details)
+        entered = threading.Event()
+        exited = threading.Event()
+        seen = []
+
+        def other_unit():
+            with client.unit_of_work() as identity_map:
+                entered.set()
+                exited.wait(5)
+                seen.append(client.identity_map is identity_map)
+        thread = threading.Thread(target=other_unit)
+        with client.unit_of_work() as identity_map:
+            thread.start()
+            entered.wait(5)
+            self.assertIs(client.identity_map, identity_map)
+        exited.set()
+        thread.join(5)
+        self.assertEqual(seen, [True])
+        self.assertIsNone(client.identity_map)
+
+    def test_bill_references_use_identity_map(self):
+        client = create_mock_client(mock_account_details)
+        bills = [resources.Bill(fixtures.bill_json, client) for _ in range(5)]
+        user = {"id": fixtures.bill_json["user_id"],
+                "created_at": "2011-11-22T11:59:12Z"}
+        with patch.object(client, 'api_get', return_value=user) as mock_get:
+            with client.unit_of_work():
+                users = [bill.user() for bill in bills]
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertIs(users[0], users[4])
+
+
+class CreateBillsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = create_mock_client(mock_account_details)
+
+    def test_create_bills_creates_every_bill(self):
+        with patch.object(self.client, 'create_bill') as mock_create:
+            mock_create.side_effect = lambda *args, **kwargs: (args, kwargs)
+            outcomes = list(self.client.create_bills(
+                [(10, "pa1"), {"amount": 20, "pre_auth_id": "pa2"}],
+                ordered=True))
+        self.assertEqual(outcomes[0].result, ((10, "pa1"), {}))
+        self.assertEqual(outcomes[1].result,
+                         ((), {"amount": 20, "pre_auth_id": "pa2"}))
+
+    def test_create_bills_reports_errors(self):
+        with patch.object(self.client, 'create_bill') as mock_create:
+            mock_create.side_effect = ClientError("failed")
+            outcomes = list(self.client.create_bills([(10, "pa1")]))
+        self.assertIsInstance(outcomes[0].error, ClientError)
+
+    def test_create_bills_generates_idempotency_keys(self):
+        with patch.object(self.client, 'create_bill') as mock_create:
+            mock_create.side_effect = lambda *args, **kwargs: kwargs
+            outcomes = list(self.client.create_bills(
+                [(10, "pa1"), {"amount": 1, "pre_auth_id": "pa2",
+                               "idempotency_key": "mine"}],
+                idempotency_keys=True, ordered=True))
+        self.assertTrue(outcomes[0].result["idempotency_key"])
+        self.assertEqual(outcomes[1].result["idempotency_key"], "mine")
+
+
+class RetryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=3, jitter=False)
+        self.client = Client("id", "secret", access_token="tok",
+                             merchant_id="merch", retry_policy=self.policy)
+        self.sleep = patch.object(self.policy, "sleep").start()
+        self.addCleanup(patch.stopall)
+
+    def _mock_request(self, mock_reqclass, *results):
+        mock_reqclass.return_value.perform.side_effect = results
+
+    @patch('gocardless.clientlib.Request')
+    def test_get_is_retried_after_server_error(self, mock_reqclass):
+        self._mock_request(mock_reqclass,
+                           ServerError("error", status_code=503),
+                           {"id": "1"})
+        self.assertEqual(self.client.api_get("/bills/1"), {"id": "1"})
+        self.assertEqual(self.sleep.call_count, 1)
+        self.assertEqual(self.policy.stats["retries"], 1)
+
+    @patch('gocardless.clientlib.Request')
+    def test_gives_up_after_max_attempts(self, mock_reqclass):
+        error = ServerError("error", status_code=503)
+        self._mock_request(mock_reqclass, error, error, error)
+        self.assertRaises(ServerError, self.client.api_get, "/bills/1")
+        self.assertEqual(mock_reqclass.return_value.perform.call_count, 3)
+
+    @patch('gocardless.clientlib.Request')
+    def test_create_bill_is_not_retried(self, mock_reqclass):
+        self._mock_request(mock_reqclass,
+                           ServerError("error", status_code=503),
+                           fixtures.bill_json)
+        self.assertRaises(ServerError, self.client.create_bill, 10, "pa1")
+        self.assertEqual(self.sleep.call_count, 0)
+
+    @patch('gocardless.clientlib.Request')
+    def test_create_bill_with_idempotency_key_is_retried(self,
+                                                          mock_reqclass):
+        self._mock_request(mock_reqclass,
+                           ServerError("error", status_code=503),
+                           fixtures.bill_json)
+        bill = self.client.create_bill(10, "pa1", idempotency_key="key1")
+        self.assertEqual(bill.id, fixtures.bill_json["id"])
+        mock_reqclass.return_value.set_idempotency_key.assert_called_with(
+            "key1")
+
+
+class TimeoutTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Client("id", "secret", access_token="tok",
+                             merchant_id="merch", timeout=(2, 5),
+                             retry_policy=NO_RETRIES)
+
+    @patch('gocardless.clientlib.Request')
+    def test_client_timeout_is_used(self, mock_reqclass):
+        mock_reqclass.return_value.perform.return_value = {}
+        self.client.api_get("/bills/1")
+        mock_reqclass.return_value.set_timeout.assert_called_with((2, 5))
+
+    @patch('gocardless.clientlib.Request')
+    def test_per_call_timeout_overrides_client_timeout(self, mock_reqclass):
+        mock_reqclass.return_value.perform.return_value = {}
+        self.client.api_get("/bills/1", timeout=1)
+        mock_reqclass.return_value.set_timeout.assert_called_with(1)
+
+    @patch('gocardless.clientlib.Request')
+    def test_deadline_caps_timeout(self, mock_reqclass):
+        mock_reqclass.return_value.perform.return_value = {}
+        self.client.api_get("/bills/1", deadline=utils.monotonic() + 1)
+        connect, read = mock_reqclass.return_value.set_timeout.call_args[0][0]
+        self.assertTrue(connect <= 1 and read <= 1)
+
+    @patch('gocardless.clientlib.Request')
+    def test_passed_deadline_raises(self, mock_reqclass):
+        self.assertRaises(RequestTimeoutError, self.client.api_get,
+                          "/bills/1", deadline=utils.monotonic() - 1)
+        self.assertFalse(mock_reqclass.return_value.perform.called)
+
+    @patch('gocardless.clientlib.Request')
+    def test_retry_wait_past_deadline_raises_without_sleeping(
+            self, mock_reqclass):
+        policy = RetryPolicy(jitter=False)
+        client = Client("id", "secret", access_token="tok",
+                        merchant_id="merch", retry_policy=policy)
+        mock_reqclass.return_value.perform.side_effect = RateLimitError(
+            "slow down", retry_after=60)
+        with patch.object(policy, "sleep") as sleep:
+            self.assertRaises(RequestTimeoutError, client.api_get, "/bills/1",
+                              deadline=utils.monotonic() + 5)
+        self.assertFalse(sleep.called)
+        self.assertEqual(mock_reqclass.return_value.perform.call_count, 1)
+
+    @patch('gocardless.clientlib.Request')
+    def test_timeouts_are_retried(self, mock_reqclass):
+        policy = RetryPolicy(jitter=False)
+        client = Client("id", "secret", access_token="tok",
+                        merchant_id="merch", retry_policy=policy)
+        mock_reqclass.return_value.perform.side_effect = [
+            RequestTimeoutError("timed out"), {"id": "1"}]
+        with patch.object(policy, "sleep"):
+            self.assertEqual(client.api_get("/bills/1"), {"id": "1"})
+
+
 class ConfirmResourceTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -218,6 +505,28 @@ class ConfirmResourceTestCase(unittest.TestCase):
                 expected_data, auth=expected_auth)
 
 
+class ValidateWebhooksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = create_mock_client(mock_account_details)
+        self.webhooks = []
+        for i in range(7):
+            payload = {"payload": {"bills": [{"id": str(i)}]}}
+            payload["signature"] = utils.generate_signature(
+                payload, mock_account_details["app_secret"])
+            self.webhooks.append(payload)
+        self.webhooks[3]["signature"] = "invalid"
+
+    def test_validate_webhooks_returns_result_per_item(self):
+        results = self.client.validate_webhooks(iter(self.webhooks))
+        self.assertEqual(results, [i != 3 for i in range(7)])
+
+    def test_validate_webhooks_with_process_pool(self):
+        results = self.client.validate_webhooks(self.webhooks, processes=2,
+                                                chunksize=2)
+        self.assertEqual(results, [i != 3 for i in range(7)])
+
+
 class UrlBuilderTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -309,6 +618,18 @@ class UrlBuilderTestCase(unittest.TestCase):
         self.assertNotEqual(get_url_params(url1)["nonce"],\
                 get_url_params(url2)["nonce"])
 
+    def test_url_signature_is_valid(self):
+        params = self.make_mock_params({"resource_name": "bills",
+                                        "amount": 20.0,
+                                        "user": {"email": "a@b.com"}})
+        url = self.urlbuilder.build_and_sign(params, state="st")
+        query = urllib.parse.urlparse(url).query
+        unsigned = "&".join(p for p in query.split("&")
+                            if not p.startswith("signature="))
+        signature = get_url_params(url)["signature"]
+        self.assertEqual(signature,
+                         utils.sign_query(unsigned, self.app_secret))
+
     def test_url_contains_client_id(self):
         params = self.make_mock_params({"somekey":"someval"})
         url = self.urlbuilder.build_and_sign(params)
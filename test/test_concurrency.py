@@ -0,0 +1,56 @@
+import threading
+import time
+import unittest
+
+from gocardless.concurrency import bounded_map
+
+
+class BoundedMapTestCase(unittest.TestCase):
+
+    def test_ordered_results(self):
+        outcomes = list(bounded_map(lambda x: x * 2, range(20), max_workers=4,
+                                    ordered=True))
+        self.assertEqual([o.result for o in outcomes],
+                         [x * 2 for x in range(20)])
+        self.assertEqual([o.index for o in outcomes], list(range(20)))
+
+    def test_unordered_results_cover_every_item(self):
+        outcomes = bounded_map(lambda x: x, range(20), max_workers=4)
+        self.assertEqual(sorted(o.result for o in outcomes), list(range(20)))
+
+    def test_errors_are_captured(self):
+        def func(x):
+            if x == 3:
+                raise ValueError("bad")
+            return x
+        outcomes = list(bounded_map(func, range(5), ordered=True))
+        self.assertIsInstance(outcomes[3].error, ValueError)
+        self.assertIsNone(outcomes[3].result)
+        self.assertEqual(outcomes[4].result, 4)
+
+    def test_in_flight_calls_are_bounded(self):
+        lock = threading.Lock()
+        state = {"current": 0, "max": 0}
+
+        def func(x):
+            with lock:
+                state["current"] += 1
+                state["max"] = max(state["max"], state["current"])
+            time.sleep(0.01)
+            with lock:
+                state["current"] -= 1
+        list(bounded_map(func, range(30), max_workers=3))
+        self.assertTrue(state["max"] <= 3)
+
+    def test_items_are_consumed_lazily(self):
+        consumed = []
+
+        def items():
+            for x in range(100):
+                consumed.append(x)
+                yield x
+        outcomes = bounded_map(lambda x: x, items(), max_workers=2,
+                               ordered=True)
+        next(outcomes)
+        outcomes.close()
+        self.assertTrue(len(consumed) < 10)
@@ -0,0 +1,175 @@
+import threading
+import unittest
+
+import mock
+
+import gocardless
+from gocardless.client import Client
+from gocardless.context import (current_client, current_environment, bind,
+                                _ThreadLocalVar)
+from gocardless.fake import FakeGoCardless
+from gocardless.pool import ClientPool
+from gocardless.request import Transport
+from gocardless.resources import Bill
+from gocardless.retry import NO_RETRIES
+
+
+class UsingTestCase(unittest.TestCase):
+
+    def test_using_sets_client_within_block(self):
+        client = mock.Mock()
+        client.api_get.return_value = {"id": "1"}
+        with gocardless.using(client) as used:
+            self.assertIs(used, client)
+            self.assertEqual(Bill.find("1").client, client)
+        self.assertIs(current_client(), gocardless.client)
+
+    def test_using_nests_and_restores(self):
+        outer, inner = mock.Mock(), mock.Mock()
+        with gocardless.using(outer, environment="sandbox"):
+            with gocardless.using(inner):
+                self.assertIs(current_client(), inner)
+                self.assertEqual(current_environment(), "sandbox")
+            self.assertIs(current_client(), outer)
+        self.assertEqual(current_environment(), gocardless.environment)
+
+    def test_using_environment_sets_base_url(self):
+        with gocardless.using(environment="sandbox"):
+            self.assertEqual(Client.get_base_url(),
+                             "https://sandbox.gocardless.com")
+        self.assertEqual(Client.get_base_url(), "https://gocardless.com")
+
+    def test_using_base_url(self):
+        with gocardless.using(base_url="https://abc.gocardless.com"):
+            self.assertEqual(Client.get_base_url(),
+                             "https://abc.gocardless.com")
+
+    def test_settings_are_local_to_threads(self):
+        seen = {}
+        ready = threading.Event()
+        done = threading.Event()
+
+        def other_thread():
+            ready.wait()
+            seen["environment"] = current_environment()
+            done.set()
+        thread = threading.Thread(target=other_thread)
+        thread.start()
+        with gocardless.using(environment="sandbox"):
+            ready.set()
+            done.wait()
+        thread.join()
+        self.assertEqual(seen["environment"], "production")
+
+
+class RecordingTransport(Transport):
+
+    def __init__(self, fake):
+        self.fake = fake
+        self.urls = []
+        self._lock = threading.Lock()
+
+    def send(self, method, url, **options):
+        with self._lock:
+            self.urls.append(url)
+        return self.fake.send(method, url, **options)
+
+
+class WorkerThreadTestCase(unittest.TestCase):
+
+    sandbox = "https://sandbox.gocardless.com/"
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(bills=4)
+        self.transport = RecordingTransport(self.fake)
+        self.client = Client("id", "secret", "token", self.fake.merchant_id,
+                             transport=self.transport,
+                             retry_policy=NO_RETRIES)
+        self.bill_ids = list(self.fake.resources["bills"])
+
+    def assert_sandbox_urls(self):
+        self.assertTrue(self.transport.urls)
+        for url in self.transport.urls:
+            self.assertTrue(url.startswith(self.sandbox), url)
+
+    def test_find_many_uses_environment(self):
+        with gocardless.using(self.client, environment="sandbox"):
+            Bill.find(self.bill_ids[0])
+            Bill.find_many(self.bill_ids)
+        self.assertEqual(len(self.transport.urls), 5)
+        self.assert_sandbox_urls()
+
+    def test_prefetched_pages_use_environment(self):
+        merchant = self.client.merchant()
+        with gocardless.using(environment="sandbox"):
+            bills = list(merchant.iter_bills(per_page=2, prefetch=True))
+        self.assertEqual(len(bills), 4)
+        self.transport.urls.pop(0)
+        self.assert_sandbox_urls()
+
+    def test_create_bills_uses_environment(self):
+        preauth_id = list(self.fake.resources["pre_authorizations"])[0]
+        with gocardless.using(environment="sandbox"):
+            outcomes = list(self.client.create_bills(
+                [(10, preauth_id), (20, preauth_id)]))
+        self.assertEqual([o.error for o in outcomes], [None, None])
+        self.assert_sandbox_urls()
+
+    def test_pool_keeps_outer_environment(self):
+        pool = ClientPool("id", "secret",
+                          tokens={self.fake.merchant_id: "token"},
+                          transport=self.transport, retry_policy=NO_RETRIES)
+        with gocardless.using(environment="sandbox"):
+            result = pool.map(lambda client: client.merchant())
+        self.assertEqual(result.errors, {})
+        self.assert_sandbox_urls()
+
+    def test_bind_without_contextvars(self):
+        with mock.patch("gocardless.context.contextvars", None):
+            with gocardless.using(environment="sandbox"):
+                bound = bind(current_environment)
+            seen = []
+            thread = threading.Thread(target=lambda: seen.append(bound()))
+            thread.start()
+            thread.join()
+        self.assertEqual(seen, ["sandbox"])
+        self.assertEqual(current_environment(), "production")
+
+
+class ClientEnvironmentTestCase(unittest.TestCase):
+
+    def test_client_environment(self):
+        client = Client("id", "secret", environment="sandbox")
+        self.assertEqual(client.get_base_url(),
+                         "https://sandbox.gocardless.com")
+        self.assertEqual(Client.get_base_url(), "https://gocardless.com")
+
+    def test_client_base_url_overrides_context(self):
+        client = Client("id", "secret", base_url="https://abc.gocardless.com")
+        with gocardless.using(environment="sandbox"):
+            self.assertEqual(client.get_base_url(),
+                             "https://abc.gocardless.com")
+            self.assertEqual(Client("id", "secret").get_base_url(),
+                             "https://sandbox.gocardless.com")
+
+    def test_client_environment_overrides_base_urls(self):
+        client = Client("id", "secret", environment="sandbox")
+        with gocardless.using(base_url="https://abc.gocardless.com"):
+            self.assertEqual(client.get_base_url(),
+                             "https://sandbox.gocardless.com")
+        with mock.patch.object(Client, "base_url",
+                               "https://abc.gocardless.com"):
+            self.assertEqual(client.get_base_url(),
+                             "https://sandbox.gocardless.com")
+            self.assertEqual(Client.get_base_url(),
+                             "https://abc.gocardless.com")
+
+
+class ThreadLocalVarTestCase(unittest.TestCase):
+
+    def test_set_and_reset(self):
+        var = _ThreadLocalVar("test")
+        token = var.set("a")
+        self.assertEqual(var.get(), "a")
+        var.reset(token)
+        self.assertIsNone(var.get())
@@ -0,0 +1,88 @@
+import unittest
+
+import gocardless
+from gocardless.exceptions import (ClientError, ServerError, RateLimitError,
+                                   RequestTimeoutError)
+from gocardless.fake import FakeGoCardless
+from gocardless.resources import Bill
+from gocardless.retry import NO_RETRIES
+
+
+class FakeGoCardlessTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(users=3, pre_authorizations=2,
+                                            subscriptions=2, bills=25,
+                                            payouts=2, seed=1)
+        self.client = gocardless.Client("id", "secret", "token",
+                                        self.fake.merchant_id,
+                                        transport=self.fake,
+                                        retry_policy=NO_RETRIES)
+
+    def test_serves_merchant_and_sub_resources(self):
+        merchant = self.client.merchant()
+        self.assertEqual(merchant.id, self.fake.merchant_id)
+        self.assertEqual(len(merchant.bills()), 25)
+        self.assertEqual(len(merchant.users()), 3)
+        self.assertEqual(len(merchant.payouts()), 2)
+
+    def test_filters_and_paginates_lists(self):
+        merchant = self.client.merchant()
+        failed = merchant.bills(status="failed")
+        self.assertEqual(len(failed), 5)
+        self.assertTrue(all(bill.status == "failed" for bill in failed))
+        self.assertEqual(len(list(merchant.iter_bills(per_page=10))), 25)
+
+    def test_finds_resources_by_id(self):
+        bill = self.client.merchant().bills()[0]
+        self.assertEqual(self.client.bill(bill.id), bill)
+        self.assertEqual(bill.user().id, bill._raw_attrs["user_id"])
+
+    def test_missing_resources_raise_client_error(self):
+        self.assertRaises(ClientError, self.client.bill, "missing")
+
+    def test_creates_bills_idempotently(self):
+        preauth = self.client.merchant().pre_authorizations()[0]
+        first = preauth.create_bill(12, idempotency_key="key")
+        second = preauth.create_bill(12, idempotency_key="key")
+        self.assertEqual(first.id, second.id)
+        self.assertEqual(first.source_id, preauth.id)
+        self.assertEqual(len(self.fake.resources["bills"]), 26)
+
+    def test_bill_actions_change_status(self):
+        bill = self.client.merchant().bills(status="pending")[0]
+        bill.cancel()
+        self.assertEqual(self.client.bill(bill.id).status, "cancelled")
+        self.assertRaises(ClientError, bill.cancel)
+
+    def test_confirm(self):
+        params = {"resource_id": "1", "resource_type": "bill"}
+        params["signature"] = gocardless.utils.generate_signature(params,
+                                                                  "secret")
+        self.client.confirm_resource(params)
+        self.assertEqual(self.fake.stats["post"], 1)
+
+    def test_injected_failures(self):
+        self.fake.fail_next(status=500)
+        self.assertRaises(ServerError, self.client.merchant)
+        self.fake.fail_next(status=429, retry_after=3)
+        with self.assertRaises(RateLimitError) as ex:
+            self.client.merchant()
+        self.assertEqual(ex.exception.retry_after, 3)
+        self.assertEqual(self.fake.stats["errors"], 2)
+
+    def test_injected_timeouts(self):
+        self.fake.timeout_rate = 1.0
+        self.assertRaises(RequestTimeoutError, self.client.merchant)
+
+    def test_streamed_lists(self):
+        bills = list(self.client.merchant().iter_bills(per_page=10,
+                                                       stream=True))
+        self.assertEqual(len(bills), 25)
+        self.assertIsInstance(bills[0], Bill)
+
+    def test_generated_fixtures_are_reproducible(self):
+        other = FakeGoCardless.generate(users=3, pre_authorizations=2,
+                                        subscriptions=2, bills=25, payouts=2)
+        self.assertEqual(list(other.resources["bills"].values()),
+                         list(self.fake.resources["bills"].values()))
@@ -0,0 +1,61 @@
+import unittest
+
+from . import fixtures
+from gocardless.mirror import Mirror
+from gocardless.resources import Bill, User
+from gocardless.sync import ChangeEvent, INSERTED
+
+
+def make_bill(id, status, user_id, created_at="2014-01-01T00:00:00Z"):
+    return Bill(dict(fixtures.bill_json, id=id, status=status,
+                     user_id=user_id, created_at=created_at), None)
+
+
+class MirrorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mirror = Mirror(client="aclient")
+        self.mirror.save([
+            make_bill("1", "failed", "u1", "2014-01-03T00:00:00Z"),
+            make_bill("2", "paid", "u1", "2014-01-02T00:00:00Z"),
+            make_bill("3", "failed", "u2", "2014-01-01T00:00:00Z"),
+        ])
+        self.addCleanup(self.mirror.close)
+
+    def test_query_by_indexed_fields(self):
+        bills = self.mirror.query(Bill, status="failed", user_id="u1")
+        self.assertEqual([b.id for b in bills], ["1"])
+        self.assertIsInstance(bills[0], Bill)
+        self.assertEqual(bills[0].client, "aclient")
+
+    def test_query_with_list_of_values(self):
+        bills = self.mirror.query(Bill, status=["failed", "paid"],
+                                  order_by="-created_at", limit=2)
+        self.assertEqual([b.id for b in bills], ["1", "2"])
+
+    def test_query_orders_by_created_at(self):
+        self.assertEqual([b.id for b in self.mirror.query(Bill)],
+                         ["3", "2", "1"])
+
+    def test_query_by_unindexed_field_raises(self):
+        self.assertRaises(ValueError, self.mirror.query, Bill, amount="10")
+
+    def test_get_and_replace(self):
+        self.mirror.save([make_bill("1", "paid", "u1")])
+        self.assertEqual(self.mirror.get(Bill, "1").status, "paid")
+        self.assertIsNone(self.mirror.get(User, "1"))
+
+    def test_resources_are_equal_after_round_trip(self):
+        bill = make_bill("4", "pending", "u3")
+        self.mirror.save([bill])
+        self.assertEqual(self.mirror.get(Bill, "4"), bill)
+
+    def test_count_and_delete(self):
+        self.assertEqual(self.mirror.count(Bill, status="failed"), 2)
+        self.mirror.delete(Bill, "1")
+        self.assertEqual(self.mirror.count(Bill, status="failed"), 1)
+
+    def test_apply_change_events(self):
+        event = ChangeEvent(INSERTED, "bills", make_bill("5", "paid", "u4"))
+        self.assertEqual(self.mirror.apply([event]), 1)
+        self.assertEqual(self.mirror.count(Bill, user_id="u4"), 1)
@@ -0,0 +1,114 @@
+import threading
+import time
+import unittest
+
+import mock
+
+from gocardless.cache import ResponseCache, ValidatorCache
+from gocardless.context import current_client
+from gocardless.fake import FakeGoCardless
+from gocardless.identity import IdentityMap
+from gocardless.pool import ClientPool
+
+
+class ClientPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        self.pool = ClientPool("id", "secret",
+                               tokens={"m1": "tok1", "m2": "tok2"},
+                               session=self.session)
+
+    def test_clients_share_session(self):
+        client = self.pool.client("m1")
+        self.assertIs(client.session, self.session)
+        self.assertIs(self.pool.client("m2").session, self.session)
+        self.assertEqual(client._merchant_id, "m1")
+        self.assertEqual(client._access_token, "tok1")
+
+    def test_live_clients_are_reused(self):
+        client = self.pool.client("m1")
+        self.assertIs(self.pool.client("m1"), client)
+
+    def test_unknown_merchant_raises(self):
+        self.assertRaises(KeyError, self.pool.client, "m3")
+
+    def test_add_replaces_token(self):
+        self.pool.add("m1", "newtok")
+        self.assertEqual(self.pool.client("m1")._access_token, "newtok")
+        self.assertEqual(len(self.pool), 2)
+
+    def test_remove(self):
+        self.pool.remove("m2")
+        self.assertFalse("m2" in self.pool)
+        self.assertEqual(self.pool.merchant_ids, ["m1"])
+
+    def test_map_aggregates_results_and_errors(self):
+        def merchant_name(client):
+            if client._merchant_id == "m2":
+                raise ValueError("failed")
+            return client._merchant_id.upper()
+        result = self.pool.map(merchant_name)
+        self.assertEqual(dict(result.results), {"m1": "M1"})
+        self.assertEqual(list(result.errors), ["m2"])
+        self.assertIsInstance(result.errors["m2"], ValueError)
+
+    def test_map_uses_merchant_client_in_context(self):
+        result = self.pool.map(lambda client: current_client() is client)
+        self.assertEqual(list(result.results.values()), [True, True])
+
+    def test_map_selected_merchants(self):
+        result = self.pool.map(lambda client: client._merchant_id,
+                               merchant_ids=["m2"])
+        self.assertEqual(dict(result.results), {"m2": "m2"})
+
+    def test_client_options_are_passed_on(self):
+        pool = ClientPool("id", "secret", tokens=[("m1", "tok1")],
+                          timeout=5)
+        self.assertEqual(pool.client("m1").timeout, 5)
+
+
+    def test_rejects_state_shared_between_merchants(self):
+        for name, value in (("identity_map", IdentityMap()),
+                            ("validator_cache", ValidatorCache())):
+            self.assertRaises(ValueError, ClientPool, "id", "secret",
+                              **{name: value})
+
+
+class SharedCacheTestCase(unittest.TestCase):
+
+    def test_cached_responses_stay_with_their_merchant(self):
+        fake = FakeGoCardless(merchant_id="m1")
+        fake.add("merchants", {"id": "m2", "name": "Other Merchant"})
+        bill = fake.add("bills", {"amount": "10.00"})
+        pool = ClientPool("id", "secret", tokens={"m1": "tok1", "m2": "tok2"},
+                          cache=ResponseCache(), transport=fake)
+        path = "/bills/{0}".format(bill["id"])
+        first = pool.client("m1").api_get(path)
+        self.assertEqual(pool.client("m1").api_get(path), first)
+        self.assertEqual(fake.stats["get"], 1)
+        pool.client("m2").api_get(path)
+        self.assertEqual(fake.stats["get"], 2)
+
+
+class MaxConcurrencyTestCase(unittest.TestCase):
+
+    @mock.patch('gocardless.clientlib.Request')
+    def test_requests_per_merchant_are_capped(self, mock_reqclass):
+        lock = threading.Lock()
+        state = {"in_flight": 0, "peak": 0}
+
+        def perform():
+            with lock:
+                state["in_flight"] += 1
+                state["peak"] = max(state["peak"], state["in_flight"])
+            time.sleep(0.01)
+            with lock:
+                state["in_flight"] -= 1
+            return {"id": "1"}
+        mock_reqclass.return_value.perform.side_effect = perform
+        pool = ClientPool("id", "secret", tokens={"m1": "tok1"},
+                          session=mock.Mock(), max_concurrency=2)
+        client = pool.client("m1")
+        client.bills(["1", "2", "3", "4", "5", "6"], max_workers=6)
+        self.assertEqual(state["peak"], 2)
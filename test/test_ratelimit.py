@@ -0,0 +1,119 @@
+import threading
+import unittest
+
+import mock
+
+from gocardless.ratelimit import (RateLimiter, TokenBucket,
+                                  parse_retry_after)
+
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('gocardless.utils.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.bucket = TokenBucket(rate=2, capacity=2)
+
+    def test_allows_bursts_up_to_capacity(self):
+        self.assertEqual([self.bucket.reserve() for _ in range(2)], [0, 0])
+
+    def test_reservations_queue_in_order(self):
+        delays = [self.bucket.reserve() for _ in range(5)]
+        self.assertEqual(delays, [0, 0, 0.5, 1.0, 1.5])
+        self.assertEqual(self.bucket.stats["delayed"], 3)
+
+    def test_refills_over_time(self):
+        for _ in range(2):
+            self.bucket.reserve()
+        self.clock.now += 0.5
+        self.assertEqual(self.bucket.reserve(), 0)
+        self.assertEqual(self.bucket.reserve(), 0.5)
+
+    def test_pause(self):
+        self.bucket.pause(3)
+        self.assertEqual(self.bucket.reserve(), 3.5)
+
+    def test_limit_to_remaining(self):
+        self.bucket.limit_to(0)
+        self.assertEqual(self.bucket.reserve(), 0.5)
+
+    def test_acquire_sleeps_for_delay(self):
+        with mock.patch.object(self.bucket, 'sleep') as mock_sleep:
+            for _ in range(3):
+                self.bucket.acquire()
+        mock_sleep.assert_called_once_with(0.5)
+
+    def test_is_thread_safe(self):
+        bucket = TokenBucket(rate=1, capacity=1)
+        delays = []
+
+        def reserve():
+            for _ in range(50):
+                delays.append(bucket.reserve())
+        threads = [threading.Thread(target=reserve) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(delays), [float(n) for n in range(200)])
+
+
+class RateLimiterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = RateLimiter(read_rate=10, write_rate=1)
+
+    def test_reads_and_writes_use_separate_buckets(self):
+        self.assertIs(self.limiter.bucket('get'), self.limiter.buckets['read'])
+        self.assertIs(self.limiter.bucket('post'),
+                      self.limiter.buckets['write'])
+        self.assertIs(self.limiter.bucket('put'),
+                      self.limiter.buckets['write'])
+
+    def test_retry_after_pauses_bucket(self):
+        with mock.patch.object(self.limiter.buckets['write'],
+                               'pause') as pause:
+            self.limiter.update('post', {'Retry-After': '30'})
+        pause.assert_called_once_with(30)
+
+    def test_exhausted_limit_pauses_until_reset(self):
+        bucket = self.limiter.buckets['read']
+        with mock.patch.object(bucket, 'pause') as pause:
+            self.limiter.update('get', {'X-RateLimit-Remaining': '0',
+                                        'X-RateLimit-Reset': '12'})
+        pause.assert_called_once_with(12)
+
+    def test_remaining_limits_tokens(self):
+        with mock.patch.object(self.limiter.buckets['read'],
+                               'limit_to') as limit_to:
+            self.limiter.update('get', {'X-RateLimit-Remaining': '3'})
+        limit_to.assert_called_once_with(3)
+
+    def test_ignores_responses_without_headers(self):
+        self.limiter.update('get', {})
+        self.assertEqual(self.limiter.buckets['read'].reserve(), 0)
+
+
+class ParseRetryAfterTestCase(unittest.TestCase):
+
+    def test_seconds(self):
+        self.assertEqual(parse_retry_after('120'), 120)
+
+    def test_http_date(self):
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT',
+                                           now=1445412480), 30)
+
+    def test_missing_or_invalid(self):
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
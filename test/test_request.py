@@ -1,8 +1,11 @@
 import unittest
 import mock
+import requests
 
 #from gocardless import request
 import gocardless.request
+import gocardless.exceptions
+from gocardless.cache import ValidatorCache
 
 
 class RequestTestCase(unittest.TestCase):
@@ -69,3 +72,197 @@ class RequestTestCase(unittest.TestCase):
         mock_get.return_value = response
         self.assertEqual(self.request.perform(), {'a': 'b'})
 
+
+    def test_perform_uses_session_when_given(self):
+        session = mock.Mock()
+        session.get.return_value.json = lambda: {"a": "b"}
+        request = gocardless.request.Request('get', 'http://test.com',
+                                             session=session)
+        self.assertEqual(request.perform(), {"a": "b"})
+        session.get.assert_called_once_with('http://test.com',
+                                            headers=mock.ANY)
+
+    @mock.patch('gocardless.request.requests.get')
+    def test_perform_raises_server_error_for_5xx(self, mock_get):
+        response = mock.Mock(ok=False, status_code=503)
+        response.json.side_effect = ValueError("not json")
+        mock_get.return_value = response
+        with self.assertRaises(gocardless.exceptions.ServerError) as ex:
+            self.request.perform()
+        self.assertEqual(ex.exception.status_code, 503)
+
+    def test_set_idempotency_key_sets_header(self):
+        self.request.set_idempotency_key('akey')
+        self.assertEqual(self.request._opts['headers']['Idempotency-Key'],
+                         'akey')
+
+    def test_set_timeout_sets_timeout_in_opts(self):
+        self.request.set_timeout((3, 20))
+        self.assertEqual(self.request._opts['timeout'], (3, 20))
+
+    def test_set_timeout_ignores_none(self):
+        self.request.set_timeout(None)
+        self.assertTrue('timeout' not in self.request._opts)
+
+    @mock.patch('gocardless.request.requests.get')
+    def test_perform_raises_timeout_error(self, mock_get):
+        mock_get.side_effect = requests.exceptions.ReadTimeout("slow")
+        self.assertRaises(gocardless.exceptions.RequestTimeoutError,
+                          self.request.perform)
+
+
+class TransportTestCase(unittest.TestCase):
+
+    def test_request_sends_with_transport(self):
+        transport = mock.Mock()
+        transport.send.return_value.json = lambda: {"a": "b"}
+        request = gocardless.request.Request('get', 'http://test.com',
+                                             params={'x': 'y'},
+                                             transport=transport)
+        self.assertEqual(request.perform(), {"a": "b"})
+        transport.send.assert_called_once_with(
+            'get', 'http://test.com', headers=mock.ANY, params={'x': 'y'})
+
+    @mock.patch('gocardless.request.requests.put')
+    def test_requests_transport_defaults_to_requests(self, mock_put):
+        transport = gocardless.request.RequestsTransport()
+        transport.send('put', 'http://test.com', data='{}')
+        mock_put.assert_called_once_with('http://test.com', data='{}')
+
+    def test_base_transport_is_abstract(self):
+        self.assertRaises(NotImplementedError,
+                          gocardless.request.Transport().send, 'get',
+                          'http://test.com')
+
+
+class RateLimitedRequestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.limiter = mock.Mock()
+        self.request = gocardless.request.Request('post', 'http://test.com')
+        self.request.use_rate_limiter(self.limiter)
+
+    @mock.patch('gocardless.request.requests.post')
+    def test_waits_for_limiter_and_reports_headers(self, mock_post):
+        mock_post.return_value.json = lambda: {"a": "b"}
+        self.assertEqual(self.request.perform(), {"a": "b"})
+        self.limiter.acquire.assert_called_once_with('post')
+        self.limiter.update.assert_called_once_with(
+            'post', mock_post.return_value.headers)
+
+    @mock.patch('gocardless.request.requests.post')
+    def test_raises_rate_limit_error_for_429(self, mock_post):
+        response = mock.Mock(ok=False, status_code=429,
+                             headers={'Retry-After': '7'})
+        response.json.return_value = {"error": ["Too many requests"]}
+        mock_post.return_value = response
+        with self.assertRaises(gocardless.exceptions.RateLimitError) as ex:
+            self.request.perform()
+        self.assertEqual(ex.exception.retry_after, 7)
+        self.assertTrue("Too many requests" in str(ex.exception))
+
+
+class StreamingRequestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.request = gocardless.request.Request('get', 'http://test.com')
+        self.request.use_streaming()
+
+    def perform(self, mock_get, chunks, **kwargs):
+        response = mock.Mock(ok=True, status_code=200, **kwargs)
+        response.iter_content.return_value = iter(chunks)
+        mock_get.return_value = response
+        return self.request.perform()
+
+    @mock.patch('gocardless.request.requests.get')
+    def test_streams_array_elements(self, mock_get):
+        result = self.perform(mock_get, [b'  [{"id": "1"},', b' {"id": "2"}]'])
+        self.assertEqual(next(result), {"id": "1"})
+        self.assertEqual(list(result), [{"id": "2"}])
+        mock_get.assert_called_once_with(mock.ANY, headers=mock.ANY,
+                                         stream=True)
+
+    @mock.patch('gocardless.request.requests.get')
+    def test_returns_error_objects_whole(self, mock_get):
+        result = self.perform(mock_get, [b'{"error": ', b'["not found"]}'])
+        self.assertEqual(result, {"error": ["not found"]})
+
+    @mock.patch('gocardless.request.requests.get')
+    def test_streamed_requests_are_not_conditional(self, mock_get):
+        cache = ValidatorCache()
+        cache.set('http://test.com', '"v1"', None, [])
+        self.request.use_validator_cache(cache)
+        list(self.perform(mock_get, [b'[]'], headers={'ETag': '"v2"'}))
+        headers = mock_get.call_args[1]['headers']
+        self.assertTrue('If-None-Match' not in headers)
+        self.assertEqual(cache.get('http://test.com').etag, '"v1"')
+
+
+class ConditionalRequestTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.validators = ValidatorCache()
+        self.session = mock.Mock()
+
+    def _perform(self, status_code, body=None, headers=None):
+        response = self.session.get.return_value
+        response.status_code = status_code
+        response.ok = status_code < 400
+        response.headers = headers or {}
+        response.json.return_value = body
+        request = gocardless.request.Request('get', 'http://test.com',
+                                             params={'page': 1},
+                                             session=self.session)
+        request.use_validator_cache(self.validators)
+        return request, request.perform()
+
+    def test_validators_are_stored(self):
+        self._perform(200, {"a": "b"}, {"ETag": '"v1"'})
+        request, _ = self._perform(200, {"a": "b"})
+        headers = request._opts['headers']
+        self.assertEqual(headers['If-None-Match'], '"v1"')
+        self.assertTrue('If-Modified-Since' not in headers)
+
+    def test_not_modified_returns_cached_body(self):
+        self._perform(200, {"a": "b"},
+                      {"Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        request, body = self._perform(304)
+        self.assertEqual(body, {"a": "b"})
+        self.assertEqual(request._opts['headers']['If-Modified-Since'],
+                         "Wed, 21 Oct 2015 07:28:00 GMT")
+        stats = self.validators.stats
+        self.assertEqual((stats["requests"], stats["not_modified"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 1.0)
+
+    def test_responses_without_validators_are_not_stored(self):
+        self._perform(200, {"a": "b"})
+        request, _ = self._perform(200, {"a": "b"})
+        self.assertTrue('If-None-Match' not in request._opts['headers'])
+        self.assertEqual(self.validators.stats["size"], 0)
+
+    def test_changed_response_replaces_cached_body(self):
+        self._perform(200, {"a": "b"}, {"ETag": '"v1"'})
+        self._perform(200, {"a": "c"}, {"ETag": '"v2"'})
+        request, body = self._perform(304)
+        self.assertEqual(body, {"a": "c"})
+        self.assertEqual(request._opts['headers']['If-None-Match'], '"v2"')
+
+class SessionTestCase(unittest.TestCase):
+
+    def test_create_session_mounts_pooled_adapter(self):
+        session = gocardless.request.create_session(pool_maxsize=25)
+        adapter = session.get_adapter('https://gocardless.com')
+        self.assertEqual(adapter._pool_maxsize, 25)
+
+    def test_create_session_without_keep_alive(self):
+        session = gocardless.request.create_session(keep_alive=False)
+        self.assertEqual(session.headers['Connection'], 'close')
+
+    def test_connection_stats_counts_reused_connections(self):
+        session = gocardless.request.create_session()
+        pool = mock.Mock(num_connections=2, num_requests=7)
+        adapter = session.get_adapter('https://gocardless.com')
+        with mock.patch.object(adapter.poolmanager, 'pools', {'k': pool}):
+            stats = gocardless.request.connection_stats(session)
+        self.assertEqual(stats, {'connections': 2, 'requests': 7,
+                                 'reused': 5})
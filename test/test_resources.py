@@ -1,5 +1,6 @@
 import copy
 import datetime
+import decimal
 import json
 import mock
 from mock import patch
@@ -7,9 +8,17 @@ import unittest
 
 import six
 
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 from . import fixtures
 import gocardless
 from gocardless.resources import Resource, Subscription, Bill, PreAuthorization
+from gocardless.exceptions import ClientError
+from gocardless.identity import IdentityMap
+from gocardless.resources import prefetch_related, ResourceList, Categorical
 import collections
 
 
@@ -76,6 +85,66 @@ class ResourceTestCase(unittest.TestCase):
         self.assertEqual(res1, res2)
         self.assertEqual(hash(res1), hash(res2))
 
+class CompactResourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        attrs = dict(fixtures.bill_json, unexpected_field="surprise")
+        self.bill = Bill(attrs, None)
+
+    def test_known_fields_are_stored_in_slots(self):
+        self.assertFalse(hasattr(self.bill, "__dict__"))
+        self.assertEqual(self.bill.source_id, fixtures.bill_json["source_id"])
+        self.assertEqual(self.bill.status, fixtures.bill_json["status"])
+
+    def test_unknown_fields_are_kept_in_overflow(self):
+        self.assertEqual(self.bill.unexpected_field, "surprise")
+        self.assertEqual(self.bill._overflow["unexpected_field"], "surprise")
+
+    def test_raw_attrs_are_not_copied(self):
+        attrs = fixtures.bill_json.copy()
+        self.assertIs(Bill(attrs, None)._raw_attrs, attrs)
+
+    def test_setting_unknown_attributes(self):
+        self.bill.note = "anote"
+        self.assertEqual(self.bill.note, "anote")
+        del self.bill.note
+        self.assertFalse(hasattr(self.bill, "note"))
+
+    def test_missing_attribute_raises_attribute_error(self):
+        with self.assertRaises(AttributeError):
+            self.bill.not_a_field
+
+
+class MoneyFieldTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.bill = Bill(dict(fixtures.bill_json, partner_fees=None), None)
+
+    def test_money_fields_are_decimals(self):
+        self.assertEqual(self.bill.amount, decimal.Decimal("10.00"))
+        self.assertEqual(self.bill.gocardless_fees, decimal.Decimal("0.10"))
+        self.assertIsNone(self.bill.partner_fees)
+
+    def test_money_fields_are_parsed_lazily(self):
+        self.assertEqual(self.bill._raw_attrs["amount"], "10.00")
+        self.assertFalse(self.bill._overflow and
+                         "amount" in self.bill._overflow)
+
+    def test_minor_units(self):
+        self.assertEqual(self.bill.minor_units("amount"), 1000)
+        self.assertIsNone(self.bill.minor_units("partner_fees"))
+
+    def test_setting_money_fields(self):
+        self.bill.amount = decimal.Decimal("5")
+        self.assertEqual(self.bill.amount, decimal.Decimal("5"))
+        self.assertEqual(self.bill.minor_units("amount"), 500)
+
+    def test_subclasses_declare_money_fields(self):
+        self.assertEqual(Bill.money_fields, ["amount", "gocardless_fees",
+                                             "partner_fees",
+                                             "amount_minus_fees"])
+
+
 class ResourceSubresourceTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -108,6 +177,14 @@ class ResourceSubresourceTestCase(unittest.TestCase):
         result = self.resource.test_sub_resources(foo='bar')
         mock_client.api_get.assert_called_with(mock.ANY, params={'foo': 'bar'})
 
+    def test_subresource_accessors_are_not_instance_attributes(self):
+        self.assertFalse("test_sub_resources" in self.resource.__dict__)
+        self.assertTrue(callable(self.resource.test_sub_resources))
+
+    def test_missing_subresource_raises_attribute_error(self):
+        self.assertFalse(hasattr(self.resource, "missing_resources"))
+        self.assertFalse(hasattr(self.resource, "iter_missing_resources"))
+
     def test_resource_is_correct_instance(self):
         """
         Expose an issue where the closure which creates sub_resource functions
@@ -122,6 +199,70 @@ class ResourceSubresourceTestCase(unittest.TestCase):
         self.assertIsInstance(result[0], TestSubResource)
 
 
+class ResourceSubresourceIteratorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.resource = TestResource({"sub_resource_uris":
+            {"test_sub_resources":
+                "https://gocardless.com/api/v1/merchants/1/test_sub_resources"},
+            "id": "1"}, None)
+        self.pages = {
+            1: [create_mock_attrs({"id": "1"}), create_mock_attrs({"id": "2"})],
+            2: [create_mock_attrs({"id": "3"}), create_mock_attrs({"id": "4"})],
+            3: [create_mock_attrs({"id": "5"})],
+        }
+        self.resource.client = mock.Mock()
+        self.resource.client.api_get.side_effect = \
+            lambda path, params: self.pages[params["page"]]
+
+    def test_iterator_fetches_every_page(self):
+        result = list(self.resource.iter_test_sub_resources(per_page=2))
+        self.assertEqual([r.id for r in result], ["1", "2", "3", "4", "5"])
+        self.assertIsInstance(result[0], TestSubResource)
+        self.assertEqual(self.resource.client.api_get.call_count, 3)
+
+    def test_iterator_is_lazy(self):
+        iterator = self.resource.iter_test_sub_resources(per_page=2)
+        self.assertEqual(self.resource.client.api_get.call_count, 0)
+        self.assertEqual(next(iterator).id, "1")
+        self.assertEqual(next(iterator).id, "2")
+        iterator.close()
+        self.assertEqual(self.resource.client.api_get.call_count, 1)
+
+    def test_iterator_passes_params(self):
+        list(self.resource.iter_test_sub_resources(per_page=2, foo="bar"))
+        self.resource.client.api_get.assert_any_call(
+            "/merchants/1/test_sub_resources",
+            params={"foo": "bar", "page": 1, "per_page": 2})
+
+    def test_iterator_passes_deadline_to_client(self):
+        self.resource.client.api_get.side_effect = \
+            lambda path, params, deadline: self.pages[params["page"]]
+        result = self.resource.iter_test_sub_resources(per_page=2,
+                                                       deadline=30)
+        self.assertEqual(len(list(result)), 5)
+        deadline = self.resource.client.api_get.call_args[1]["deadline"]
+        self.assertTrue(deadline <= gocardless.utils.monotonic() + 30)
+
+    def test_iterator_prefetches_next_page(self):
+        result = self.resource.iter_test_sub_resources(per_page=2,
+                                                       prefetch=True)
+        self.assertEqual([r.id for r in result], ["1", "2", "3", "4", "5"])
+
+    def test_iterator_streams_pages(self):
+        self.resource.client.api_get.side_effect = \
+            lambda path, params, stream: iter(self.pages[params["page"]])
+        result = self.resource.iter_test_sub_resources(per_page=2,
+                                                       stream=True)
+        self.assertEqual([r.id for r in result], ["1", "2", "3", "4", "5"])
+        self.assertEqual(self.resource.client.api_get.call_count, 3)
+
+    def test_iterator_cannot_stream_and_prefetch(self):
+        self.assertRaises(ValueError, list,
+                          self.resource.iter_test_sub_resources(
+                              stream=True, prefetch=True))
+
+
 class FindResourceTestCase(unittest.TestCase):
 
     def test_find_resource_by_id_with_client(self):
@@ -142,6 +283,39 @@ class FindResourceTestCase(unittest.TestCase):
         self.assertEqual(TestResource.find("1").id, "1")
 
 
+class FindManyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.api_get.side_effect = \
+            lambda path: {"id": path.split("/")[-1]}
+
+    def test_find_many_returns_resources_in_order(self):
+        result = TestResource.find_many(["3", "1", "2"], self.client)
+        self.assertEqual([r.id for r in result], ["3", "1", "2"])
+        self.assertIsInstance(result[0], TestResource)
+
+    def test_find_many_fetches_duplicates_once(self):
+        result = TestResource.find_many(["1", "2", "1"], self.client)
+        self.assertEqual(self.client.api_get.call_count, 2)
+        self.assertIs(result[0], result[2])
+
+    def test_find_many_unordered(self):
+        result = TestResource.find_many(["1", "2", "3"], self.client,
+                                        ordered=False)
+        self.assertEqual(sorted(r.id for r in result), ["1", "2", "3"])
+
+    def test_find_many_raises_errors(self):
+        self.client.api_get.side_effect = ClientError("not found")
+        self.assertRaises(ClientError, TestResource.find_many, ["1"],
+                          self.client)
+
+    @patch('gocardless.client')
+    def test_find_many_uses_default_client(self, mock_client):
+        mock_client.api_get.side_effect = self.client.api_get.side_effect
+        self.assertEqual(TestResource.find_many(["1"])[0].id, "1")
+
+
 
 class TestDateResource(Resource):
     endpoint = "/dates"
@@ -161,6 +335,18 @@ class DateResourceFieldTestCase(unittest.TestCase):
         self.assertEqual(res.modified, mod_date)
         self.assertEqual(res.activated, act_date)
 
+    def test_date_fields_are_parsed_on_access(self):
+        params = {"modified": "not a date", "activated": None}
+        res = TestDateResource(create_mock_attrs(params), None)
+        self.assertIsNone(res.activated)
+        self.assertRaises(ValueError, getattr, res, "modified")
+
+    def test_date_fields_can_be_set(self):
+        res = Bill(fixtures.bill_json, None)
+        paid = datetime.datetime(2013, 1, 1)
+        res.paid_at = paid
+        self.assertEqual(res.paid_at, paid)
+
 
 class TestReferenceResource(Resource):
     endpoint = "/referencing"
@@ -184,6 +370,18 @@ class ReferenceResourceTestCase(unittest.TestCase):
             self.assertEqual("1234", res.test_resource())
             mock_res.assert_called_with("2345", None)
 
+    def test_reference_accessor_is_declared_on_class(self):
+        self.assertIsInstance(TestReferenceResource.__dict__["test_resource"],
+                              gocardless.resources.ReferenceAccessor)
+
+    def test_reference_function_uses_current_client(self):
+        params = create_mock_attrs({"test_resource_id":"2345"})
+        res = TestReferenceResource(params, None)
+        res.client = "aclient"
+        with patch.object(TestResource, 'find_with_client') as mock_res:
+            res.test_resource()
+            mock_res.assert_called_with("2345", "aclient")
+
     def test_date_fields_inherited(self):
         params = create_mock_attrs({"test_resource_id":"123"})
         res = TestReferenceResource(params, None)
@@ -196,6 +394,48 @@ class ReferenceResourceTestCase(unittest.TestCase):
         res = testclass(params, None)
 
 
+class IdentityMapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.identity_map = IdentityMap()
+        self.client.api_get.side_effect = \
+            lambda path: create_mock_attrs({"id": path.split("/")[-1]})
+        self.resources = [
+            TestReferenceResource(create_mock_attrs(
+                {"id": str(i), "test_resource_id": str(i % 3)}), self.client)
+            for i in range(10)]
+
+    def test_references_are_fetched_once(self):
+        first = [res.test_resource() for res in self.resources]
+        second = [res.test_resource() for res in self.resources]
+        self.assertEqual(self.client.api_get.call_count, 3)
+        self.assertIs(first[0], second[3])
+
+    def test_prefetch_related_loads_distinct_ids(self):
+        prefetch_related(self.resources, "test_resource")
+        self.assertEqual(self.client.api_get.call_count, 3)
+        self.assertEqual(len(self.client.identity_map), 3)
+        for res in self.resources:
+            self.assertEqual(res.test_resource().id,
+                             res._raw_attrs["test_resource_id"])
+        self.assertEqual(self.client.api_get.call_count, 3)
+
+    def test_prefetch_related_skips_loaded_ids(self):
+        self.resources[0].test_resource()
+        prefetch_related(self.resources, "test_resource")
+        self.assertEqual(self.client.api_get.call_count, 3)
+
+    def test_prefetch_related_requires_identity_map(self):
+        self.client.identity_map = None
+        self.assertRaises(ClientError, prefetch_related, self.resources,
+                          "test_resource")
+
+    def test_prefetch_related_rejects_other_names(self):
+        self.assertRaises(ValueError, prefetch_related, self.resources,
+                          "get_endpoint")
+
+
 class SubscriptionCancelTestCase(unittest.TestCase):
 
     def test_cancel_puts(self):
@@ -266,3 +506,63 @@ class BillRetryTestCase(unittest.TestCase):
         bill.refund()
         refund_url = "/bills/{0}/refund".format(fixtures.bill_json["id"])
         client.api_post.assert_called_with(refund_url)
+
+
+class ResourceListColumnsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.bills = ResourceList([
+            Bill(dict(fixtures.bill_json, id="1"), None),
+            Bill(dict(fixtures.bill_json, id="2", amount="2.50",
+                      status="paid", paid_at="2011-11-23T10:00:00Z"), None),
+            Bill(dict(fixtures.bill_json, id="3", partner_fees=None), None),
+        ])
+
+    def test_to_columns_types_columns(self):
+        columns = self.bills.to_columns()
+        self.assertEqual(columns["id"], ["1", "2", "3"])
+        self.assertEqual(columns["amount"], [1000, 250, 1000])
+        self.assertEqual(columns["gocardless_fees"], [10, 10, 10])
+        self.assertEqual(columns["partner_fees"], [0, 0, None])
+        self.assertEqual(columns["paid_at"],
+                         [None, datetime.datetime(2011, 11, 23, 10), None])
+        self.assertEqual(columns["status"],
+                         Categorical([0, 1, 0], ["pending", "paid"]))
+
+    def test_to_columns_selected_fields(self):
+        columns = self.bills.to_columns(["status", "name", "user_id"])
+        self.assertEqual(list(columns), ["status", "name", "user_id"])
+        self.assertEqual(columns["name"], [None, None, None])
+        self.assertEqual(columns["user_id"][0], "BWJ2GP659OXPAU")
+
+    def test_total(self):
+        self.assertEqual(self.bills.total("amount"), decimal.Decimal("22.50"))
+        self.assertEqual(self.bills.total("partner_fees"), 0)
+        self.assertEqual(self.bills.total("amount", minor_units=True), 2250)
+        self.assertEqual(ResourceList().total("amount"), 0)
+
+    def test_empty_list_has_no_columns(self):
+        self.assertEqual(ResourceList().to_columns(), {})
+
+    def test_sub_resource_accessors_return_resource_lists(self):
+        merchant = Resource({"id": "1", "sub_resource_uris":
+            {"bills": "https://gocardless.com/api/v1/merchants/1/bills"}},
+            mock.Mock())
+        merchant.client.api_get.return_value = [fixtures.bill_json]
+        with patch.object(Resource, "_get_klass_from_name",
+                          return_value=Bill):
+            self.assertIsInstance(merchant.bills(), ResourceList)
+
+    @unittest.skipIf(numpy is None, "numpy is not installed")
+    def test_to_numpy(self):
+        columns = self.bills.to_numpy()
+        self.assertEqual(columns["amount"].dtype, numpy.int64)
+        self.assertEqual(columns["amount"].sum(), 2250)
+        self.assertEqual(columns["partner_fees"].sum(), 0)
+        self.assertTrue(columns["partner_fees"].mask[2])
+        self.assertEqual(str(columns["paid_at"][1]), "2011-11-23T10:00:00")
+        self.assertTrue(numpy.isnat(columns["paid_at"][0]))
+        status = columns["status"]
+        totals = numpy.bincount(status.codes, weights=columns["amount"])
+        self.assertEqual(dict(zip(status.categories, totals)),
+                         {"pending": 2000, "paid": 250})
@@ -0,0 +1,78 @@
+import unittest
+import mock
+
+from gocardless import utils
+from gocardless.exceptions import (ServerError, RateLimitError,
+                                   RequestTimeoutError)
+from gocardless.retry import RetryPolicy
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(max_attempts=3, backoff_factor=1,
+                                  max_backoff=3, jitter=False)
+
+    def test_retries_idempotent_methods(self):
+        error = ServerError("error", status_code=503)
+        self.assertTrue(self.policy.should_retry("get", error, 1))
+        self.assertTrue(self.policy.should_retry("put", error, 2))
+
+    def test_does_not_retry_posts_without_idempotency_key(self):
+        error = ServerError("error", status_code=503)
+        self.assertFalse(self.policy.should_retry("post", error, 1))
+        self.assertTrue(self.policy.should_retry("post", error, 1,
+                                                 idempotent=True))
+
+    def test_does_not_retry_other_statuses(self):
+        error = ServerError("error", status_code=501)
+        self.assertFalse(self.policy.should_retry("get", error, 1))
+
+    def test_stops_after_max_attempts(self):
+        error = ServerError("error", status_code=503)
+        self.assertFalse(self.policy.should_retry("get", error, 3))
+        self.assertEqual(self.policy.stats["exhausted"], 1)
+
+    def test_backoff_is_exponential_and_capped(self):
+        self.assertEqual([self.policy.backoff(n) for n in range(1, 5)],
+                         [1, 2, 3, 3])
+
+    def test_backoff_with_jitter(self):
+        policy = RetryPolicy(backoff_factor=1, jitter=True)
+        for _ in range(20):
+            self.assertTrue(0 <= policy.backoff(3) <= 4)
+
+    def test_wait_records_retry(self):
+        on_retry = mock.Mock()
+        policy = RetryPolicy(jitter=False, backoff_factor=2,
+                             on_retry=on_retry)
+        error = ServerError("error", status_code=503)
+        with mock.patch.object(policy, "sleep") as mock_sleep:
+            policy.wait("get", "http://test.com", 1, error)
+        mock_sleep.assert_called_once_with(2)
+        on_retry.assert_called_once_with("get", "http://test.com", 1, error, 2)
+        self.assertEqual(policy.stats["retries"], 1)
+
+    def test_retries_rate_limited_posts(self):
+        error = RateLimitError("slow down", retry_after=5)
+        self.assertTrue(self.policy.should_retry("post", error, 1))
+
+    def test_wait_honours_retry_after(self):
+        error = RateLimitError("slow down", retry_after=5)
+        with mock.patch.object(self.policy, "sleep") as mock_sleep:
+            self.assertEqual(
+                self.policy.wait("get", "http://test.com", 1, error), 5)
+        mock_sleep.assert_called_once_with(5)
+
+
+class RetryDelayTestCase(unittest.TestCase):
+
+    def test_raises_when_delay_passes_deadline(self):
+        policy = RetryPolicy(backoff_factor=10, jitter=False)
+        error = ServerError("error", status_code=503)
+        with self.assertRaises(RequestTimeoutError):
+            policy.retry_delay("get", "/bills/1", 1, error,
+                               deadline=utils.monotonic() + 1)
+        self.assertEqual(policy.stats["retries"], 0)
+        self.assertEqual(policy.retry_delay(
+            "get", "/bills/1", 1, error, deadline=utils.monotonic() + 60), 10)
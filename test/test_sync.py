@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+import mock
+
+from gocardless.client import Client
+from gocardless.fake import FakeGoCardless
+from gocardless.resources import Bill
+from gocardless.retry import NO_RETRIES
+from gocardless.sync import (Synchronizer, MemoryStore, SQLiteStore,
+                             INSERTED, UPDATED)
+
+
+def bill(id, created_at, status="pending"):
+    return Bill({"id": id, "created_at": created_at, "status": status}, None)
+
+
+class SynchronizerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.merchant = mock.Mock()
+        self.client = mock.Mock()
+        self.client.merchant.return_value = self.merchant
+        self.store = MemoryStore()
+        self.sync = Synchronizer(self.client, self.store,
+                                 resource_types=("bills",))
+
+    def run_sync(self, bills):
+        self.merchant.iter_bills.return_value = iter(bills)
+        return [(e.kind, e.resource.id) for e in self.sync.sync()]
+
+    def test_first_sync_inserts_everything(self):
+        events = self.run_sync([bill("1", "2014-01-01T00:00:00Z"),
+                                bill("2", "2014-01-02T00:00:00Z")])
+        self.assertEqual(events, [(INSERTED, "1"), (INSERTED, "2")])
+        self.merchant.iter_bills.assert_called_with(per_page=100)
+        self.assertEqual(self.store.get_watermark("bills"),
+                         "2014-01-02T00:00:00Z")
+
+    def test_next_sync_requests_records_after_watermark(self):
+        self.run_sync([bill("1", "2014-01-01T00:00:00Z")])
+        events = self.run_sync([bill("1", "2014-01-01T00:00:00Z"),
+                                bill("2", "2014-01-03T00:00:00Z")])
+        self.merchant.iter_bills.assert_called_with(
+            per_page=100, after="2013-12-31T23:59:59Z")
+        self.assertEqual(events, [(INSERTED, "2")])
+
+    def test_full_sync_ignores_watermark(self):
+        self.run_sync([bill("1", "2014-01-01T00:00:00Z")])
+        self.merchant.iter_bills.return_value = iter([
+            bill("1", "2014-01-01T00:00:00Z", "paid")])
+        events = [(e.kind, e.resource.id) for e in self.sync.sync(full=True)]
+        self.merchant.iter_bills.assert_called_with(per_page=100)
+        self.assertEqual(events, [(UPDATED, "1")])
+
+    def test_changed_records_are_updates(self):
+        self.run_sync([bill("1", "2014-01-01T00:00:00Z")])
+        events = self.run_sync([bill("1", "2014-01-01T00:00:00Z", "paid")])
+        self.assertEqual(events, [(UPDATED, "1")])
+
+    def test_watermark_not_advanced_by_interrupted_sync(self):
+        self.merchant.iter_bills.return_value = iter([
+            bill("1", "2014-01-01T00:00:00Z"),
+            bill("2", "2014-01-02T00:00:00Z")])
+        events = self.sync.sync()
+        next(events)
+        events.close()
+        self.assertIsNone(self.store.get_watermark("bills"))
+
+    def test_interrupted_sync_repeats_unfinished_events(self):
+        bills = [bill(str(n), "2014-01-0{0}T00:00:00Z".format(n))
+                 for n in range(1, 6)]
+        self.merchant.iter_bills.return_value = iter(bills)
+        events = self.sync.sync()
+        next(events)
+        next(events)
+        events.close()
+        self.assertEqual(self.run_sync(bills),
+                         [(INSERTED, str(n)) for n in range(2, 6)])
+
+
+class FakeSyncTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = FakeGoCardless.generate(bills=5)
+        self.client = Client("id", "secret", "token", self.fake.merchant_id,
+                             transport=self.fake, retry_policy=NO_RETRIES)
+
+    def sync(self, store, **kwargs):
+        return Synchronizer(self.client, store, resource_types=("bills",),
+                            per_page=2).sync(**kwargs)
+
+    def test_interrupted_sync_loses_no_events(self):
+        for store in (MemoryStore(), SQLiteStore(":memory:")):
+            events = self.sync(store)
+            first = [next(events).resource.id, next(events).resource.id]
+            events.close()
+            rest = [event.resource.id for event in self.sync(store)]
+            self.assertEqual(rest[0], first[1])
+            self.assertEqual(set(first) | set(rest),
+                             set(self.fake.resources["bills"]))
+
+    def test_records_created_in_the_watermark_second_are_seen(self):
+        store = MemoryStore()
+        list(self.sync(store))
+        attrs = dict(list(self.fake.resources["bills"].values())[-1])
+        del attrs["id"], attrs["uri"]
+        new = self.fake.add("bills", attrs)
+        events = [(e.kind, e.resource.id) for e in self.sync(store)]
+        self.assertEqual(events, [(INSERTED, new["id"])])
+
+    def test_full_sync_finds_changes_to_older_records(self):
+        store = MemoryStore()
+        list(self.sync(store))
+        first = list(self.fake.resources["bills"].values())[0]
+        first["status"] = "paid"
+        self.assertEqual(list(self.sync(store)), [])
+        events = [(e.kind, e.resource.id) for e in self.sync(store, full=True)]
+        self.assertEqual(events, [(UPDATED, first["id"])])
+
+
+class SQLiteStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "sync.db")
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_state_persists(self):
+        store = SQLiteStore(self.path)
+        store.set_fingerprint("bills", "1", "abc")
+        store.set_watermark("bills", "2014-01-01T00:00:00Z")
+        store.close()
+        store = SQLiteStore(self.path)
+        self.assertEqual(store.get_fingerprint("bills", "1"), "abc")
+        self.assertEqual(store.get_watermark("bills"), "2014-01-01T00:00:00Z")
+        self.assertIsNone(store.get_watermark("users"))
+        store.close()
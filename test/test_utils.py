@@ -3,6 +3,9 @@
 import unittest
 import six
 import codecs
+import datetime
+import decimal
+import mock
 
 
 from gocardless import utils
@@ -49,6 +52,29 @@ class PercentEncodeTestCase(unittest.TestCase):
                        six.u("%E6%94%AF%E6%89%95%E3%81%84"))
 
 
+class ToQueryTestCase(unittest.TestCase):
+
+    def test_nested_dicts_and_lists_are_sorted(self):
+        data = {"b": [2, 1], "a": {"y": "1", "x": {"z": "2"}}, "c": "a b"}
+        self.assertEqual(utils.to_query(data),
+                         "a%5Bx%5D%5Bz%5D=2&a%5By%5D=1&b%5B%5D=1&b%5B%5D=2"
+                         "&c=a%20b")
+
+    def test_namespaced_query_returns_pairs(self):
+        self.assertEqual(utils.to_query({"a": "1"}, "user"),
+                         [("user%5Ba%5D", "1")])
+
+    def test_query_pairs_appends_to_existing_pairs(self):
+        pairs = [("x", "1")]
+        utils.query_pairs({"a": ["1", "2"]}, pairs=pairs)
+        self.assertEqual(pairs, [("x", "1"), ("a%5B%5D", "1"),
+                                 ("a%5B%5D", "2")])
+
+    def test_encode_query(self):
+        self.assertEqual(utils.encode_query([("a", "1"), ("b", "2")]),
+                         "a=1&b=2")
+
+
 class SignatureTestCase(unittest.TestCase):
     def setUp(self):
       self.secret = '5PUZmVMmukNwiHc7V/TJvFHRQZWZumIpCnfZKrVYGpuAdkCcEfv3LIDSrsJ+xOVH'
@@ -61,6 +87,11 @@ class SignatureTestCase(unittest.TestCase):
       sig = utils.generate_signature({"foo": "bar", "example": [1, "a"]},self.secret)
       self.assertEqual(sig, '5a9447aef2ebd0e12d80d80c836858c6f9c13219f615ef5d135da408bcad453d')
 
+    def test_sign_query_matches_generate_signature(self):
+      data = {"foo": "bar", "example": [1, "a"]}
+      self.assertEqual(utils.sign_query(utils.to_query(data), self.secret),
+                       utils.generate_signature(data, self.secret))
+
     def test_validate_signature(self):
         params = {"key1":"val1", "key2":"val2"}
         sig = utils.generate_signature(params, self.secret)
@@ -70,6 +101,159 @@ class SignatureTestCase(unittest.TestCase):
         self.assertFalse(utils.signature_valid(params, self.secret))
 
 
+class SignerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.secret = "asecret"
+        self.signer = utils.Signer(self.secret)
+
+    def test_sign_matches_generate_signature(self):
+        data = {"foo": "bar", "example": [1, "a"]}
+        self.assertEqual(self.signer.sign(data),
+                         utils.generate_signature(data, self.secret))
+        # the key state must not be consumed by signing
+        self.assertEqual(self.signer.sign(data),
+                         utils.generate_signature(data, self.secret))
+
+    def test_valid(self):
+        params = {"key1": "val1"}
+        params["signature"] = utils.generate_signature(params, self.secret)
+        self.assertTrue(self.signer.valid(params))
+        params["signature"] = "123482494523435"
+        self.assertFalse(self.signer.valid(params))
+
+    def test_missing_signature_is_invalid(self):
+        self.assertFalse(self.signer.valid({"key1": "val1"}))
+
+    def test_signatures_valid(self):
+        good = {"a": "b"}
+        good["signature"] = utils.generate_signature(good, self.secret)
+        bad = {"a": "b", "signature": "nope"}
+        self.assertEqual(utils.signatures_valid(self.secret, [good, bad]),
+                         [True, False])
+
+    def test_constant_time_compare(self):
+        self.assertTrue(utils.constant_time_compare("abc", "abc"))
+        self.assertFalse(utils.constant_time_compare("abc", "abd"))
+        self.assertFalse(utils.constant_time_compare("abc", "ab"))
+
+
+class BoundedMemoTestCase(unittest.TestCase):
+
+    def test_memoizes_until_full(self):
+        func = mock.Mock(side_effect=lambda value: [value])
+        memoized = utils._bounded_memo(2)(func)
+        first = memoized(1)
+        self.assertIs(memoized(1), first)
+        memoized(2)
+        memoized(3)
+        self.assertIsNot(memoized(1), first)
+        self.assertEqual(func.call_count, 4)
+
+
+class ParseDatetimeTestCase(unittest.TestCase):
+    def test_parses_api_timestamps(self):
+        self.assertEqual(utils.parse_datetime("2012-04-18T17:53:12Z"),
+                         datetime.datetime(2012, 4, 18, 17, 53, 12))
+
+    def test_matches_strptime(self):
+        value = "1999-12-31T23:59:59Z"
+        self.assertEqual(utils.parse_datetime(value),
+                         datetime.datetime.strptime(value,
+                                                    utils.DATETIME_FORMAT))
+
+    def test_repeated_timestamps_are_memoized(self):
+        first = utils.parse_datetime("2013-01-02T03:04:05Z")
+        self.assertIs(utils.parse_datetime("2013-01-02T03:04:05Z"), first)
+
+    def test_invalid_timestamps_raise(self):
+        self.assertRaises(ValueError, utils.parse_datetime, "2013-01-02")
+        self.assertRaises(ValueError, utils.parse_datetime,
+                          "2013-13-02T03:04:05Z")
+
+
+class IterJsonArrayTestCase(unittest.TestCase):
+    document = six.b('[{"id": "1", "name": "caf\xc3\xa9"}, 12, [true, null],'
+                     ' "x"]')
+    expected = [{"id": "1", "name": six.u("caf\xe9")}, 12, [True, None],
+                "x"]
+
+    def test_decodes_whole_document(self):
+        self.assertEqual(list(utils.iter_json_array([self.document])),
+                         self.expected)
+
+    def test_decodes_document_split_anywhere(self):
+        for split in range(1, len(self.document)):
+            chunks = [self.document[:split], self.document[split:]]
+            self.assertEqual(list(utils.iter_json_array(chunks)),
+                             self.expected)
+
+    def test_decodes_one_byte_chunks(self):
+        chunks = [self.document[i:i + 1] for i in range(len(self.document))]
+        self.assertEqual(list(utils.iter_json_array(chunks)), self.expected)
+
+    def test_rejects_missing_or_repeated_separators(self):
+        for document in ('[1 2]', '[1,,2]', '[,1]', '[1,]', '[1, 2 "x"]',
+                         '[{"a": 1} {"b": 2}]', '[,]'):
+            for split in range(1, len(document)):
+                chunks = [six.b(document[:split]), six.b(document[split:])]
+                self.assertRaises(ValueError, list,
+                                  utils.iter_json_array(chunks))
+
+    def test_decodes_numbers_split_anywhere(self):
+        document = six.b('[1.5e3, 2, -0.25E-2,10\n]')
+        for split in range(1, len(document)):
+            chunks = [document[:split], document[split:]]
+            self.assertEqual(list(utils.iter_json_array(chunks)),
+                             [1500.0, 2, -0.0025, 10])
+
+    def test_yields_elements_before_reading_remaining_chunks(self):
+        def chunks():
+            yield six.b('[{"id": "1"}, ')
+            raise AssertionError("read too far")
+        self.assertEqual(next(utils.iter_json_array(chunks())), {"id": "1"})
+
+    def test_empty_array(self):
+        self.assertEqual(list(utils.iter_json_array([six.b(" [ ] ")])), [])
+
+    def test_rejects_non_arrays(self):
+        self.assertRaises(ValueError, list,
+                          utils.iter_json_array([six.b('{"a": 1}')]))
+
+    def test_rejects_truncated_arrays(self):
+        self.assertRaises(ValueError, list,
+                          utils.iter_json_array([six.b('[{"a": 1}, {"b"')]))
+        self.assertRaises(ValueError, list,
+                          utils.iter_json_array([six.b('[1, 2')]))
+
+
+class ParseAmountTestCase(unittest.TestCase):
+    def test_parses_amounts(self):
+        self.assertEqual(utils.parse_amount("10.05"), decimal.Decimal("10.05"))
+        self.assertEqual(utils.parse_amount(0.1), decimal.Decimal("0.1"))
+        self.assertIsNone(utils.parse_amount(None))
+
+    def test_repeated_amounts_are_memoized(self):
+        first = utils.parse_amount("123.45")
+        self.assertIs(utils.parse_amount("123.45"), first)
+
+
+class ToMinorUnitsTestCase(unittest.TestCase):
+    def test_converts_decimal_strings_exactly(self):
+        self.assertEqual(utils.to_minor_units("10.05"), 1005)
+        self.assertEqual(utils.to_minor_units("0"), 0)
+        self.assertEqual(utils.to_minor_units("1234567.89"), 123456789)
+
+    def test_converts_numbers(self):
+        self.assertEqual(utils.to_minor_units(10), 1000)
+        self.assertEqual(utils.to_minor_units(0.29), 29)
+
+    def test_rounds_half_up(self):
+        self.assertEqual(utils.to_minor_units("0.125"), 13)
+
+    def test_none_is_unchanged(self):
+        self.assertEqual(utils.to_minor_units(None), None)
+
+
 class CamelizeTestCase(unittest.TestCase):
     def test_camelize_multi_word(self):
         teststr = "camelize_this_please"